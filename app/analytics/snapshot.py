@@ -0,0 +1,165 @@
+import os
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import ipc
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, String
+from sqlalchemy import func, select
+from app.db import engine
+from app.models import Property
+from app.services.property_db_service import incremental_watermark
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "analytics/properties.arrow")
+SYNC_CHUNK_SIZE = 100_000
+SQFT_PER_ACRE = 43560
+WATERMARK_KEY = b"watermark"
+
+# Low-cardinality text columns, stored dictionary encoded so they load as
+# pandas categoricals.
+CATEGORICAL_COLUMNS = [
+    "listing_status",
+    "property_type",
+    "contingent_listing_type",
+    "lot_area_unit",
+    "country",
+    "currency",
+    "county_name",
+    "state_id",
+    "county_fips",
+    "zip_code",
+]
+ARROW_TYPES = {
+    BigInteger: pa.int64(),
+    Integer: pa.int64(),
+    Float: pa.float64(),
+    String: pa.string(),
+    Boolean: pa.bool_(),
+    Date: pa.date32(),
+    DateTime: pa.timestamp("us"),
+}
+
+
+def snapshot_schema():
+    fields = []
+    for column in Property.__table__.columns:
+        arrow_type = ARROW_TYPES[type(column.type)]
+        if column.name in CATEGORICAL_COLUMNS:
+            arrow_type = pa.dictionary(pa.int32(), arrow_type)
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def normalize_lot_area(df):
+    """
+    Convert lot areas given in sqft to acres, in place.
+    """
+    sqft = (df["lot_area_unit"] == "sqft").to_numpy()
+    df["lot_area_value"] = np.where(
+        sqft, df["lot_area_value"] / SQFT_PER_ACRE, df["lot_area_value"]
+    )
+    df.loc[sqft, "lot_area_unit"] = "acres"
+    return df
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """
+    Memory-map the snapshot file. Returns None when there is no snapshot yet.
+    """
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all()
+
+
+def snapshot_watermark(table):
+    metadata = (table.schema.metadata or {}) if table is not None else {}
+    if WATERMARK_KEY not in metadata:
+        return None
+    return datetime.fromisoformat(metadata[WATERMARK_KEY].decode())
+
+
+def fetch_changed_rows(since):
+    """
+    Rows updated after the watermark (all rows when there is none), streamed from
+    the database in chunks and normalized into Arrow, and the database time
+    taken just before the read.
+    """
+    schema = snapshot_schema()
+    query = select(Property)
+    if since is not None:
+        query = query.where(Property.updated_at > since)
+    tables = []
+    with engine.connect().execution_options(stream_results=True) as connection:
+        now = connection.execute(select(func.localtimestamp())).scalar_one()
+        for chunk in pd.read_sql_query(query, connection, chunksize=SYNC_CHUNK_SIZE):
+            chunk = normalize_lot_area(chunk)
+            tables.append(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+    return (pa.concat_tables(tables) if tables else schema.empty_table()), now
+
+
+def write_snapshot(table, path, watermark):
+    # Write next to the target and swap it in, so a crashed sync never leaves a
+    # half-written snapshot and open memory maps keep their old file.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    metadata = {WATERMARK_KEY: watermark.isoformat().encode()} if watermark else {}
+    table = table.unify_dictionaries().combine_chunks()
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def sync_snapshot(path=SNAPSHOT_PATH):
+    """
+    Bring the local snapshot up to date with the properties table, pulling only
+    rows updated since the last sync. Returns the number of rows pulled.
+    """
+    snapshot = read_snapshot(path)
+    watermark = snapshot_watermark(snapshot)
+    changed, now = fetch_changed_rows(watermark)
+    pulled = changed.num_rows
+    if pulled == 0 and snapshot is not None:
+        logger.info(f"Analytics snapshot is up to date as of {watermark}")
+        return 0
+    if snapshot is not None:
+        # Updated properties replace their earlier row.
+        kept = pc.invert(pc.is_in(snapshot["zpid"], value_set=changed["zpid"]))
+        changed = pa.concat_tables([snapshot.filter(kept), changed])
+    # Rows from writes still open at the read can carry an older updated_at
+    # than rows pulled now, so the next sync looks back a little further.
+    newest = pc.max(changed["updated_at"]).as_py()
+    write_snapshot(changed, path, incremental_watermark(newest, now, watermark))
+    logger.info(
+        f"Synced analytics snapshot: pulled {pulled} rows, {changed.num_rows} rows in total"
+    )
+    return pulled
+
+
+def load_snapshot(path=SNAPSHOT_PATH, columns=None, sync=True):
+    """
+    Load the snapshot as a DataFrame, syncing it first unless sync is False. Text
+    columns with few values come back as categoricals and lot_area_value is in
+    acres wherever Zillow reported sqft.
+    """
+    if sync:
+        sync_snapshot(path)
+    table = read_snapshot(path)
+    if table is None:
+        table = snapshot_schema().empty_table()
+    if columns:
+        table = table.select(columns)
+    return table.to_pandas()
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, case, cast, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import USE_ASYNC_DB, SessionLocal, get_async_sessionmaker
+from app.models import Property, ZipStats
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+SQFT_PER_ACRE = 43560
+SOLD_WINDOWS = (30, 90)
+STAT_COLUMNS = [
+    "properties_for_sale",
+    "properties_sold_30_days",
+    "properties_sold_90_days",
+    "average_price",
+    "median_price",
+    "price_std",
+    "average_acreage",
+    "median_acreage",
+    "absorption",
+]
+
+
+def compute_zip_stats(df, now=None):
+    """
+    Per-zip market statistics from a properties DataFrame whose lot areas are
+    already in acres (see app.analytics.snapshot). Absorption is sales in the
+    last 30 days per property for sale.
+    """
+    now = pd.Timestamp(now or datetime.now())
+    days_since_sold = (now - pd.to_datetime(df["date_sold"])).dt.days.to_numpy()
+    sold = (df["listing_status"] == "RECENTLY_SOLD").to_numpy()
+    columns = pd.DataFrame(
+        {
+            "zip_code": df["zip_code"],
+            "for_sale": (df["listing_status"] == "FOR_SALE").to_numpy(),
+            "price": df["price"],
+            "acreage": df["lot_area_value"],
+        }
+    )
+    for days in SOLD_WINDOWS:
+        columns[f"sold_{days}"] = sold & (days_since_sold <= days)
+    stats = (
+        columns.groupby("zip_code", observed=True)
+        .agg(
+            properties_for_sale=("for_sale", "sum"),
+            properties_sold_30_days=("sold_30", "sum"),
+            properties_sold_90_days=("sold_90", "sum"),
+            average_price=("price", "mean"),
+            median_price=("price", "median"),
+            price_std=("price", "std"),
+            average_acreage=("acreage", "mean"),
+            median_acreage=("acreage", "median"),
+        )
+        .reset_index()
+    )
+    stats["absorption"] = stats["properties_sold_30_days"] / stats[
+        "properties_for_sale"
+    ].replace(0, np.nan)
+    return stats
+
+
+def build_zip_stats_query(zip_codes=None):
+    """
+    The same statistics as compute_zip_stats, aggregated in Postgres.
+    """
+    acreage = case(
+        (
+            Property.lot_area_unit == "sqft",
+            Property.lot_area_value / SQFT_PER_ACRE,
+        ),
+        else_=Property.lot_area_value,
+    )
+    sold = Property.listing_status == "RECENTLY_SOLD"
+    for_sale = func.count().filter(Property.listing_status == "FOR_SALE")
+    sold_30 = func.count().filter(
+        sold, Property.date_sold >= func.current_date() - SOLD_WINDOWS[0]
+    )
+    sold_90 = func.count().filter(
+        sold, Property.date_sold >= func.current_date() - SOLD_WINDOWS[1]
+    )
+    query = select(
+        Property.zip_code,
+        for_sale.label("properties_for_sale"),
+        sold_30.label("properties_sold_30_days"),
+        sold_90.label("properties_sold_90_days"),
+        func.avg(Property.price).label("average_price"),
+        func.percentile_cont(0.5).within_group(Property.price).label("median_price"),
+        func.stddev_samp(Property.price).label("price_std"),
+        func.avg(acreage).label("average_acreage"),
+        func.percentile_cont(0.5).within_group(acreage).label("median_acreage"),
+        (cast(sold_30, Float) / func.nullif(for_sale, 0)).label("absorption"),
+        func.now().label("updated_at"),
+    ).where(Property.zip_code.isnot(None))
+    if zip_codes is not None:
+        query = query.where(Property.zip_code.in_(zip_codes))
+    return query.group_by(Property.zip_code)
+
+
+def build_refresh_zip_stats_statement(zip_codes=None):
+    columns = ["zip_code", *STAT_COLUMNS, "updated_at"]
+    stmt = insert(ZipStats).from_select(columns, build_zip_stats_query(zip_codes))
+    return stmt.on_conflict_do_update(
+        index_elements=[ZipStats.zip_code],
+        set_={
+            column: getattr(stmt.excluded, column)
+            for column in [*STAT_COLUMNS, "updated_at"]
+        },
+    )
+
+
+def refresh_zip_stats(zip_codes=None):
+    """
+    Recompute the zip_stats rows of the given zips (all zips when None) in one
+    INSERT ... SELECT. Returns the number of rows written.
+    """
+    if zip_codes is not None and not zip_codes:
+        return 0
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            result = db.execute(build_refresh_zip_stats_statement(zip_codes))
+        logger.info(f"Refreshed zip_stats for {result.rowcount} zip codes")
+        return result.rowcount
+    finally:
+        db.close()
+
+
+async def refresh_zip_stats_async(zip_codes=None):
+    if not USE_ASYNC_DB:
+        return await asyncio.to_thread(refresh_zip_stats, zip_codes)
+    if zip_codes is not None and not zip_codes:
+        return 0
+    async with get_async_sessionmaker()() as db:
+        async with db.begin():
+            result = await db.execute(build_refresh_zip_stats_statement(zip_codes))
+    logger.info(f"Refreshed zip_stats for {result.rowcount} zip codes")
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the zip_stats table.")
+    parser.add_argument(
+        "zip_codes", nargs="*", help="Zip codes to refresh (default: all)"
+    )
+    args = parser.parse_args()
+    refresh_zip_stats(args.zip_codes or None)
@@ -1,13 +1,50 @@
+from app.db import dispose_async_engine
+from app.analytics.zip_stats import refresh_zip_stats_async
 from app.services.locations_from_gsheet_service import fetch_locations_from_google_sheet
-from app.services.zipcode_service import create_zip_code_dicts
 from app.services.zillow_search_params_service import get_zillow_search_params
-from app.services.zillow_properties_service import fetch_properties_for_params_list
-from app.services.zillow_search_params_service import get_zillow_total_results
-from app.services.property_db_service import get_or_create_properties
-from app.services.rapidapi_client import RateLimiter
+from app.services.zillow_properties_service import (
+    PageFetchError,
+    fetch_properties_for_params_list,
+)
+from app.services.zillow_search_params_service import get_zillow_fingerprint
+from app.services.property_writer_service import PropertyWriter
+from app.services.metrics_service import metrics
+from app.services.property_parse_service import parse_properties
+from app.services.search_plan_service import get_crawl_history, get_search_plans
+from app.services.api_budget_service import (
+    api_budget,
+    budget_report,
+    estimate_job_calls,
+)
+from app.services.crawl_scheduler_service import CrawlScheduler, parse_phase_weights
+from app.services.crawl_journal_service import CrawlJournal
+from app.services.crawl_queue_service import enqueue_jobs
+from app.services.refresh_cadence_service import (
+    cache_max_age,
+    get_change_rates,
+    is_due,
+    tier_counts,
+)
+from app.services.zip_crawl_state_service import (
+    FULL_SOLD_IN_LAST,
+    choose_sold_in_last,
+    fingerprint_is_current,
+    get_zip_crawl_states,
+    record_zip_crawls,
+)
+from app.services.rapidapi_client import (
+    RAPIDAPI_RATE_LIMIT,
+    RAPIDAPI_ZILLOW_API_KEYS,
+    ApiKeyPool,
+    request_coalescer,
+    response_cache,
+)
+import json
 import logging
 import asyncio
-from tqdm.asyncio import tqdm_asyncio
+import argparse
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
 from aiohttp import ClientSession
 
 
@@ -20,91 +57,435 @@ logging.basicConfig(
 
 
 async def process_zip(
-    zip_code, zip_data, status_type, soldInLast=None, session=None, rate_limiter=None
+    zip_code,
+    zip_data,
+    status_type,
+    soldInLast=None,
+    session=None,
+    rate_limiter=None,
+    writer=None,
+    journal=None,
+    crawl_state=None,
 ):
+    """
+    Crawl one zip and status type. Returns the fingerprint taken for the zip and
+    whether it was fetched in full, or None when the crawl failed.
+    """
     try:
-        zillow_search_params = await get_zillow_search_params(
-            zip_code,
-            status_type,
-            soldInLast=soldInLast,
-            session=session,
-            rate_limiter=rate_limiter,
-        )
+        journal_state = journal.get(zip_code, status_type) if journal else None
+        if journal and journal.is_complete(zip_code, status_type):
+            logger.info(
+                f"Skipping {status_type} properties for {zip_code}, already completed in crawl run {journal.run_id}"
+            )
+            return journal.result(zip_code, status_type)
+        fingerprint = None
+        total_results = None
+        if journal_state and journal_state["params"] is not None:
+            # Reuse the plan from the interrupted run rather than probing again.
+            soldInLast = journal_state["sold_in_last"] or soldInLast
+            zillow_search_params = journal_state["params"]
+            fingerprint = journal.result(zip_code, status_type)["fingerprint"]
+        else:
+            total_results, fingerprint = await get_zillow_fingerprint(
+                zip_code,
+                status_type,
+                soldInLast=soldInLast,
+                session=session,
+                rate_limiter=rate_limiter,
+            )
+            if fingerprint_is_current(crawl_state, soldInLast, fingerprint):
+                logger.info(
+                    f"Skipping {status_type} properties for {zip_code}, unchanged since the last crawl | Total Results: {total_results}"
+                )
+                result = {"fingerprint": fingerprint, "deep_crawl": False}
+                if journal:
+                    await journal.record_plan(
+                        zip_code, status_type, soldInLast, [], result
+                    )
+                return result
+            zillow_search_params = await get_zillow_search_params(
+                zip_code,
+                status_type,
+                soldInLast=soldInLast,
+                session=session,
+                rate_limiter=rate_limiter,
+                total_results=total_results,
+            )
+            if journal:
+                await journal.record_plan(
+                    zip_code,
+                    status_type,
+                    soldInLast,
+                    zillow_search_params or [],
+                    {"fingerprint": fingerprint, "deep_crawl": True},
+                )
         if not zillow_search_params:
             logger.warning(
                 f"No results found for {zip_code} with status_type {status_type} and soldInLast {soldInLast}"
             )
-            return
+            return {"fingerprint": fingerprint, "deep_crawl": True}
 
-        properties = await fetch_properties_for_params_list(
-            zillow_search_params, session=session, rate_limiter=rate_limiter
-        )
-        total_results = await get_zillow_total_results(
-            zip_code,
-            status_type,
-            soldInLast=soldInLast,
+        number_of_properties = 0
+
+        async def write_page(properties, page, total_pages, range_key):
+            nonlocal number_of_properties
+            # Project the page into compact records right away so the raw
+            # Zillow dicts can be dropped before the page waits in the writer.
+            records = parse_properties(properties, state_id=zip_data.state_id)
+            number_of_properties += len(records)
+            page_entry = {
+                "zip_code": zip_code,
+                "status_type": status_type,
+                "sold_in_last": soldInLast or "",
+                "range_key": range_key,
+                "page": page,
+                "total_pages": total_pages,
+            }
+            await writer.put(records, page_entry if journal else None)
+
+        await fetch_properties_for_params_list(
+            zillow_search_params,
             session=session,
             rate_limiter=rate_limiter,
+            page_handler=write_page,
+            resume_pages=(
+                journal.resume_pages(zip_code, status_type) if journal else None
+            ),
         )
 
         logger.info(
-            f"Location: {zip_code} | Status: {status_type} | Sold in Last: {soldInLast} | Expected Properties: {total_results} | Actual Properties: {len(properties)}"
+            f"Location: {zip_code} | Status: {status_type} | Sold in Last: {soldInLast} | Expected Properties: {total_results} | Actual Properties: {number_of_properties}"
         )
+        return {"fingerprint": fingerprint, "deep_crawl": True}
+    except PageFetchError as e:
+        # Pages that did arrive are already queued for writing and journaled, so
+        # only the failed pages are fetched again on --resume.
+        logger.error(
+            f"{status_type} properties for {zip_code}: {len(e.failed_pages)} pages failed and were left for the next resume: {e}"
+        )
+    except Exception as e:
+        logger.error(f"{status_type} properties for {zip_code}: {e}")
 
-        for property in properties:
-            property["zip_code"] = zip_code
-            property["state_id"] = zip_data["state_id"]
 
-        if len(properties) > 0:
-            get_or_create_properties(properties)
+async def finish_crawl_run(journal, jobs, crawl_results, finish=True):
+    """
+    Record the crawl state of every completed job, refresh zip_stats for the zips
+    that were fetched in full and, when nothing is left, close the run. Returns
+    the incomplete jobs.
+    """
+    completed_jobs = [
+        job for job in jobs if journal.is_complete(job.zip_code, job.status_type)
+    ]
+    await asyncio.to_thread(
+        record_zip_crawls,
+        [
+            {
+                "zip_code": job.zip_code,
+                "status_type": job.status_type,
+                "sold_in_last": journal.get(job.zip_code, job.status_type)[
+                    "sold_in_last"
+                ],
+                **(
+                    crawl_results.get((job.zip_code, job.status_type))
+                    or journal.result(job.zip_code, job.status_type)
+                ),
+            }
+            for job in completed_jobs
+        ],
+        journal.started_at,
+    )
+    # Only zips whose listings were fetched in full can have new data.
+    changed_zip_codes = sorted(
+        {
+            job.zip_code
+            for job in completed_jobs
+            if (
+                crawl_results.get((job.zip_code, job.status_type))
+                or journal.result(job.zip_code, job.status_type)
+            )["deep_crawl"]
+        }
+    )
+    try:
+        await refresh_zip_stats_async(changed_zip_codes)
     except Exception as e:
-        logger.error(f"{status_type} properties for {zip_code}: {e}")
+        logger.error(f"Error refreshing zip_stats: {e}")
+    incomplete_jobs = [
+        job for job in jobs if not journal.is_complete(job.zip_code, job.status_type)
+    ]
+    if finish and not incomplete_jobs:
+        await journal.finish()
+    return incomplete_jobs
+
 
+def write_run_metrics():
+    cache_requests = response_cache.hits + response_cache.misses
+    write_seconds = metrics.histogram_total("db_batch_write_seconds")
+    metrics.set_gauge(
+        "rapidapi_cache_hit_ratio",
+        response_cache.hits / cache_requests if cache_requests else 0.0,
+    )
+    metrics.set_gauge("rapidapi_coalesced_calls", request_coalescer.saved_calls)
+    metrics.set_gauge(
+        "db_rows_per_second",
+        (
+            metrics.counter_total("db_rows_total") / write_seconds
+            if write_seconds
+            else 0.0
+        ),
+    )
+    metrics.write()
 
-async def run_property_services():
-    # Test URL
-    # sheet_url = "https://docs.google.com/spreadsheets/d/1WZMtAdgJCLo9pFAhBsszCRPZZDMX16Xtt25er92F48E/pub?output=csv"
-    # Production URL
-    sheet_url = "https://docs.google.com/spreadsheets/d/1jGa8Y6UmdU1YAY2GbtKSNt80GggSkaEU5CvWAB2InBE/pub?gid=0&single=true&output=csv"
 
-    # Fetch locations from Google Sheet
-    locations = await fetch_locations_from_google_sheet(sheet_url)
+# Test URL
+# SHEET_URL = "https://docs.google.com/spreadsheets/d/1WZMtAdgJCLo9pFAhBsszCRPZZDMX16Xtt25er92F48E/pub?output=csv"
+# Production URL
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1jGa8Y6UmdU1YAY2GbtKSNt80GggSkaEU5CvWAB2InBE/pub?gid=0&single=true&output=csv"
 
-    # Group filtered locations by zip code
-    zip_codes = create_zip_code_dicts(locations)
 
-    rate_limiter = RateLimiter(rate=10)
-    async with ClientSession() as session:
-        rate_limiter_task = asyncio.create_task(rate_limiter.start())
+async def load_locations(locations, session):
+    """
+    Zip records from the Google Sheet, or from a local CSV when given.
+    """
+    zip_codes, added_zip_codes, removed_zip_codes = (
+        await fetch_locations_from_google_sheet(locations or SHEET_URL, session)
+    )
+    if added_zip_codes:
+        logger.info(
+            f"New zip codes in the location sheet: {', '.join(sorted(added_zip_codes))}"
+        )
+    if removed_zip_codes:
+        logger.info(
+            f"Zip codes no longer in the location sheet: {', '.join(sorted(removed_zip_codes))}"
+        )
+    return zip_codes
 
-        semaphore = asyncio.Semaphore(10)
 
-        async def sem_process_zip(zip_code, zip_data, status_type, soldInLast=None):
-            async with semaphore:
-                await process_zip(
-                    zip_code, zip_data, status_type, soldInLast, session, rate_limiter
+def add_crawl_jobs(
+    scheduler, zip_codes, zip_crawl_states, search_plans, incremental, due=None
+):
+    """
+    Queue a RecentlySold and a ForSale job per zip, each with the API calls it is
+    expected to cost given the last stored search plan. due, if given, is called
+    with (zip_code, status_type) and limits the jobs to those it returns True for.
+    """
+    jobs = []
+    for zip_code, zip_data in zip_codes.items():
+        sold_in_last = (
+            choose_sold_in_last(zip_crawl_states.get((zip_code, "RecentlySold")))
+            if incremental
+            else FULL_SOLD_IN_LAST
+        )
+        for status_type, window in (
+            ("RecentlySold", sold_in_last),
+            ("ForSale", None),
+        ):
+            if due is not None and not due(zip_code, status_type):
+                continue
+            history = scheduler.crawl_history.get((zip_code, status_type), {})
+            estimated_calls = estimate_job_calls(
+                history.get("total_results"),
+                search_plans.get((zip_code, status_type, window or "")),
+            )
+            jobs.append(
+                scheduler.add_job(
+                    zip_code,
+                    zip_data,
+                    status_type,
+                    sold_in_last=window,
+                    estimated_calls=estimated_calls,
                 )
+            )
+    return jobs
+
+
+def log_budget_report(jobs):
+    report = budget_report(jobs, api_budget)
+    logger.info(
+        f"Crawl plan | Jobs: {report['jobs']} | Estimated API calls: {report['estimated_calls']} {report['estimated_calls_by_status']} | Projected cost: {report['projected_cost']} | Remaining budget: {report['remaining_budget']} | Jobs within budget: {report['jobs_within_budget']}"
+    )
+    return report
+
+
+async def run_property_services(
+    resume=False,
+    incremental=True,
+    locations=None,
+    plan_only=False,
+    enqueue=False,
+    due_only=False,
+    session=None,
+    rate_limiter=None,
+    phase_weights=None,
+):
+    """
+    Crawl every zip in the locations sheet. With plan_only the estimated cost is
+    returned without crawling; with enqueue the jobs are put on the crawl_jobs
+    queue for app.worker processes and the run id is returned. With due_only only
+    the (zip, status) pairs whose refresh cadence has come round are crawled.
+
+    A long-running caller can pass its own session and rate limiter to reuse
+    them across runs; the database engines are then left open as well.
+    phase_weights overrides the CRAWL_PHASE_WEIGHTS split between ForSale and
+    RecentlySold jobs.
+    """
+    metrics.reset()
+    keep_warm = session is not None
+    if rate_limiter is None:
+        rate_limiter = ApiKeyPool(RAPIDAPI_ZILLOW_API_KEYS, rate=RAPIDAPI_RATE_LIMIT)
+    request_coalescer.reset()
+    await asyncio.to_thread(api_budget.start)
+    zip_crawl_states = await asyncio.to_thread(get_zip_crawl_states)
+    crawl_history = await asyncio.to_thread(get_crawl_history)
+    search_plans = await asyncio.to_thread(get_search_plans)
+    due = None
+    if due_only:
+        # The hot tiers come round before the cache TTLs expire.
+        response_cache.max_age = cache_max_age()
+        change_rates = await asyncio.to_thread(get_change_rates)
+        now = datetime.now(timezone.utc)
+
+        def due(zip_code, status_type):
+            return is_due(
+                zip_crawl_states.get((zip_code, status_type)),
+                status_type,
+                change_rates.get((zip_code, status_type)),
+                now,
+            )
 
-        sold_tasks = [
-            sem_process_zip(zip_code, zip_data, "RecentlySold", soldInLast="90")
-            for zip_code, zip_data in zip_codes.items()
-        ]
-        await tqdm_asyncio.gather(*sold_tasks, desc="Processing Sold Properties")
-
-        # Process ForSale properties
-        for_sale_tasks = [
-            sem_process_zip(zip_code, zip_data, "ForSale")
-            for zip_code, zip_data in zip_codes.items()
-        ]
-        await tqdm_asyncio.gather(
-            *for_sale_tasks, desc="Processing For Sale Properties"
+    scheduler = CrawlScheduler(
+        rate_limiter,
+        crawl_history=crawl_history,
+        phase_weights=phase_weights,
+        budget=api_budget if api_budget.limited else None,
+    )
+
+    if plan_only or enqueue:
+        async with AsyncExitStack() as stack:
+            if session is None:
+                session = await stack.enter_async_context(ClientSession())
+            zip_codes = await load_locations(locations, session)
+        jobs = add_crawl_jobs(
+            scheduler, zip_codes, zip_crawl_states, search_plans, incremental, due
+        )
+        report = log_budget_report(jobs)
+        if plan_only:
+            return report
+        journal = await asyncio.to_thread(CrawlJournal.start, resume)
+        await asyncio.to_thread(enqueue_jobs, journal.run_id, jobs)
+        return journal.run_id
+
+    async with AsyncExitStack() as stack:
+        if session is None:
+            session = await stack.enter_async_context(ClientSession())
+        # Fetch locations from Google Sheet (or a local CSV), keyed by zip code
+        zip_codes = await load_locations(locations, session)
+        jobs = add_crawl_jobs(
+            scheduler, zip_codes, zip_crawl_states, search_plans, incremental, due
+        )
+        if due_only:
+            logger.info(
+                f"Crawling {len(jobs)} due jobs: {tier_counts([(job.zip_code, job.status_type) for job in jobs], change_rates)}"
+            )
+            if not jobs:
+                # Most daemon ticks: don't open a crawl run that does nothing.
+                if not keep_warm:
+                    await dispose_async_engine()
+                return "Nothing due"
+        log_budget_report(jobs)
+
+        journal = await asyncio.to_thread(CrawlJournal.start, resume)
+        writer = await stack.enter_async_context(
+            PropertyWriter(on_pages_written=journal.record_pages)
         )
 
-    await rate_limiter.queue.join()
-    rate_limiter_task.cancel()
+        crawl_results = {}
+
+        async def run_job(job):
+            key = (job.zip_code, job.status_type)
+            with metrics.timer("zip_crawl_seconds", status_type=job.status_type):
+                crawl_results[key] = await process_zip(
+                    job.zip_code,
+                    job.zip_data,
+                    job.status_type,
+                    job.sold_in_last,
+                    session,
+                    rate_limiter,
+                    writer,
+                    journal,
+                    zip_crawl_states.get(key),
+                )
+
+        try:
+            await scheduler.run(run_job)
+        finally:
+            await asyncio.to_thread(api_budget.flush)
+
+    incomplete_jobs = await finish_crawl_run(journal, jobs, crawl_results)
+    metrics.set_gauge("crawl_jobs_deferred", len(scheduler.deferred))
+    if incomplete_jobs:
+        logger.warning(
+            f"Crawl run {journal.run_id} left {len(incomplete_jobs)} jobs incomplete, rerun with --resume to finish them"
+        )
+    if not keep_warm:
+        await dispose_async_engine()
+    logger.info(f"Finished property services: {rate_limiter} | {api_budget}")
+    logger.info(
+        f"API calls saved | Coalesced: {request_coalescer.saved_calls} | Cache hits: {response_cache.hits} | Cache misses: {response_cache.misses}"
+    )
+    write_run_metrics()
 
     return "Success"
 
 
 if __name__ == "__main__":
-    asyncio.run(run_property_services())
+    parser = argparse.ArgumentParser(description="Crawl Zillow land listings.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last unfinished crawl run, skipping completed pages.",
+    )
+    parser.add_argument(
+        "--full-sold-window",
+        action="store_true",
+        help=f"Fetch the full {FULL_SOLD_IN_LAST} day sold window for every zip instead of only what changed since the last crawl.",
+    )
+    parser.add_argument(
+        "--locations",
+        help="Read zip codes from this CSV file instead of the Google Sheet.",
+    )
+    parser.add_argument(
+        "--plan-only",
+        action="store_true",
+        help="Print the estimated API calls and cost of the crawl without running it.",
+    )
+    parser.add_argument(
+        "--due-only",
+        action="store_true",
+        help="Only crawl zips whose refresh cadence has come round.",
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Queue the crawl's jobs for app.worker processes instead of running them here.",
+    )
+    parser.add_argument(
+        "--phase-weights",
+        type=parse_phase_weights,
+        help='Share of API quota per phase, e.g. "ForSale=2,RecentlySold=1". Defaults to CRAWL_PHASE_WEIGHTS.',
+    )
+    args = parser.parse_args()
+    result = asyncio.run(
+        run_property_services(
+            resume=args.resume,
+            incremental=not args.full_sold_window,
+            locations=args.locations,
+            plan_only=args.plan_only,
+            enqueue=args.enqueue,
+            due_only=args.due_only,
+            phase_weights=args.phase_weights,
+        )
+    )
+    if args.plan_only:
+        print(json.dumps(result, indent=2))
+    elif args.enqueue:
+        print(f"Queued crawl run {result}; start workers with python -m app.worker")
@@ -1,10 +1,18 @@
 from sqlalchemy import (
     Column,
+    BigInteger,
     Integer,
     String,
     Float,
     Boolean,
     Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    JSON,
+    UniqueConstraint,
+    func,
+    text,
 )
 from sqlalchemy.orm import declarative_base
 
@@ -13,6 +21,23 @@ Base = declarative_base()
 
 class Property(Base):
     __tablename__ = "properties"
+    __table_args__ = (
+        # Per-zip lookups by status, and sold counts over a date_sold window.
+        Index(
+            "ix_properties_zip_code_listing_status_date_sold",
+            "zip_code",
+            "listing_status",
+            "date_sold",
+        ),
+        Index(
+            "ix_properties_sold_zip_code_date_sold",
+            "zip_code",
+            "date_sold",
+            postgresql_where=text("listing_status = 'RECENTLY_SOLD'"),
+        ),
+        # Incremental exports and syncs read rows changed since a watermark.
+        Index("ix_properties_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     zpid = Column(Integer, unique=True, nullable=False)
@@ -43,3 +68,162 @@ class Property(Base):
     state_id = Column(String)
     county_fips = Column(String)
     zip_code = Column(String)
+    # Hash of the tracked listing fields; a new snapshot is written when it changes.
+    content_hash = Column(String)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now())
+
+
+class PropertySnapshot(Base):
+    """
+    Append-only history of tracked listing fields, one row per observed change.
+    Range partitioned by month on observed_at; partitions are created on demand.
+    """
+
+    __tablename__ = "property_snapshots"
+    __table_args__ = (
+        Index("ix_property_snapshots_zpid_observed_at", "zpid", "observed_at"),
+        Index("ix_property_snapshots_zip_code_observed_at", "zip_code", "observed_at"),
+        {"postgresql_partition_by": "RANGE (observed_at)"},
+    )
+
+    # The partition key has to be part of the primary key.
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    observed_at = Column(DateTime, primary_key=True)
+    zpid = Column(Integer, nullable=False)
+    zip_code = Column(String)
+    price = Column(Integer)
+    listing_status = Column(String)
+    price_change = Column(Integer)
+    zestimate = Column(Integer)
+    rent_zestimate = Column(Integer)
+    days_on_zillow = Column(Integer)
+    contingent_listing_type = Column(String)
+    date_sold = Column(Date)
+    content_hash = Column(String)
+
+
+class SearchPlan(Base):
+    __tablename__ = "search_plans"
+    __table_args__ = (UniqueConstraint("zip_code", "status_type", "sold_in_last"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    zip_code = Column(String, nullable=False)
+    status_type = Column(String, nullable=False)
+    sold_in_last = Column(String, nullable=False, default="")
+    total_results = Column(Integer)
+    params = Column(JSON)
+    updated_at = Column(DateTime)
+
+
+class CrawlRun(Base):
+    __tablename__ = "crawl_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+
+
+class CrawlJournalEntry(Base):
+    __tablename__ = "crawl_journal"
+    __table_args__ = (
+        UniqueConstraint("run_id", "zip_code", "status_type", "range_key", "page"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey("crawl_runs.id"), nullable=False)
+    zip_code = Column(String, nullable=False)
+    status_type = Column(String, nullable=False)
+    sold_in_last = Column(String, nullable=False, default="")
+    # The plan row for a zip has an empty range_key and page 0 and stores the
+    # search params and the crawl result (fingerprint, deep_crawl); every other
+    # row marks one written page of one range.
+    range_key = Column(String, nullable=False, default="")
+    page = Column(Integer, nullable=False, default=0)
+    total_pages = Column(Integer)
+    params = Column(JSON)
+    result = Column(JSON)
+    updated_at = Column(DateTime)
+
+
+class ZipCrawlState(Base):
+    __tablename__ = "zip_crawl_state"
+    __table_args__ = (UniqueConstraint("zip_code", "status_type"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    zip_code = Column(String, nullable=False)
+    status_type = Column(String, nullable=False)
+    sold_in_last = Column(String, nullable=False, default="")
+    last_success_at = Column(DateTime)
+    last_full_success_at = Column(DateTime)
+    # Change detection: fingerprint of the newest-first page 1, the soldInLast it
+    # was taken with, and when the zip was last fetched in full.
+    fingerprint = Column(String)
+    fingerprint_sold_in_last = Column(String)
+    last_deep_crawl_at = Column(DateTime)
+
+
+class ZipStats(Base):
+    """
+    Market statistics per zip, refreshed for the zips touched by each crawl.
+    """
+
+    __tablename__ = "zip_stats"
+
+    zip_code = Column(String, primary_key=True)
+    properties_for_sale = Column(Integer)
+    properties_sold_30_days = Column(Integer)
+    properties_sold_90_days = Column(Integer)
+    average_price = Column(Float)
+    median_price = Column(Float)
+    price_std = Column(Float)
+    average_acreage = Column(Float)
+    median_acreage = Column(Float)
+    # Sales in the last 30 days per property for sale.
+    absorption = Column(Float)
+    updated_at = Column(DateTime)
+
+
+class ApiUsage(Base):
+    """
+    RapidAPI calls made per UTC day, used to enforce the call budget across runs.
+    """
+
+    __tablename__ = "api_usage"
+
+    day = Column(Date, primary_key=True)
+    calls = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+class CrawlQueueJob(Base):
+    """
+    One (zip, status_type) job of a crawl run, claimed by worker processes with
+    SELECT ... FOR UPDATE SKIP LOCKED. A running job whose lease has expired is
+    claimed again by the next worker.
+    """
+
+    __tablename__ = "crawl_jobs"
+    __table_args__ = (
+        UniqueConstraint("run_id", "zip_code", "status_type"),
+        Index("ix_crawl_jobs_run_id_status_priority", "run_id", "status", "priority"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey("crawl_runs.id"), nullable=False)
+    zip_code = Column(String, nullable=False)
+    status_type = Column(String, nullable=False)
+    sold_in_last = Column(String, nullable=False, default="")
+    # state_id, city, county and county_fips of the zip, so workers don't need
+    # the locations sheet.
+    zip_data = Column(JSON)
+    priority = Column(Float, nullable=False, default=0)
+    estimated_calls = Column(Integer, nullable=False, default=0)
+    # pending, running, done or failed.
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime)
+    result = Column(JSON)
+    error = Column(String)
+    updated_at = Column(DateTime)
@@ -0,0 +1,213 @@
+import os
+import math
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import ApiUsage
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# Hard caps on RapidAPI calls; 0 means no cap.
+RAPIDAPI_DAILY_BUDGET = int(os.getenv("RAPIDAPI_DAILY_BUDGET", "0"))
+RAPIDAPI_MONTHLY_BUDGET = int(os.getenv("RAPIDAPI_MONTHLY_BUDGET", "0"))
+# Price of one call on the current plan, only used to report projected cost.
+RAPIDAPI_COST_PER_CALL = float(os.getenv("RAPIDAPI_COST_PER_CALL", "0"))
+RESULTS_PER_PAGE = 41
+RESULTS_CAP = 820
+TARGET_RESULTS_PER_RANGE = 800
+DEFAULT_EXPECTED_RESULTS = 100
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+def estimate_job_calls(total_results, plan=None):
+    """
+    Expected API calls to crawl one (zip, status) in full: the fingerprint probe
+    plus the pages of every range. A range's count call doubles as its page 1,
+    so split zips only pay extra for min/max probes when there is no stored plan.
+    """
+    if plan and plan.get("total_results") is not None:
+        total_results = plan["total_results"]
+    if total_results is None:
+        total_results = DEFAULT_EXPECTED_RESULTS
+    if total_results == 0:
+        return 1
+    if total_results <= RESULTS_CAP:
+        return 1 + math.ceil(total_results / RESULTS_PER_PAGE)
+    ranges = len(plan["params"]) if plan and plan.get("params") else None
+    probes = 0
+    if not ranges:
+        ranges = math.ceil(total_results / TARGET_RESULTS_PER_RANGE)
+        probes = 2
+    pages = ranges * math.ceil(total_results / ranges / RESULTS_PER_PAGE)
+    return 1 + probes + pages
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def get_api_usage(day):
+    """
+    Calls already recorded for the UTC day and for its month.
+    """
+    db: Session = SessionLocal()
+    try:
+        used_today = db.scalar(select(ApiUsage.calls).where(ApiUsage.day == day))
+        used_month = db.scalar(
+            select(func.coalesce(func.sum(ApiUsage.calls), 0)).where(
+                ApiUsage.day >= month_start(day), ApiUsage.day <= day
+            )
+        )
+        return used_today or 0, used_month or 0
+    finally:
+        db.close()
+
+
+def record_api_usage(day, calls):
+    stmt = insert(ApiUsage).values(
+        day=day, calls=calls, updated_at=datetime.now(timezone.utc)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ApiUsage.day],
+        set_={
+            "calls": ApiUsage.calls + stmt.excluded.calls,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            db.execute(stmt)
+    finally:
+        db.close()
+
+
+class ApiBudget:
+    """
+    Daily and monthly call budget for a crawl. Jobs are admitted against their
+    estimated cost so the scheduler can defer what won't fit, and every real API
+    call is counted so the caps hold even when estimates are off.
+    """
+
+    def __init__(self, daily_limit=0, monthly_limit=0):
+        self.daily_limit = daily_limit
+        self.monthly_limit = monthly_limit
+        self.day = datetime.now(timezone.utc).date()
+        self.used_today = 0
+        self.used_month = 0
+        self.calls = 0
+        self.flushed_calls = 0
+        self.reserved = 0
+
+    @property
+    def limited(self):
+        return bool(self.daily_limit or self.monthly_limit)
+
+    def start(self, daily_limit=None, monthly_limit=None):
+        """
+        Load today's and this month's usage and start counting a new run.
+        """
+        if daily_limit is not None:
+            self.daily_limit = daily_limit
+        if monthly_limit is not None:
+            self.monthly_limit = monthly_limit
+        self.day = datetime.now(timezone.utc).date()
+        self.used_today, self.used_month = get_api_usage(self.day)
+        self.calls = self.flushed_calls = self.reserved = 0
+        logger.info(f"API budget: {self}")
+
+    @property
+    def unflushed_calls(self):
+        return self.calls - self.flushed_calls
+
+    def remaining(self):
+        """
+        Calls left before the tighter cap, or None without caps.
+        """
+        limits = []
+        if self.daily_limit:
+            limits.append(self.daily_limit - self.used_today - self.unflushed_calls)
+        if self.monthly_limit:
+            limits.append(self.monthly_limit - self.used_month - self.unflushed_calls)
+        return max(0, min(limits)) if limits else None
+
+    def admit(self, estimated_calls):
+        """
+        Reserve a job's estimated calls if they fit next to the jobs already
+        running. Reservations are released when the job finishes.
+        """
+        remaining = self.remaining()
+        if remaining is not None and self.reserved + estimated_calls > remaining:
+            return False
+        self.reserved += estimated_calls
+        return True
+
+    def release(self, estimated_calls):
+        self.reserved = max(0, self.reserved - estimated_calls)
+
+    def spend(self):
+        if self.remaining() == 0:
+            raise BudgetExceededError(f"RapidAPI call budget exhausted: {self}")
+        self.calls += 1
+
+    def flush(self):
+        calls = self.unflushed_calls
+        if calls:
+            record_api_usage(self.day, calls)
+            self.flushed_calls = self.calls
+            self.used_today += calls
+            self.used_month += calls
+
+    def sync(self):
+        """
+        Persist this process's calls and pick up those of other workers sharing
+        the budget.
+        """
+        self.flush()
+        self.used_today, self.used_month = get_api_usage(self.day)
+
+    def __repr__(self):
+        return f"ApiBudget(daily={self.used_today + self.unflushed_calls}/{self.daily_limit or 'unlimited'}, monthly={self.used_month + self.unflushed_calls}/{self.monthly_limit or 'unlimited'})"
+
+
+def budget_report(jobs, budget):
+    """
+    Projected calls and cost of a run, and how many jobs fit the remaining budget
+    when taken in priority order.
+    """
+    by_status = {}
+    for job in jobs:
+        by_status[job.status_type] = (
+            by_status.get(job.status_type, 0) + job.estimated_calls
+        )
+    estimated_calls = sum(by_status.values())
+    remaining = budget.remaining()
+    fitting_jobs = len(jobs)
+    if remaining is not None:
+        fitting_jobs, planned = 0, 0
+        for job in sorted(jobs, key=lambda job: -job.priority):
+            if planned + job.estimated_calls <= remaining:
+                planned += job.estimated_calls
+                fitting_jobs += 1
+    return {
+        "jobs": len(jobs),
+        "estimated_calls": estimated_calls,
+        "estimated_calls_by_status": by_status,
+        "projected_cost": round(estimated_calls * RAPIDAPI_COST_PER_CALL, 2),
+        "remaining_budget": remaining,
+        "jobs_within_budget": fitting_jobs,
+    }
+
+
+api_budget = ApiBudget(RAPIDAPI_DAILY_BUDGET, RAPIDAPI_MONTHLY_BUDGET)
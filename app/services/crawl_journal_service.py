@@ -0,0 +1,240 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import CrawlJournalEntry, CrawlRun
+from app.services.rapidapi_cache import normalize_querystring
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+
+def range_key(querystring):
+    """
+    Identify one price range of a zip by its querystring, ignoring the page.
+    """
+    return normalize_querystring(
+        {key: value for key, value in querystring.items() if key != "page"}
+    )
+
+
+def load_journal_entries(db, run_id, zip_code=None, status_type=None):
+    """
+    Journal state of a run, optionally for one (zip, status_type) only.
+    """
+    query = select(CrawlJournalEntry).where(CrawlJournalEntry.run_id == run_id)
+    if zip_code is not None:
+        query = query.where(
+            CrawlJournalEntry.zip_code == zip_code,
+            CrawlJournalEntry.status_type == status_type,
+        )
+    zips = {}
+    for entry in db.scalars(query):
+        state = zips.setdefault(
+            (entry.zip_code, entry.status_type),
+            {"sold_in_last": entry.sold_in_last, "params": None, "ranges": {}},
+        )
+        if entry.page == 0:
+            state["params"] = entry.params
+            state["result"] = entry.result
+            continue
+        range_state = state["ranges"].setdefault(
+            entry.range_key, {"total_pages": entry.total_pages, "pages": set()}
+        )
+        range_state["pages"].add(entry.page)
+        if entry.total_pages is not None:
+            range_state["total_pages"] = entry.total_pages
+    return zips
+
+
+class CrawlJournal:
+    """
+    Records, per crawl run, the search plan used for each (zip, status_type) and
+    every page that has been written to the database, so an interrupted run can
+    be resumed without paying for the same probes and pages again.
+    """
+
+    def __init__(self, run_id, started_at, zips=None):
+        self.run_id = run_id
+        self.started_at = started_at
+        # {(zip_code, status_type): {"sold_in_last", "params", "result", "ranges": {range_key: {"total_pages", "pages"}}}}
+        self.zips = zips or {}
+
+    @classmethod
+    def start(cls, resume=False):
+        db: Session = SessionLocal()
+        try:
+            run = None
+            if resume:
+                run = db.scalars(
+                    select(CrawlRun)
+                    .where(CrawlRun.finished_at.is_(None))
+                    .order_by(CrawlRun.id.desc())
+                ).first()
+            if run is None:
+                if resume:
+                    logger.warning(
+                        "No unfinished crawl run to resume, starting a new one"
+                    )
+                started_at = datetime.now(timezone.utc)
+                run = CrawlRun(started_at=started_at)
+                db.add(run)
+                db.commit()
+                return cls(run.id, started_at)
+
+            zips = load_journal_entries(db, run.id)
+            logger.info(f"Resuming crawl run {run.id} with {len(zips)} journaled zips")
+            started_at = run.started_at
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            return cls(run.id, started_at, zips)
+        finally:
+            db.close()
+
+    @classmethod
+    def load(cls, run_id):
+        """
+        Open an existing run, e.g. the one a crawl worker was pointed at.
+        """
+        db: Session = SessionLocal()
+        try:
+            run = db.get(CrawlRun, run_id)
+            if run is None:
+                raise ValueError(f"Unknown crawl run {run_id}")
+            started_at = run.started_at
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            return cls(run.id, started_at, load_journal_entries(db, run.id))
+        finally:
+            db.close()
+
+    def reload(self, zip_code, status_type):
+        """
+        Re-read one zip's journal, which another worker may have written to
+        before its lease ran out.
+        """
+        db: Session = SessionLocal()
+        try:
+            zips = load_journal_entries(db, self.run_id, zip_code, status_type)
+        finally:
+            db.close()
+        if (zip_code, status_type) in zips:
+            self.zips[(zip_code, status_type)] = zips[(zip_code, status_type)]
+        else:
+            self.zips.pop((zip_code, status_type), None)
+
+    def get(self, zip_code, status_type):
+        return self.zips.get((zip_code, status_type))
+
+    def result(self, zip_code, status_type):
+        """
+        Crawl result recorded with the plan, so a resumed run reports the
+        fingerprint taken by the run that planned the zip.
+        """
+        state = self.get(zip_code, status_type)
+        return (state or {}).get("result") or {"fingerprint": None, "deep_crawl": True}
+
+    def is_complete(self, zip_code, status_type):
+        """
+        A zip is complete once its plan is recorded and every page of every range
+        in that plan has been written.
+        """
+        state = self.get(zip_code, status_type)
+        if state is None or state["params"] is None:
+            return False
+        for params in state["params"]:
+            range_state = state["ranges"].get(range_key(params))
+            if range_state is None or range_state["total_pages"] is None:
+                return False
+            expected_pages = set(range(1, max(range_state["total_pages"], 1) + 1))
+            if not expected_pages <= range_state["pages"]:
+                return False
+        return True
+
+    def resume_pages(self, zip_code, status_type):
+        state = self.get(zip_code, status_type)
+        return state["ranges"] if state else {}
+
+    def _upsert(self, rows):
+        now = datetime.now(timezone.utc)
+        stmt = insert(CrawlJournalEntry).values(
+            [{**row, "run_id": self.run_id, "updated_at": now} for row in rows]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["run_id", "zip_code", "status_type", "range_key", "page"],
+            set_={
+                "total_pages": stmt.excluded.total_pages,
+                "params": stmt.excluded.params,
+                "result": stmt.excluded.result,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db: Session = SessionLocal()
+        try:
+            with db.begin():
+                db.execute(stmt)
+        finally:
+            db.close()
+
+    async def record_plan(
+        self, zip_code, status_type, sold_in_last, params, result=None
+    ):
+        await asyncio.to_thread(
+            self._upsert,
+            [
+                {
+                    "zip_code": zip_code,
+                    "status_type": status_type,
+                    "sold_in_last": sold_in_last or "",
+                    "range_key": "",
+                    "page": 0,
+                    "params": params,
+                    "result": result,
+                }
+            ],
+        )
+        self.zips[(zip_code, status_type)] = {
+            "sold_in_last": sold_in_last or "",
+            "params": params,
+            "result": result,
+            "ranges": {},
+        }
+
+    async def record_pages(self, entries):
+        """
+        Mark written pages. Each entry is a dict with zip_code, status_type,
+        sold_in_last, range_key, page and total_pages.
+        """
+        if not entries:
+            return
+        await asyncio.to_thread(self._upsert, entries)
+        for entry in entries:
+            state = self.zips.setdefault(
+                (entry["zip_code"], entry["status_type"]),
+                {"sold_in_last": entry["sold_in_last"], "params": None, "ranges": {}},
+            )
+            range_state = state["ranges"].setdefault(
+                entry["range_key"],
+                {"total_pages": entry["total_pages"], "pages": set()},
+            )
+            range_state["pages"].add(entry["page"])
+
+    async def finish(self):
+        def finish_run():
+            db: Session = SessionLocal()
+            try:
+                run = db.get(CrawlRun, self.run_id)
+                run.finished_at = datetime.now(timezone.utc)
+                db.commit()
+            finally:
+                db.close()
+
+        await asyncio.to_thread(finish_run)
+        logger.info(f"Finished crawl run {self.run_id}")
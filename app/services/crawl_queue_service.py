@@ -0,0 +1,302 @@
+import os
+import logging
+from datetime import timedelta
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import CrawlQueueJob, CrawlRun
+from app.services.crawl_scheduler_service import CrawlJob
+from app.services.zipcode_service import ZipRecord
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# A claimed job is re-claimable by another worker once its lease runs out;
+# live workers renew their leases well before that.
+CRAWL_JOB_LEASE_SECONDS = int(os.getenv("CRAWL_JOB_LEASE_SECONDS", "300"))
+CRAWL_JOB_MAX_ATTEMPTS = int(os.getenv("CRAWL_JOB_MAX_ATTEMPTS", "3"))
+ENQUEUE_BATCH_SIZE = 1000
+ZIP_DATA_FIELDS = ("state_id", "city", "county", "county_fips")
+
+
+def db_now():
+    # Compare leases on the database clock so worker clock skew doesn't matter.
+    return func.timezone("UTC", func.now())
+
+
+def job_to_row(run_id, job):
+    return {
+        "run_id": run_id,
+        "zip_code": job.zip_code,
+        "status_type": job.status_type,
+        "sold_in_last": job.sold_in_last or "",
+        "zip_data": {
+            field: getattr(job.zip_data, field, None) for field in ZIP_DATA_FIELDS
+        },
+        "priority": job.priority,
+        "estimated_calls": job.estimated_calls,
+        "status": "pending",
+        "attempts": 0,
+    }
+
+
+def job_from_row(row):
+    zip_data = row["zip_data"] or {}
+    return CrawlJob(
+        row["zip_code"],
+        ZipRecord(row["zip_code"], *(zip_data.get(field) for field in ZIP_DATA_FIELDS)),
+        row["status_type"],
+        row["sold_in_last"] or None,
+        row["priority"],
+        row["estimated_calls"],
+    )
+
+
+def build_enqueue_statement(rows):
+    """
+    Add jobs to a run's queue. Jobs already queued are left alone, except failed
+    ones, which go back to pending so a resumed run retries them.
+    """
+    stmt = insert(CrawlQueueJob).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["run_id", "zip_code", "status_type"],
+        set_={
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "updated_at": db_now(),
+        },
+        where=CrawlQueueJob.status == "failed",
+    )
+
+
+def enqueue_jobs(run_id, jobs):
+    rows = [job_to_row(run_id, job) for job in jobs]
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            for start in range(0, len(rows), ENQUEUE_BATCH_SIZE):
+                db.execute(
+                    build_enqueue_statement(rows[start : start + ENQUEUE_BATCH_SIZE])
+                )
+    finally:
+        db.close()
+    logger.info(f"Queued {len(rows)} crawl jobs for run {run_id}")
+    return len(rows)
+
+
+def build_claim_statement(
+    run_id, worker_id, limit, lease_seconds=CRAWL_JOB_LEASE_SECONDS
+):
+    """
+    Lease up to `limit` of the highest priority claimable jobs: pending ones and
+    running ones whose worker let the lease expire. SKIP LOCKED lets concurrent
+    workers claim different jobs without waiting on each other.
+    """
+    claimable = (
+        select(CrawlQueueJob.id)
+        .where(
+            CrawlQueueJob.run_id == run_id,
+            or_(
+                CrawlQueueJob.status == "pending",
+                and_(
+                    CrawlQueueJob.status == "running",
+                    CrawlQueueJob.lease_expires_at < db_now(),
+                    CrawlQueueJob.attempts < CRAWL_JOB_MAX_ATTEMPTS,
+                ),
+            ),
+        )
+        .order_by(CrawlQueueJob.priority.desc(), CrawlQueueJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(CrawlQueueJob)
+        .where(CrawlQueueJob.id.in_(claimable))
+        .values(
+            status="running",
+            worker_id=worker_id,
+            attempts=CrawlQueueJob.attempts + 1,
+            lease_expires_at=db_now() + timedelta(seconds=lease_seconds),
+            updated_at=db_now(),
+        )
+        .returning(*CrawlQueueJob.__table__.columns)
+    )
+
+
+def build_fail_expired_statement(run_id):
+    """
+    Give up on jobs that lost their lease CRAWL_JOB_MAX_ATTEMPTS times.
+    """
+    return (
+        update(CrawlQueueJob)
+        .where(
+            CrawlQueueJob.run_id == run_id,
+            CrawlQueueJob.status == "running",
+            CrawlQueueJob.lease_expires_at < db_now(),
+            CrawlQueueJob.attempts >= CRAWL_JOB_MAX_ATTEMPTS,
+        )
+        .values(status="failed", error="Lease expired", updated_at=db_now())
+    )
+
+
+def claim_jobs(run_id, worker_id, limit):
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            db.execute(build_fail_expired_statement(run_id))
+            rows = db.execute(build_claim_statement(run_id, worker_id, limit))
+            claimed = [dict(row) for row in rows.mappings()]
+    finally:
+        db.close()
+    # UPDATE ... RETURNING comes back in no particular order.
+    claimed.sort(key=lambda row: (-row["priority"], row["id"]))
+    return claimed
+
+
+def renew_leases(worker_id, lease_seconds=CRAWL_JOB_LEASE_SECONDS):
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            result = db.execute(
+                update(CrawlQueueJob)
+                .where(
+                    CrawlQueueJob.worker_id == worker_id,
+                    CrawlQueueJob.status == "running",
+                )
+                .values(lease_expires_at=db_now() + timedelta(seconds=lease_seconds))
+            )
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def update_job(job_id, worker_id, **values):
+    """
+    Update a job only while this worker still holds it; after a lost lease the
+    job belongs to whichever worker claimed it next.
+    """
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            result = db.execute(
+                update(CrawlQueueJob)
+                .where(
+                    CrawlQueueJob.id == job_id,
+                    CrawlQueueJob.worker_id == worker_id,
+                    CrawlQueueJob.status == "running",
+                )
+                .values(**values, updated_at=db_now())
+            )
+        if not result.rowcount:
+            logger.warning(f"Crawl job {job_id} is no longer leased to {worker_id}")
+        return bool(result.rowcount)
+    finally:
+        db.close()
+
+
+def complete_job(job_id, worker_id, result):
+    return update_job(
+        job_id, worker_id, status="done", result=result, lease_expires_at=None
+    )
+
+
+def fail_job(job_id, worker_id, error):
+    return update_job(
+        job_id,
+        worker_id,
+        status=case(
+            (CrawlQueueJob.attempts >= CRAWL_JOB_MAX_ATTEMPTS, "failed"),
+            else_="pending",
+        ),
+        error=str(error),
+        worker_id=None,
+        lease_expires_at=None,
+    )
+
+
+def release_job(job_id, worker_id):
+    """
+    Hand a claimed job back untouched, e.g. when it doesn't fit the API budget.
+    """
+    return update_job(
+        job_id,
+        worker_id,
+        status="pending",
+        attempts=CrawlQueueJob.attempts - 1,
+        worker_id=None,
+        lease_expires_at=None,
+    )
+
+
+def get_queue_counts(run_id):
+    db: Session = SessionLocal()
+    try:
+        return dict(
+            db.execute(
+                select(CrawlQueueJob.status, func.count())
+                .where(CrawlQueueJob.run_id == run_id)
+                .group_by(CrawlQueueJob.status)
+            ).all()
+        )
+    finally:
+        db.close()
+
+
+def get_run_jobs(run_id):
+    db: Session = SessionLocal()
+    try:
+        return [
+            dict(row)
+            for row in db.execute(
+                select(*CrawlQueueJob.__table__.columns).where(
+                    CrawlQueueJob.run_id == run_id
+                )
+            ).mappings()
+        ]
+    finally:
+        db.close()
+
+
+def get_open_run_id():
+    """
+    Latest unfinished crawl run that has queued jobs.
+    """
+    db: Session = SessionLocal()
+    try:
+        return db.scalar(
+            select(CrawlRun.id)
+            .where(
+                CrawlRun.finished_at.is_(None),
+                select(CrawlQueueJob.id)
+                .where(CrawlQueueJob.run_id == CrawlRun.id)
+                .exists(),
+            )
+            .order_by(CrawlRun.id.desc())
+            .limit(1)
+        )
+    finally:
+        db.close()
+
+
+def claim_run_finish(run_id):
+    """
+    Mark the run finished unless another worker already did. Exactly one worker
+    gets True and records the run's results.
+    """
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            result = db.execute(
+                update(CrawlRun)
+                .where(CrawlRun.id == run_id, CrawlRun.finished_at.is_(None))
+                .values(finished_at=db_now())
+            )
+        return bool(result.rowcount)
+    finally:
+        db.close()
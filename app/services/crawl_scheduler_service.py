@@ -0,0 +1,225 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# Relative share of API quota each phase should get while both have work queued.
+DEFAULT_PHASE_WEIGHTS = {
+    "RecentlySold": 1.0,
+    "ForSale": 1.0,
+}
+
+
+def parse_phase_weights(value):
+    """
+    Parse "ForSale=2,RecentlySold=0.5" into phase weights. Phases left out keep
+    their default weight.
+    """
+    weights = dict(DEFAULT_PHASE_WEIGHTS)
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        status_type, _, weight = item.partition("=")
+        status_type = status_type.strip()
+        if status_type not in weights:
+            raise ValueError(f"Unknown crawl phase {status_type!r} in {value!r}")
+        weights[status_type] = float(weight)
+        if weights[status_type] < 0:
+            raise ValueError(f"Phase weight for {status_type} must not be negative")
+    return weights
+
+
+PHASE_WEIGHTS = parse_phase_weights(os.getenv("CRAWL_PHASE_WEIGHTS", ""))
+MIN_CONCURRENCY = 2
+MAX_CONCURRENCY = 50
+# Staleness is capped so never-crawled zips don't drown out everything else.
+MAX_STALENESS_HOURS = 24 * 30
+DEFAULT_EXPECTED_RESULTS = 100
+DISPATCH_INTERVAL = 0.25
+# How long to wait before asking for more jobs after a refill came back empty.
+REFILL_INTERVAL = 2.0
+
+
+class CrawlJob:
+    __slots__ = (
+        "zip_code",
+        "zip_data",
+        "status_type",
+        "sold_in_last",
+        "priority",
+        "estimated_calls",
+    )
+
+    def __init__(
+        self,
+        zip_code,
+        zip_data,
+        status_type,
+        sold_in_last=None,
+        priority=0,
+        estimated_calls=0,
+    ):
+        self.zip_code = zip_code
+        self.zip_data = zip_data
+        self.status_type = status_type
+        self.sold_in_last = sold_in_last
+        self.priority = priority
+        self.estimated_calls = estimated_calls
+
+    def __repr__(self):
+        return f"CrawlJob({self.zip_code}, {self.status_type}, soldInLast={self.sold_in_last}, priority={self.priority:.2f})"
+
+
+def job_priority(status_type, last_crawled_at, expected_results, phase_weights):
+    """
+    Higher is more urgent: stale zips with many expected results come first,
+    scaled by the phase weight.
+    """
+    if last_crawled_at is None:
+        staleness_hours = MAX_STALENESS_HOURS
+    else:
+        if last_crawled_at.tzinfo is None:
+            last_crawled_at = last_crawled_at.replace(tzinfo=timezone.utc)
+        age = datetime.now(timezone.utc) - last_crawled_at
+        staleness_hours = min(age.total_seconds() / 3600, MAX_STALENESS_HOURS)
+    if expected_results is None:
+        expected_results = DEFAULT_EXPECTED_RESULTS
+    return (
+        phase_weights.get(status_type, 1.0)
+        * (1 + staleness_hours)
+        * (1 + math.log1p(expected_results))
+    )
+
+
+class CrawlScheduler:
+    """
+    Runs every (zip, status_type, soldInLast) job from one priority queue. New jobs
+    are started while the rate limiter has spare capacity, i.e. fewer callers are
+    waiting for tokens than it can start in a second, so quota isn't left idle at
+    the tail of a phase.
+
+    With a budget, each job must be admitted against its estimated API calls
+    before it starts. Jobs that don't fit once the running ones have finished
+    are deferred to the next budget window, so the quota goes to the most
+    valuable zips first.
+    """
+
+    def __init__(
+        self,
+        rate_limiter,
+        crawl_history=None,
+        phase_weights=None,
+        min_concurrency=MIN_CONCURRENCY,
+        max_concurrency=MAX_CONCURRENCY,
+        budget=None,
+    ):
+        self.rate_limiter = rate_limiter
+        self.crawl_history = crawl_history or {}
+        self.phase_weights = phase_weights or PHASE_WEIGHTS
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.queue = asyncio.PriorityQueue()
+        self.sequence = 0
+        self.budget = budget
+        self.active = {}
+        self.deferred = []
+
+    def add_job(
+        self, zip_code, zip_data, status_type, sold_in_last=None, estimated_calls=0
+    ):
+        history = self.crawl_history.get((zip_code, status_type), {})
+        priority = job_priority(
+            status_type,
+            history.get("updated_at"),
+            history.get("total_results"),
+            self.phase_weights,
+        )
+        job = CrawlJob(
+            zip_code, zip_data, status_type, sold_in_last, priority, estimated_calls
+        )
+        self.push(job)
+        return job
+
+    def push(self, job):
+        # Negate so the highest priority is popped first; sequence keeps FIFO order.
+        self.queue.put_nowait((-job.priority, self.sequence, job))
+        self.sequence += 1
+
+    def has_spare_capacity(self):
+        if len(self.active) < self.min_concurrency:
+            return True
+        if len(self.active) >= self.max_concurrency:
+            return False
+        return self.rate_limiter.waiting < self.rate_limiter.rate
+
+    async def run(self, handler, refill=None):
+        """
+        Run queued jobs until the queue is drained. refill is an optional async
+        callable that returns more jobs, [] when there are none right now and None
+        when there will be no more; it is called whenever the queue runs dry and
+        there is capacity, which is how crawl workers pull from the shared queue.
+        """
+        total_jobs = self.queue.qsize()
+        next_refill = 0.0
+        with tqdm(total=total_jobs, desc="Processing Properties") as progress:
+            while refill or not self.queue.empty() or self.active:
+                if (
+                    refill
+                    and self.queue.empty()
+                    and self.has_spare_capacity()
+                    and time.monotonic() >= next_refill
+                ):
+                    jobs = await refill()
+                    if jobs is None:
+                        refill = None
+                    elif not jobs:
+                        next_refill = time.monotonic() + REFILL_INTERVAL
+                    for job in jobs or []:
+                        self.push(job)
+                        total_jobs += 1
+                    progress.total = total_jobs
+                    progress.refresh()
+                while not self.queue.empty() and self.has_spare_capacity():
+                    item = self.queue.get_nowait()
+                    job = item[2]
+                    if self.budget and not self.budget.admit(job.estimated_calls):
+                        if self.active:
+                            # Running jobs still hold reservations; decide once
+                            # they finish and the real spend is known.
+                            self.queue.put_nowait(item)
+                            break
+                        self.deferred.append(job)
+                        progress.update(1)
+                        continue
+                    self.active[asyncio.create_task(handler(job))] = job
+                if not self.active:
+                    if refill and self.queue.empty():
+                        await asyncio.sleep(DISPATCH_INTERVAL)
+                    continue
+                done, _ = await asyncio.wait(
+                    self.active,
+                    timeout=DISPATCH_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    job = self.active.pop(task)
+                    if self.budget:
+                        self.budget.release(job.estimated_calls)
+                    if task.exception() is not None:
+                        logger.error(f"Crawl job failed: {task.exception()}")
+                progress.update(len(done))
+        if self.deferred:
+            logger.warning(
+                f"Deferred {len(self.deferred)} jobs ({sum(job.estimated_calls for job in self.deferred)} estimated calls) to the next budget window"
+            )
+        logger.info(f"Crawl scheduler finished {total_jobs - len(self.deferred)} jobs")
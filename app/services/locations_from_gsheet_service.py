@@ -1,11 +1,114 @@
+import os
 import csv
+import json
+import asyncio
+import logging
+from urllib.parse import urlparse
 import aiohttp
+from app.services.zipcode_service import create_zip_records
 
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
 
-async def fetch_locations_from_google_sheet(sheet_url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(sheet_url) as response:
-            response_text = await response.text()
-            reader = csv.DictReader(response_text.splitlines())
-            locations = [row for row in reader]
-    return locations
+# Local copy of the last downloaded sheet, used for conditional requests and
+# offline runs. Its ETag, Last-Modified and zip codes are kept next to it.
+LOCATIONS_CACHE_PATH = os.getenv("LOCATIONS_CACHE_PATH", "locations_cache.csv")
+LOCATIONS_CACHE_META_PATH = f"{LOCATIONS_CACHE_PATH}.json"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def is_local_source(source):
+    return urlparse(source).scheme in ("", "file")
+
+
+def read_cache_meta():
+    if not os.path.exists(LOCATIONS_CACHE_META_PATH):
+        return {}
+    with open(LOCATIONS_CACHE_META_PATH) as meta_file:
+        return json.load(meta_file)
+
+
+def write_cache_meta(meta):
+    with open(LOCATIONS_CACHE_META_PATH, "w") as meta_file:
+        json.dump(meta, meta_file)
+
+
+def conditional_headers(meta, sheet_url):
+    if meta.get("url") != sheet_url or not os.path.exists(LOCATIONS_CACHE_PATH):
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+async def download_sheet(sheet_url, session, meta):
+    """
+    Refresh the cached sheet with a conditional GET. Returns False when the
+    sheet has not changed since the cached copy was downloaded.
+    """
+    async with session.get(
+        sheet_url, headers=conditional_headers(meta, sheet_url)
+    ) as response:
+        if response.status == 304:
+            return False
+        response.raise_for_status()
+        tmp_path = f"{LOCATIONS_CACHE_PATH}.tmp"
+        with open(tmp_path, "wb") as cache_file:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                cache_file.write(chunk)
+        os.replace(tmp_path, LOCATIONS_CACHE_PATH)
+        meta.update(
+            url=sheet_url,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return True
+
+
+def read_zip_records(path):
+    # DictReader pulls lines from the file lazily, so rows go straight into
+    # ZipRecords without a list of row dicts in between.
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        return create_zip_records(csv.DictReader(csv_file))
+
+
+async def fetch_locations_from_google_sheet(sheet_url, session=None):
+    """
+    Load the zip codes to crawl from the published sheet, or from a local CSV
+    file when given a path. Returns ZipRecords keyed by zip code together with
+    the zip codes added to and removed from the sheet since its previous load,
+    which are only reported. Local files leave the sheet's cached copy and
+    metadata alone and report no changes.
+    """
+    if is_local_source(sheet_url):
+        return read_zip_records(urlparse(sheet_url).path), set(), set()
+
+    meta = read_cache_meta()
+    # Zip codes of an earlier load of a different sheet are no baseline.
+    previous = set(meta.get("zip_codes", [])) if meta.get("url") == sheet_url else None
+    try:
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                changed = await download_sheet(sheet_url, own_session, meta)
+        else:
+            changed = await download_sheet(sheet_url, session, meta)
+        if not changed:
+            logger.info("Location sheet not modified, using the cached copy")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if not os.path.exists(LOCATIONS_CACHE_PATH):
+            raise
+        logger.warning(f"Could not fetch location sheet, using the cached copy: {e}")
+    zip_records = read_zip_records(LOCATIONS_CACHE_PATH)
+
+    added = set(zip_records) - previous if previous is not None else set()
+    removed = previous - set(zip_records) if previous is not None else set()
+    meta["zip_codes"] = sorted(zip_records)
+    write_cache_meta(meta)
+    return zip_records, added, removed
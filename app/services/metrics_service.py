@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+METRICS_PREFIX = "isidore_"
+METRICS_TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE_PATH", "metrics/isidore.prom")
+METRICS_SUMMARY_PATH = os.getenv("METRICS_SUMMARY_PATH", "metrics/crawl_summary.json")
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+TOP_ZIPS = 20
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket, not cumulative.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 4),
+        }
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key, extra=()):
+    items = [*key, *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms for one crawl run. Updates are a
+    dict lookup under a lock, cheap enough for the request and write hot paths.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.zip_calls = Counter()
+            self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def count_zip_call(self, zip_code):
+        with self.lock:
+            self.zip_calls[zip_code] += 1
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def counter_total(self, name):
+        return sum(value for (key, _), value in self.counters.items() if key == name)
+
+    def histogram_total(self, name):
+        return sum(
+            histogram.sum
+            for (key, _), histogram in self.histograms.items()
+            if key == name
+        )
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+                    for (metric, key), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(
+                                f"{METRICS_PREFIX}{name}{format_labels(key)} {value}"
+                            )
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+                for (metric, key), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(
+                        (*histogram.buckets, "+Inf"), histogram.counts
+                    ):
+                        cumulative += bucket_count
+                        lines.append(
+                            f"{METRICS_PREFIX}{name}_bucket{format_labels(key, [('le', bound)])} {cumulative}"
+                        )
+                    lines.append(
+                        f"{METRICS_PREFIX}{name}_sum{format_labels(key)} {histogram.sum}"
+                    )
+                    lines.append(
+                        f"{METRICS_PREFIX}{name}_count{format_labels(key)} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            zip_calls = list(self.zip_calls.values())
+            summary = {
+                "duration_seconds": round(time.time() - self.started_at, 1),
+                "counters": {
+                    f"{name}{format_labels(key)}": value
+                    for (name, key), value in sorted(self.counters.items())
+                },
+                "gauges": {
+                    f"{name}{format_labels(key)}": value
+                    for (name, key), value in sorted(self.gauges.items())
+                },
+                "histograms": {
+                    f"{name}{format_labels(key)}": histogram.summary()
+                    for (name, key), histogram in sorted(self.histograms.items())
+                },
+                "calls_per_zip": {
+                    "zips": len(zip_calls),
+                    "mean": (
+                        round(sum(zip_calls) / len(zip_calls), 2) if zip_calls else 0
+                    ),
+                    "max": max(zip_calls, default=0),
+                    "top": dict(self.zip_calls.most_common(TOP_ZIPS)),
+                },
+            }
+        return summary
+
+    def write(
+        self, textfile_path=METRICS_TEXTFILE_PATH, summary_path=METRICS_SUMMARY_PATH
+    ):
+        """
+        Write the Prometheus textfile and the JSON run summary. Both are written
+        to a temporary file first so collectors never read a partial file.
+        """
+        for path, content in (
+            (textfile_path, self.to_prometheus()),
+            (summary_path, json.dumps(self.summary(), indent=2, default=str)),
+        ):
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(f"{path}.tmp", "w") as metrics_file:
+                metrics_file.write(content)
+            os.replace(f"{path}.tmp", path)
+        logger.info(f"Wrote metrics to {textfile_path} and {summary_path}")
+
+
+class Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(
+            self.name, time.perf_counter() - self.started, **self.labels
+        )
+
+
+metrics = MetricsRegistry()
+
+
+def timed(name, **labels):
+    """
+    Record the wall time of every call of the decorated function, sync or async,
+    in the `name` histogram.
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metrics.observe(name, time.perf_counter() - started, **labels)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - started, **labels)
+
+        return wrapper
+
+    return decorator
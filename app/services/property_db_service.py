@@ -1,9 +1,18 @@
+import os
+import asyncio
 import logging
-import re
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from app.db import SessionLocal
-from app.models import Property
+from app.db import USE_ASYNC_DB, SessionLocal, get_async_sessionmaker
+from app.models import Property, PropertySnapshot
+from app.services.metrics_service import metrics
+from app.services.property_parse_service import (
+    SNAPSHOT_FIELDS,
+    PropertyRecord,
+    parse_properties,
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -12,6 +21,292 @@ logging.basicConfig(
     handlers=[logging.FileHandler("app.log")],
 )
 
+BATCH_SIZE = 1000
+# updated_at is now() at the start of the writing transaction, and up to
+# WRITER_CONCURRENCY transactions write at once, so a row can commit after rows
+# with a later updated_at. Incremental readers only trust updated_at values at
+# least this old; it must exceed the longest write transaction.
+UPDATED_AT_VISIBILITY_LAG = timedelta(
+    seconds=int(os.getenv("UPDATED_AT_VISIBILITY_LAG_SECONDS", "300"))
+)
+
+# Columns refreshed when an existing property's content hash changes.
+UPDATE_COLUMNS = [
+    "price",
+    "listing_status",
+    "price_change",
+    "zestimate",
+    "img_src",
+    "detail_url",
+    "bedrooms",
+    "bathrooms",
+    "living_area",
+    "lot_area_value",
+    "lot_area_unit",
+    "contingent_listing_type",
+    "rent_zestimate",
+    "days_on_zillow",
+    "date_sold",
+    "country",
+    "currency",
+    "has_image",
+    "county_name",
+    "state_id",
+    "county_fips",
+    "zip_code",
+    "content_hash",
+]
+
+# Partitions of property_snapshots already created by this process.
+snapshot_partitions = set()
+
+
+def property_to_row(property_data):
+    """
+    Map a Zillow property dict onto the columns of the properties table.
+    """
+    return parse_properties([property_data])[0].as_row()
+
+
+def properties_to_rows(properties):
+    """
+    Rows for a batch of PropertyRecords, parsing raw Zillow dicts first.
+    """
+    records = [
+        prop for prop in properties if isinstance(prop, PropertyRecord)
+    ] + parse_properties([prop for prop in properties if isinstance(prop, dict)])
+    return dedupe_rows([record.as_row() for record in records])
+
+
+def build_upsert_statement(rows):
+    """
+    Build one INSERT ... ON CONFLICT (zpid) DO UPDATE for a batch of rows. Rows are
+    only updated when their content hash changed, and the RETURNING clause
+    reports whether each touched row was inserted or updated.
+    """
+    stmt = insert(Property).values(rows)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[Property.zpid],
+        set_={
+            **{column: getattr(excluded, column) for column in UPDATE_COLUMNS},
+            "updated_at": func.now(),
+        },
+        where=Property.content_hash.is_distinct_from(excluded.content_hash),
+    ).returning(Property.zpid, literal_column("(xmax = 0)").label("inserted"))
+
+
+def dedupe_rows(rows):
+    # ON CONFLICT cannot touch the same row twice in one statement, so keep the
+    # last occurrence of each zpid (price ranges overlap at their boundaries).
+    # Sorting by zpid makes concurrent batches lock rows in the same order.
+    unique_rows = {row["zpid"]: row for row in rows}
+    return [unique_rows[zpid] for zpid in sorted(unique_rows)]
+
+
+def incremental_watermark(newest_updated_at, now, since=None):
+    """
+    Watermark to store after reading rows updated after `since`, given the newest
+    updated_at read and the database time of the read. Rows written by
+    transactions that were still open may carry an older updated_at than rows
+    already read, so the watermark never passes now - UPDATED_AT_VISIBILITY_LAG.
+    Rows read between the two are read again next time.
+    """
+    if newest_updated_at is None:
+        return since
+    watermark = min(newest_updated_at, now - UPDATED_AT_VISIBILITY_LAG)
+    return max(watermark, since) if since is not None else watermark
+
+
+def build_known_hashes_query(zpids):
+    return select(Property.zpid, Property.content_hash).where(Property.zpid.in_(zpids))
+
+
+def changed_rows(rows, known_hashes):
+    """
+    Rows that are new or whose content hash differs from the stored one.
+    """
+    return [row for row in rows if known_hashes.get(row["zpid"]) != row["content_hash"]]
+
+
+def snapshot_time():
+    # Naive UTC, so the partition picked here is the one Postgres routes the row
+    # to regardless of the session time zone.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def snapshot_partition(observed_at):
+    """
+    Name and bounds of the monthly property_snapshots partition for a timestamp.
+    """
+    start = observed_at.date().replace(day=1)
+    end = (
+        start.replace(year=start.year + 1, month=1)
+        if start.month == 12
+        else start.replace(month=start.month + 1)
+    )
+    return f"property_snapshots_{start:%Y_%m}", start, end
+
+
+def build_snapshot_partition_statements(observed_at):
+    name, start, end = snapshot_partition(observed_at)
+    # The advisory lock keeps concurrent writers from racing on the same DDL.
+    return name, [
+        text("SELECT pg_advisory_xact_lock(hashtext('property_snapshots'))"),
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF property_snapshots "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        ),
+    ]
+
+
+def build_snapshot_insert(rows, observed_at):
+    return PropertySnapshot.__table__.insert().values(
+        [
+            {
+                "observed_at": observed_at,
+                "zpid": row["zpid"],
+                "zip_code": row["zip_code"],
+                "content_hash": row["content_hash"],
+                **{name: row[name] for name in SNAPSHOT_FIELDS},
+            }
+            for row in rows
+        ]
+    )
+
+
+def count_upsert_results(results, batch_size):
+    inserted = sum(1 for result in results if result.inserted)
+    updated = len(results) - inserted
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": batch_size - inserted - updated,
+    }
+
+
+def record_batch_metrics(counts):
+    for result, rows in counts.items():
+        metrics.inc("db_rows_total", rows, result=result)
+
+
+def merge_counts(totals, counts):
+    for key, value in counts.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def write_batch(db, batch, observed_at):
+    """
+    Upsert one batch and append a snapshot for every row that was written. Rows
+    whose hash matches the stored one are dropped before the upsert, so unchanged
+    properties cost one indexed read and no write.
+    """
+    known_hashes = dict(
+        db.execute(build_known_hashes_query([row["zpid"] for row in batch])).all()
+    )
+    rows = changed_rows(batch, known_hashes)
+    if not rows:
+        return []
+    results = db.execute(build_upsert_statement(rows)).all()
+    written = {result.zpid for result in results}
+    if written:
+        db.execute(
+            build_snapshot_insert(
+                [row for row in rows if row["zpid"] in written], observed_at
+            )
+        )
+    return results
+
+
+async def write_batch_async(db, batch, observed_at):
+    known_hashes = dict(
+        (
+            await db.execute(build_known_hashes_query([row["zpid"] for row in batch]))
+        ).all()
+    )
+    rows = changed_rows(batch, known_hashes)
+    if not rows:
+        return []
+    results = (await db.execute(build_upsert_statement(rows))).all()
+    written = {result.zpid for result in results}
+    if written:
+        await db.execute(
+            build_snapshot_insert(
+                [row for row in rows if row["zpid"] in written], observed_at
+            )
+        )
+    return results
+
+
+def ensure_snapshot_partition(db, observed_at):
+    name, statements = build_snapshot_partition_statements(observed_at)
+    if name in snapshot_partitions:
+        return
+    with db.begin():
+        for statement in statements:
+            db.execute(statement)
+    snapshot_partitions.add(name)
+
+
+async def ensure_snapshot_partition_async(db, observed_at):
+    name, statements = build_snapshot_partition_statements(observed_at)
+    if name in snapshot_partitions:
+        return
+    async with db.begin():
+        for statement in statements:
+            await db.execute(statement)
+    snapshot_partitions.add(name)
+
+
+def upsert_properties(properties_data, batch_size=BATCH_SIZE):
+    """
+    Insert or update properties in batches, one transaction per batch, and record
+    changed rows in property_snapshots. Accepts PropertyRecords or raw Zillow
+    dicts. Returns the number of inserted, updated and unchanged properties.
+    """
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    rows = properties_to_rows(properties_data)
+    observed_at = snapshot_time()
+    db: Session = SessionLocal()
+    try:
+        ensure_snapshot_partition(db, observed_at)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            with metrics.timer("db_batch_write_seconds"), db.begin():
+                results = write_batch(db, batch, observed_at)
+            counts = count_upsert_results(results, len(batch))
+            record_batch_metrics(counts)
+            merge_counts(totals, counts)
+    finally:
+        db.close()
+    return totals
+
+
+async def upsert_properties_async(properties_data, batch_size=BATCH_SIZE):
+    """
+    Awaitable counterpart of upsert_properties. Uses the asyncpg engine when
+    USE_ASYNC_DB is set, otherwise runs the sync upsert in a worker thread.
+    """
+    if not USE_ASYNC_DB:
+        return await asyncio.to_thread(
+            upsert_properties, properties_data, batch_size=batch_size
+        )
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    rows = properties_to_rows(properties_data)
+    observed_at = snapshot_time()
+    async with get_async_sessionmaker()() as db:
+        await ensure_snapshot_partition_async(db, observed_at)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            with metrics.timer("db_batch_write_seconds"):
+                async with db.begin():
+                    results = await write_batch_async(db, batch, observed_at)
+            counts = count_upsert_results(results, len(batch))
+            record_batch_metrics(counts)
+            merge_counts(totals, counts)
+    return totals
+
 
 def get_or_create_properties(properties_data):
     zip_code = properties_data[0]["zip_code"]
@@ -21,109 +316,11 @@ def get_or_create_properties(properties_data):
     logger.info(
         f"Zip Code: {zip_code}, State ID: {state_id}, Listing Status: {listing_status}, Number of Properties: {number_of_properties}"
     )
-    db: Session = SessionLocal()
     try:
-        for property_data in properties_data:
-            zpid = int(property_data["zpid"])
-            db_property = db.query(Property).filter(Property.zpid == zpid).first()
-            if db_property:
-                # Update the property if necessary
-                if db_property.price != property_data.get(
-                    "price"
-                ) or db_property.listing_status != property_data.get("listingStatus"):
-                    db_property.price = property_data.get("price")
-                    db_property.listing_status = property_data.get("listingStatus")
-                    db_property.price_change = property_data.get("priceChange")
-                    db_property.zestimate = property_data.get("zestimate")
-                    db_property.img_src = property_data.get("imgSrc")
-                    db_property.detail_url = property_data.get("detailUrl")
-                    db_property.bedrooms = property_data.get("bedrooms")
-                    db_property.bathrooms = property_data.get("bathrooms")
-                    db_property.living_area = property_data.get("livingArea")
-                    db_property.lot_area_value = property_data.get("lotAreaValue")
-                    db_property.lot_area_unit = property_data.get("lotAreaUnit")
-                    db_property.contingent_listing_type = property_data.get(
-                        "contingentListingType"
-                    )
-                    db_property.rent_zestimate = property_data.get("rentZestimate")
-                    db_property.days_on_zillow = property_data.get("daysOnZillow")
-                    db_property.date_sold = (
-                        datetime.fromtimestamp(
-                            property_data.get("dateSold") / 1000, timezone.utc
-                        ).date()
-                        if property_data.get("dateSold")
-                        else None
-                    )
-                    db_property.country = property_data.get("country")
-                    db_property.currency = property_data.get("currency")
-                    db_property.has_image = property_data.get("hasImage")
-                    db_property.county_name = property_data.get("county_name")
-                    db_property.state_id = property_data.get("state_id")
-                    db_property.county_fips = property_data.get("county_fips")
-                    db_property.zip_code = (
-                        re.search(
-                            r"\b\d{5}\b$", property_data.get("address", "")
-                        ).group(0)
-                        if re.search(r"\b\d{5}\b$", property_data.get("address", ""))
-                        else None
-                    )
-                    db.commit()
-            else:
-                new_property = Property(
-                    zpid=zpid,
-                    address=property_data.get("address"),
-                    unit=property_data.get("unit"),
-                    latitude=property_data.get("latitude"),
-                    longitude=property_data.get("longitude"),
-                    price=property_data.get("price"),
-                    price_change=property_data.get("priceChange"),
-                    zestimate=property_data.get("zestimate"),
-                    img_src=property_data.get("imgSrc"),
-                    detail_url=f"https://www.zillow.com{property_data.get('detailUrl')}",
-                    bedrooms=property_data.get("bedrooms"),
-                    bathrooms=property_data.get("bathrooms"),
-                    living_area=property_data.get("livingArea"),
-                    lot_area_value=property_data.get("lotAreaValue"),
-                    lot_area_unit=property_data.get("lotAreaUnit"),
-                    listing_status=property_data.get("listingStatus"),
-                    property_type=property_data.get("propertyType"),
-                    contingent_listing_type=property_data.get("contingentListingType"),
-                    rent_zestimate=property_data.get("rentZestimate"),
-                    days_on_zillow=property_data.get("daysOnZillow"),
-                    date_sold=datetime.fromtimestamp(
-                        property_data.get("dateSold") / 1000, timezone.utc
-                    ).date()
-                    if property_data.get("dateSold")
-                    else None,
-                    country=property_data.get("country"),
-                    currency=property_data.get("currency"),
-                    has_image=property_data.get("hasImage"),
-                    county_name=property_data.get("county_name"),
-                    state_id=property_data.get("state_id"),
-                    county_fips=property_data.get("county_fips"),
-                    zip_code=re.search(
-                        r"\b\d{5}\b$", property_data.get("address", "")
-                    ).group(0)
-                    if re.search(r"\b\d{5}\b$", property_data.get("address", ""))
-                    else None,
-                )
-                db.add(new_property)
-                db.commit()
-        number_of_properties_check = (
-            db.query(Property)
-            .filter(
-                Property.zip_code == zip_code, Property.listing_status == listing_status
-            )
-            .count()
-        )
+        counts = upsert_properties(properties_data)
         logger.info(
-            f"Zip Code: {zip_code}, State ID: {state_id}, Listing Status: {listing_status}, Num of Properties to Check or Write: {number_of_properties}, Num of Properties Checked or Written: {number_of_properties_check}"
+            f"Zip Code: {zip_code}, State ID: {state_id}, Listing Status: {listing_status}, Inserted: {counts['inserted']}, Updated: {counts['updated']}, Unchanged: {counts['unchanged']}"
         )
-        if number_of_properties > number_of_properties_check:
-            logger.error(
-                f"Zip Code: {zip_code}, State ID: {state_id}, Listing Status: {listing_status}, Number of properties to check or write: {number_of_properties} greater than number of properties checked or written: {number_of_properties_check}. There may have been a write error."
-            )
+        return counts
     except Exception as e:
         logger.error(f"Error in get_or_create_properties: {e}")
-    finally:
-        db.close()
@@ -0,0 +1,68 @@
+import logging
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import PropertySnapshot
+from app.services.property_parse_service import SNAPSHOT_FIELDS
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+
+def snapshot_to_dict(snapshot):
+    return {
+        "zpid": snapshot.zpid,
+        "zip_code": snapshot.zip_code,
+        "observed_at": snapshot.observed_at,
+        **{name: getattr(snapshot, name) for name in SNAPSHOT_FIELDS},
+    }
+
+
+def build_price_history_query(zpid, since=None):
+    query = select(PropertySnapshot).where(PropertySnapshot.zpid == zpid)
+    if since is not None:
+        query = query.where(PropertySnapshot.observed_at >= since)
+    return query.order_by(PropertySnapshot.observed_at)
+
+
+def build_zip_changes_query(zip_code, since):
+    return (
+        select(PropertySnapshot)
+        .where(
+            PropertySnapshot.zip_code == zip_code,
+            PropertySnapshot.observed_at >= since,
+        )
+        .order_by(PropertySnapshot.observed_at, PropertySnapshot.zpid)
+    )
+
+
+def get_price_history(zpid, since=None):
+    """
+    Every recorded change of one property, oldest first.
+    """
+    db: Session = SessionLocal()
+    try:
+        return [
+            snapshot_to_dict(snapshot)
+            for snapshot in db.scalars(build_price_history_query(zpid, since))
+        ]
+    finally:
+        db.close()
+
+
+def get_zip_changes_since(zip_code, since):
+    """
+    All property changes recorded in a zip since a date, oldest first.
+    """
+    db: Session = SessionLocal()
+    try:
+        return [
+            snapshot_to_dict(snapshot)
+            for snapshot in db.scalars(build_zip_changes_query(zip_code, since))
+        ]
+    finally:
+        db.close()
@@ -0,0 +1,127 @@
+import re
+import hashlib
+import orjson
+import numpy as np
+
+ZILLOW_URL = "https://www.zillow.com"
+# Same pattern the per-property parser used, compiled once.
+ZIP_CODE_PATTERN = re.compile(r"\b\d{5}\b$")
+
+# Property column -> key in a Zillow search result. Columns without a plain
+# source key (detail_url, date_sold, zip_code) are derived per page below.
+PROPERTY_FIELDS = {
+    "zpid": "zpid",
+    "address": "address",
+    "unit": "unit",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "price": "price",
+    "price_change": "priceChange",
+    "zestimate": "zestimate",
+    "img_src": "imgSrc",
+    "bedrooms": "bedrooms",
+    "bathrooms": "bathrooms",
+    "living_area": "livingArea",
+    "lot_area_value": "lotAreaValue",
+    "lot_area_unit": "lotAreaUnit",
+    "listing_status": "listingStatus",
+    "property_type": "propertyType",
+    "contingent_listing_type": "contingentListingType",
+    "rent_zestimate": "rentZestimate",
+    "days_on_zillow": "daysOnZillow",
+    "country": "country",
+    "currency": "currency",
+    "has_image": "hasImage",
+    "county_name": "county_name",
+    "state_id": "state_id",
+    "county_fips": "county_fips",
+}
+DERIVED_FIELDS = ("detail_url", "date_sold", "zip_code", "content_hash")
+
+# Fields kept in property_snapshots; a change to any of them is a new snapshot.
+SNAPSHOT_FIELDS = (
+    "price",
+    "listing_status",
+    "price_change",
+    "zestimate",
+    "rent_zestimate",
+    "days_on_zillow",
+    "contingent_listing_type",
+    "date_sold",
+)
+
+
+class PropertyRecord:
+    """
+    Compact row holding only the columns of the properties table.
+    """
+
+    __slots__ = tuple(PROPERTY_FIELDS) + DERIVED_FIELDS
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in SNAPSHOT_FIELDS}
+
+    def as_row(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"PropertyRecord(zpid={self.zpid}, address={self.address!r})"
+
+
+def extract_zip_codes(addresses):
+    """
+    Trailing five-digit zip of each address, or None.
+    """
+    zip_codes = []
+    for address in addresses:
+        match = ZIP_CODE_PATTERN.search(address)
+        zip_codes.append(match.group(0) if match else None)
+    return zip_codes
+
+
+def convert_date_sold(timestamps):
+    """
+    Convert millisecond epoch timestamps to UTC dates for a whole page at once.
+    """
+    millis = np.array([timestamp or 0 for timestamp in timestamps], dtype="int64")
+    dates = millis.astype("datetime64[ms]").astype("datetime64[D]").tolist()
+    return [date if timestamp else None for date, timestamp in zip(dates, timestamps)]
+
+
+def content_hash(values):
+    return hashlib.blake2b(orjson.dumps(values), digest_size=16).hexdigest()
+
+
+def parse_properties(props, state_id=None):
+    """
+    Project a page of Zillow search results into PropertyRecords. zpid is cast to
+    int, detailUrl is prefixed with the Zillow host, dateSold becomes a date,
+    zip_code is taken from the end of the address and content_hash covers
+    SNAPSHOT_FIELDS. state_id, when given, overrides the value on each result.
+    """
+    if not props:
+        return []
+    columns = {
+        column: [prop.get(key) for prop in props]
+        for column, key in PROPERTY_FIELDS.items()
+    }
+    columns["zpid"] = [int(zpid) for zpid in columns["zpid"]]
+    if state_id is not None:
+        columns["state_id"] = [state_id] * len(props)
+    columns["detail_url"] = [f"{ZILLOW_URL}{prop.get('detailUrl')}" for prop in props]
+    columns["date_sold"] = convert_date_sold([prop.get("dateSold") for prop in props])
+    columns["zip_code"] = extract_zip_codes(
+        [prop.get("address", "") or "" for prop in props]
+    )
+    columns["content_hash"] = [
+        content_hash(values)
+        for values in zip(*(columns[name] for name in SNAPSHOT_FIELDS))
+    ]
+    return [
+        PropertyRecord(*values)
+        for values in zip(*(columns[name] for name in PropertyRecord.__slots__))
+    ]
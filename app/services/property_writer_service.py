@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from app.services.property_db_service import (
+    BATCH_SIZE,
+    merge_counts,
+    upsert_properties_async,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# Pages buffered between the fetchers and the writer before fetchers block.
+WRITER_QUEUE_SIZE = 50
+# Flush a partial batch when no page has arrived for this many seconds.
+FLUSH_INTERVAL = 1.0
+# Batches written at the same time, bounded by the DB connection pool.
+WRITER_CONCURRENCY = 4
+
+
+class PropertyWriter:
+    """
+    Writer stage of the fetch-to-DB pipeline. Fetchers put pages of properties on
+    a bounded queue as they arrive; the writer groups them into batches and
+    upserts several batches at once without blocking the event loop, so HTTP
+    traffic keeps flowing. A full queue makes fetchers wait, which caps memory at
+    roughly one batch plus the queued pages.
+
+    Pages can carry a journal entry; once the batch holding a page is written,
+    on_pages_written is awaited with those entries.
+    """
+
+    def __init__(
+        self,
+        batch_size=BATCH_SIZE,
+        queue_size=WRITER_QUEUE_SIZE,
+        concurrency=WRITER_CONCURRENCY,
+        on_pages_written=None,
+    ):
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.write_slots = asyncio.Semaphore(concurrency)
+        self.pending_writes = set()
+        self.on_pages_written = on_pages_written
+        self.batch = []
+        self.batch_pages = []
+        self.totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+        self.failed_batches = 0
+        self.waiters = set()
+        self.task = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def put(self, properties, page_entry=None):
+        if properties or page_entry is not None:
+            await self.queue.put((properties, page_entry))
+
+    async def wait_written(self):
+        """
+        Wait until every page put so far has been written (or failed to write),
+        flushing the partial batch instead of waiting for FLUSH_INTERVAL.
+        """
+        written = asyncio.get_running_loop().create_future()
+        await self.queue.put(written)
+        await written
+
+    async def close(self):
+        await self.queue.put(None)
+        await self.task
+        logger.info(
+            f"Property writer finished | Inserted: {self.totals['inserted']} | Updated: {self.totals['updated']} | Unchanged: {self.totals['unchanged']} | Failed batches: {self.failed_batches}"
+        )
+
+    async def run(self):
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.flush()
+                continue
+            if item is None:
+                await self.flush()
+                if self.pending_writes:
+                    await asyncio.wait(self.pending_writes)
+                return
+            if isinstance(item, asyncio.Future):
+                await self.flush()
+                waiter = asyncio.create_task(
+                    self.resolve_when_written(set(self.pending_writes), item)
+                )
+                self.waiters.add(waiter)
+                waiter.add_done_callback(self.waiters.discard)
+                continue
+            properties, page_entry = item
+            self.batch.extend(properties)
+            if page_entry is not None:
+                self.batch_pages.append(page_entry)
+            if len(self.batch) >= self.batch_size:
+                await self.flush()
+
+    async def resolve_when_written(self, writes, written):
+        if writes:
+            await asyncio.wait(writes)
+        if not written.done():
+            written.set_result(None)
+
+    async def flush(self):
+        """
+        Hand the current batch to a background write, waiting only when every
+        write slot is busy.
+        """
+        if not self.batch and not self.batch_pages:
+            return
+        batch, batch_pages = self.batch, self.batch_pages
+        self.batch, self.batch_pages = [], []
+        await self.write_slots.acquire()
+        task = asyncio.create_task(self.write(batch, batch_pages))
+        self.pending_writes.add(task)
+        task.add_done_callback(self.pending_writes.discard)
+
+    async def write(self, batch, batch_pages):
+        try:
+            if batch:
+                counts = await upsert_properties_async(
+                    batch, batch_size=self.batch_size
+                )
+                merge_counts(self.totals, counts)
+                logger.info(
+                    f"Wrote batch of {len(batch)} properties | Inserted: {counts['inserted']} | Updated: {counts['updated']} | Unchanged: {counts['unchanged']}"
+                )
+            if self.on_pages_written is not None:
+                await self.on_pages_written(batch_pages)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"Error writing batch of {len(batch)} properties: {e}")
+        finally:
+            self.write_slots.release()
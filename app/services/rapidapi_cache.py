@@ -0,0 +1,222 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+import orjson
+from app.services.metrics_service import metrics
+import logging
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("rapidapi_client.log")],
+)
+
+RAPIDAPI_CACHE_PATH = os.getenv("RAPIDAPI_CACHE_PATH", "rapidapi_cache.sqlite")
+RAPIDAPI_CACHE_MAX_MB = int(os.getenv("RAPIDAPI_CACHE_MAX_MB", "512"))
+
+# Listings change daily. RecentlySold queries are a rolling soldInLast window
+# whose first page changes as new sales come in, so they get at most a day and
+# never more than half the window. Resumed runs don't rely on the cache for
+# pages they already wrote; those are skipped through the crawl journal.
+STATUS_TYPE_TTLS = {
+    "ForSale": 60 * 60 * 12,  # 12 hours
+    "RecentlySold": 60 * 60 * 24,  # 1 day
+}
+DEFAULT_TTL = 60 * 60 * 12
+
+
+def response_ttl(params, ttls=STATUS_TYPE_TTLS):
+    """
+    Seconds a response may be served from the cache.
+    """
+    ttl = ttls.get(params.get("status_type"), DEFAULT_TTL)
+    sold_in_last = str(params.get("soldInLast") or "")
+    if sold_in_last.isdigit():
+        ttl = min(ttl, int(sold_in_last) * 86400 / 2)
+    return ttl
+
+
+def normalize_querystring(params):
+    """
+    Build a stable cache key from a querystring: keys are sorted, values are
+    stringified, empty values are dropped and page 1 is treated as no page, so
+    count probes and first-page fetches share one entry.
+    """
+    items = []
+    for key, value in params.items():
+        if value is None or value == "":
+            continue
+        if key == "page" and str(value) == "1":
+            continue
+        items.append((key, str(value)))
+    return urlencode(sorted(items))
+
+
+class ResponseCache:
+    """
+    On-disk cache of decoded RapidAPI responses, stored in SQLite so it survives
+    restarts. Entries expire per status_type and the least recently used entries
+    are evicted once the cache grows past its size cap. Async callers use
+    get_async/set_async, which run the sqlite work in a thread.
+    """
+
+    def __init__(
+        self,
+        path=RAPIDAPI_CACHE_PATH,
+        max_bytes=RAPIDAPI_CACHE_MAX_MB * 1024 * 1024,
+        ttls=None,
+        max_age=None,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls or STATUS_TYPE_TTLS
+        # Cap on the age of any served entry, for callers that refresh more often
+        # than the TTLs allow for.
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        self.total_bytes = 0
+        # One connection shared by the worker threads, used one at a time.
+        self.lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    stored_at REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = [
+                row[1]
+                for row in self.connection.execute("PRAGMA table_info(responses)")
+            ]
+            if "stored_at" not in columns:
+                # Caches written before stored_at existed count as infinitely old.
+                self.connection.execute(
+                    "ALTER TABLE responses ADD COLUMN stored_at REAL NOT NULL DEFAULT 0"
+                )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_accessed ON responses (last_accessed)"
+            )
+            self.total_bytes = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+        return self.connection
+
+    def key(self, url, params):
+        return f"{url}?{normalize_querystring(params)}"
+
+    def get(self, url, params, max_age=None):
+        """
+        Cached response for the querystring, or None. max_age (seconds) further
+        limits how old the entry may be; 0 never serves from the cache.
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            ages = [age for age in (max_age, self.max_age) if age is not None]
+            max_age = min(ages) if ages else None
+            connection = self._connect()
+            key = self.key(url, params)
+            now = time.time()
+            stored_after = now - max_age if max_age is not None else float("-inf")
+            row = connection.execute(
+                "SELECT body FROM responses WHERE key = ? AND expires_at > ? AND stored_at > ?",
+                (key, now, stored_after),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc("rapidapi_cache_requests_total", result="miss")
+                return None
+            with connection:
+                connection.execute(
+                    "UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+            metrics.inc("rapidapi_cache_requests_total", result="hit")
+            return orjson.loads(row[0])
+
+    def set(self, url, params, response_data):
+        if not self.enabled:
+            return
+        with self.lock:
+            connection = self._connect()
+            key = self.key(url, params)
+            body = orjson.dumps(response_data)
+            now = time.time()
+            ttl = response_ttl(params, self.ttls)
+            with connection:
+                previous = connection.execute(
+                    "SELECT size FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, body, size, expires_at, last_accessed, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, body, len(body), now + ttl, now, now),
+                )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    async def get_async(self, url, params, max_age=None):
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, url, params, max_age)
+
+    async def set_async(self, url, params, response_data):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.set, url, params, response_data)
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones until the cache
+        is back under 90% of its size cap.
+        """
+        with self.lock:
+            connection = self._connect()
+            target = int(self.max_bytes * 0.9)
+            with connection:
+                connection.execute(
+                    "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+                )
+                self.total_bytes = connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                evicted = 0
+                for key, size in connection.execute(
+                    "SELECT key, size FROM responses ORDER BY last_accessed"
+                ).fetchall():
+                    if self.total_bytes <= target:
+                        break
+                    connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.total_bytes -= size
+                    evicted += 1
+            logger.info(
+                f"Evicted {evicted} cached responses, cache size is now {self.total_bytes} bytes"
+            )
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -1,7 +1,16 @@
 import os
+import time
+import random
 import logging
 import asyncio
-from aiocache import cached
+import orjson
+from aiohttp import ClientError, ClientTimeout
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from app.services.rapidapi_cache import ResponseCache
+from app.services.metrics_service import metrics
+from app.services.api_budget_service import api_budget
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -11,61 +20,414 @@ logging.basicConfig(
 )
 
 RAPIDAPI_ZILLOW_API_KEY = os.getenv("RAPIDAPI_ZILLOW_API_KEY")
+# Comma separated pool of keys; each gets its own rate limit.
+RAPIDAPI_ZILLOW_API_KEYS = [
+    key.strip()
+    for key in os.getenv(
+        "RAPIDAPI_ZILLOW_API_KEYS", RAPIDAPI_ZILLOW_API_KEY or ""
+    ).split(",")
+    if key.strip()
+]
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
+RAPIDAPI_BASE_URL = os.getenv("RAPIDAPI_BASE_URL", "https://zillow69.p.rapidapi.com")
+SEARCH_URL = f"{RAPIDAPI_BASE_URL}/search"
+
 RAPIDAPI_HEADERS = {
     "x-rapidapi-key": RAPIDAPI_ZILLOW_API_KEY,
     "x-rapidapi-host": "zillow69.p.rapidapi.com",
 }
 
+# Requests started per second per API key, in each crawl process.
+RAPIDAPI_RATE_LIMIT = int(os.getenv("RAPIDAPI_RATE_LIMIT", "10"))
+
+response_cache = ResponseCache()
+
+REQUEST_TIMEOUT = ClientTimeout(total=30)
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# Statuses worth retrying; anything else (401, 403, 404, ...) is fatal.
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Consecutive retryable failures before the circuit opens and pauses all requests.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30.0
+CIRCUIT_MAX_COOLDOWN = 300.0
+
+# How long a finished result is shared with identical follow-up requests.
+RECENT_RESULT_TTL = 60
+RECENT_RESULT_LIMIT = 1024
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an
+    HTTP-date. Returns None when the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RapidAPIError(Exception):
+    def __init__(self, message, status=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+    @property
+    def retryable(self):
+        return self.status in RETRYABLE_STATUSES
+
+    @property
+    def retry_after(self):
+        return parse_retry_after(self.headers.get("Retry-After"))
+
+
+def is_retryable(error):
+    if isinstance(error, RapidAPIError):
+        return error.retryable
+    return isinstance(error, (ClientError, asyncio.TimeoutError))
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Exponential backoff with full jitter, never shorter than Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
 
 class RateLimiter:
-    def __init__(self, rate: int):
-        self.rate = rate
-        self.queue = asyncio.Queue()
-        self.task = None
-
-    async def start(self):
-        while True:
-            task, future = await self.queue.get()
-            try:
-                result = await task
-                future.set_result(result)
-            except Exception as e:
-                future.set_exception(e)
-            finally:
-                await asyncio.sleep(1 / self.rate)  # Global rate limiting
-                self.queue.task_done()
+    """
+    Token-bucket rate limiter. Callers take a token before starting a request, so
+    the start rate is held at `rate` per second while any number of requests can
+    be in flight. The rate backs off on 429 responses and recovers on success.
+    """
+
+    def __init__(self, rate: int, burst: int = 1, min_rate: float = 1.0, api_key=None):
+        self.api_key = api_key
+        self.headers = (
+            {**RAPIDAPI_HEADERS, "x-rapidapi-key": api_key}
+            if api_key
+            else RAPIDAPI_HEADERS
+        )
+        self.max_rate = rate
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.waiting = 0
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        self.waiting += 1
+        metrics.set_gauge("rate_limiter_queue_depth", self.waiting)
+        started = time.monotonic()
+        try:
+            # The lock queues callers in arrival order; only the head sleeps.
+            async with self.lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        await asyncio.sleep(self.paused_until - now)
+                        continue
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+            metrics.set_gauge("rate_limiter_queue_depth", self.waiting)
+            metrics.observe("rate_limiter_wait_seconds", time.monotonic() - started)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def observe(self, status, headers):
+        """
+        Adjust the rate from a RapidAPI response: halve it on 429, pause until the
+        advertised reset when the quota is exhausted, and creep back up on success.
+        """
+        headers = headers or {}
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        remaining = headers.get("x-ratelimit-requests-remaining")
+        if status == 429:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.pause(retry_after if retry_after is not None else 1 / self.rate)
+            logger.warning(f"Rate limited by RapidAPI, backing off: {self}")
+        elif remaining is not None and remaining.isdigit() and int(remaining) == 0:
+            reset = headers.get("x-ratelimit-requests-reset")
+            if reset and reset.isdigit():
+                self.pause(float(reset))
+                logger.warning(f"RapidAPI quota exhausted, pausing: {self}")
+        elif status is not None and status < 400:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+        metrics.set_gauge("rate_limiter_rate", self.rate)
+
+    def select(self):
+        return self
 
     async def add_task(self, task):
-        future = asyncio.Future()
-        await self.queue.put((task, future))
-        if not self.task or self.task.done():
-            self.task = asyncio.create_task(self._process_queue())
-        return await future
-
-    async def _process_queue(self):
-        while not self.queue.empty():
-            task, future = await self.queue.get()
-            try:
-                result = await task
-                future.set_result(result)
-            except Exception as e:
-                future.set_exception(e)
-            finally:
-                await asyncio.sleep(1 / self.rate)  # Global rate limiting
-                self.queue.task_done()
-        self.task = None
+        await self.acquire()
+        self.in_flight += 1
+        try:
+            result = await task
+        except RapidAPIError as e:
+            self.observe(e.status, e.headers)
+            raise
+        finally:
+            self.in_flight -= 1
+        self.observe(getattr(result, "status", None), getattr(result, "headers", None))
+        return result
+
+    def stats(self):
+        self._refill()
+        return {
+            "rate": round(self.rate, 2),
+            "tokens": round(self.tokens, 2),
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+        }
+
+    def __repr__(self):
+        stats = self.stats()
+        return f"RateLimiter(rate={stats['rate']}, tokens={stats['tokens']}, waiting={stats['waiting']}, in_flight={stats['in_flight']})"
+
+
+class ApiKeyPool:
+    """
+    One RateLimiter per API key. Each request goes to the key that can start it
+    soonest, so throughput grows with the number of keys. Exposes the same
+    waiting/rate/pause interface as a single RateLimiter for the scheduler and
+    the circuit breaker.
+    """
+
+    def __init__(self, api_keys, rate: int, **limiter_options):
+        self.limiters = [
+            RateLimiter(rate, api_key=api_key, **limiter_options)
+            for api_key in api_keys or [None]
+        ]
+
+    @property
+    def rate(self):
+        return sum(limiter.rate for limiter in self.limiters)
+
+    @property
+    def waiting(self):
+        return sum(limiter.waiting for limiter in self.limiters)
+
+    @property
+    def in_flight(self):
+        return sum(limiter.in_flight for limiter in self.limiters)
+
+    def select(self):
+        now = time.monotonic()
+        return min(
+            self.limiters,
+            key=lambda limiter: (
+                max(0.0, limiter.paused_until - now)
+                + (limiter.waiting + 1 - limiter.tokens) / limiter.rate
+            ),
+        )
+
+    async def add_task(self, task):
+        return await self.select().add_task(task)
+
+    def pause(self, seconds):
+        for limiter in self.limiters:
+            limiter.pause(seconds)
+
+    def __repr__(self):
+        return f"ApiKeyPool(keys={len(self.limiters)}, rate={round(self.rate, 2)}, waiting={self.waiting}, in_flight={self.in_flight})"
+
+
+class CircuitBreaker:
+    """
+    Opens after CIRCUIT_FAILURE_THRESHOLD consecutive retryable failures and pauses
+    the rate limiter, so an upstream brownout isn't hammered by every in-flight
+    job. Each trip while failures continue doubles the cooldown.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        cooldown=CIRCUIT_COOLDOWN,
+        max_cooldown=CIRCUIT_MAX_COOLDOWN,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.trips = 0
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, rate_limiter):
+        self.consecutive_failures += 1
+        if self.consecutive_failures < self.failure_threshold:
+            return
+        self.trips += 1
+        logger.error(
+            f"Circuit open after {self.consecutive_failures} consecutive failures, pausing requests for {self.cooldown:.0f}s"
+        )
+        rate_limiter.pause(self.cooldown)
+        self.consecutive_failures = 0
+        self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+
+
+circuit_breaker = CircuitBreaker()
+
+
+class RequestCoalescer:
+    """
+    Single-flight layer: identical concurrent requests share one future, and an
+    identical request arriving shortly after reuses the finished result. Every
+    request served this way is counted in saved_calls.
+    """
+
+    def __init__(self, ttl=RECENT_RESULT_TTL, limit=RECENT_RESULT_LIMIT):
+        self.ttl = ttl
+        self.limit = limit
+        self.in_flight = {}
+        self.recent = OrderedDict()
+        self.saved_calls = 0
+
+    def reset(self):
+        self.recent.clear()
+        self.saved_calls = 0
+
+    def _remember(self, key, future):
+        self.in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.recent[key] = (time.monotonic() + self.ttl, future.result())
+        self.recent.move_to_end(key)
+        while len(self.recent) > self.limit:
+            self.recent.popitem(last=False)
+
+    async def run(self, key, coroutine_factory):
+        recent = self.recent.get(key)
+        if recent is not None:
+            if recent[0] > time.monotonic():
+                self.saved_calls += 1
+                return recent[1]
+            del self.recent[key]
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.saved_calls += 1
+        else:
+            future = asyncio.ensure_future(coroutine_factory())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self._remember(key, done))
+        # Shield so one cancelled caller doesn't cancel the request for the rest.
+        return await asyncio.shield(future)
+
+
+request_coalescer = RequestCoalescer()
 
 
 # New function to fetch and check response status
-@cached(ttl=604800)  # Cache for 1 week
 async def fetch_with_status_check(session, url, headers, params):
-    response = await session.get(url, headers=headers, params=params)
+    with metrics.timer("rapidapi_http_seconds"):
+        response = await session.get(
+            url, headers=headers, params=params, timeout=REQUEST_TIMEOUT
+        )
     if response.status != 200:
         logger.error(f"Error: Received status code {response.status} for URL: {url}")
         response_data = await response.text()
-        raise Exception(
-            f"Error: Received status code {response.status} for URL: {url}. Response: {response_data}"
+        raise RapidAPIError(
+            f"Error: Received status code {response.status} for URL: {url}. Response: {response_data}",
+            status=response.status,
+            headers=response.headers,
         )
     return response
+
+
+async def fetch_search_results(
+    querystring, session=None, rate_limiter=None, request_type="page", max_age=None
+):
+    """
+    Fetch decoded search results, serving repeated querystrings from the on-disk
+    response cache or an identical in-flight request instead of spending an API
+    call. Retryable failures are retried with jittered exponential backoff;
+    fatal ones raise RapidAPIError straight away. Every call, retries included,
+    is charged to the API budget. request_type labels the calls in the metrics.
+    max_age caps the age of a cached response; 0 always asks the API, e.g. for
+    change probes, and still refreshes the cache.
+    """
+    response_data = await response_cache.get_async(
+        SEARCH_URL, querystring, max_age=max_age
+    )
+    if response_data is not None:
+        return response_data
+
+    async def fetch():
+        for attempt in range(MAX_RETRIES + 1):
+            # Raises BudgetExceededError once the daily or monthly cap is hit.
+            api_budget.spend()
+            metrics.inc(
+                "rapidapi_calls_total",
+                request_type=request_type,
+                status_type=querystring.get("status_type"),
+            )
+            metrics.count_zip_call(querystring.get("location"))
+            try:
+                limiter = rate_limiter.select()
+                response = await limiter.add_task(
+                    fetch_with_status_check(
+                        session, SEARCH_URL, limiter.headers, querystring
+                    )
+                )
+                response_data = orjson.loads(await response.read())
+                break
+            except Exception as e:
+                metrics.inc(
+                    "rapidapi_errors_total",
+                    request_type=request_type,
+                    status=getattr(e, "status", None) or type(e).__name__,
+                )
+                if not is_retryable(e):
+                    raise
+                circuit_breaker.record_failure(rate_limiter)
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt, getattr(e, "retry_after", None))
+                logger.warning(
+                    f"Retrying {querystring} in {delay:.1f}s (attempt {attempt + 1} of {MAX_RETRIES}): {e}"
+                )
+                await asyncio.sleep(delay)
+        circuit_breaker.record_success()
+        if response_data.get("totalResultCount") is not None:
+            await response_cache.set_async(SEARCH_URL, querystring, response_data)
+        return response_data
+
+    return await request_coalescer.run(
+        response_cache.key(SEARCH_URL, querystring), fetch
+    )
@@ -0,0 +1,145 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import PropertySnapshot
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# Changes per day are averaged over this many days of property_snapshots.
+CHANGE_RATE_DAYS = int(os.getenv("CHANGE_RATE_DAYS", "14"))
+# (minimum observed changes per day, hours between refreshes), hottest first.
+# ForSale listings change often (new listings, price cuts); sales trickle in.
+REFRESH_TIERS = {
+    "ForSale": (
+        (1.0, int(os.getenv("FOR_SALE_HOT_REFRESH_HOURS", "6"))),
+        (0.1, int(os.getenv("FOR_SALE_WARM_REFRESH_HOURS", "24"))),
+        (0.0, int(os.getenv("FOR_SALE_QUIET_REFRESH_HOURS", "72"))),
+    ),
+    "RecentlySold": (
+        (0.5, int(os.getenv("RECENTLY_SOLD_HOT_REFRESH_HOURS", "24"))),
+        (0.0, int(os.getenv("RECENTLY_SOLD_QUIET_REFRESH_HOURS", "72"))),
+    ),
+}
+# Snapshot listing_status counted towards each status type's change rate.
+LISTING_STATUSES = {"ForSale": "FOR_SALE", "RecentlySold": "RECENTLY_SOLD"}
+
+
+# Snapshot fields whose change between two snapshots of a listing counts towards
+# its zip's change rate. days_on_zillow and the zestimates move on their own
+# every day, so they are left out.
+CHANGE_FIELDS = ("price", "listing_status", "date_sold")
+
+
+def build_change_rate_query(since):
+    """
+    Count, per zip_code and listing_status, the snapshots since `since` that are a
+    listing's first or differ from its previous snapshot in CHANGE_FIELDS.
+    Listings with a snapshot in the window are read in full so their first
+    snapshot in the window is compared with the one before it.
+    """
+    active_zpids = select(PropertySnapshot.zpid).where(
+        PropertySnapshot.observed_at >= since
+    )
+    by_listing = {
+        "partition_by": PropertySnapshot.zpid,
+        "order_by": PropertySnapshot.observed_at,
+    }
+    columns = [
+        PropertySnapshot.zip_code,
+        PropertySnapshot.observed_at,
+        func.lag(PropertySnapshot.observed_at)
+        .over(**by_listing)
+        .label("previous_observed_at"),
+    ]
+    for field in CHANGE_FIELDS:
+        column = getattr(PropertySnapshot, field)
+        columns.append(column)
+        columns.append(func.lag(column).over(**by_listing).label(f"previous_{field}"))
+    history = select(*columns).where(PropertySnapshot.zpid.in_(active_zpids)).subquery()
+    changed = or_(
+        history.c.previous_observed_at.is_(None),
+        *[
+            history.c[field].is_distinct_from(history.c[f"previous_{field}"])
+            for field in CHANGE_FIELDS
+        ],
+    )
+    return (
+        select(history.c.zip_code, history.c.listing_status, func.count())
+        .where(history.c.observed_at >= since, changed)
+        .group_by(history.c.zip_code, history.c.listing_status)
+    )
+
+
+def get_change_rates(days=CHANGE_RATE_DAYS):
+    """
+    Observed changes per day for each (zip_code, status_type): new listings,
+    price cuts, status changes and sales seen in the last `days` days.
+    """
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    statuses = {value: key for key, value in LISTING_STATUSES.items()}
+    db: Session = SessionLocal()
+    try:
+        rates = {}
+        for zip_code, listing_status, count in db.execute(
+            build_change_rate_query(since)
+        ):
+            if listing_status in statuses:
+                rates[(zip_code, statuses[listing_status])] = count / days
+        return rates
+    finally:
+        db.close()
+
+
+def refresh_interval(status_type, change_rate):
+    for min_rate, hours in REFRESH_TIERS[status_type]:
+        if (change_rate or 0.0) >= min_rate:
+            return timedelta(hours=hours)
+    return timedelta(hours=REFRESH_TIERS[status_type][-1][1])
+
+
+def cache_max_age():
+    """
+    Oldest cached response (in seconds) a due-only crawl may use. It is well
+    under the shortest refresh interval, so a zip recrawled on its cadence never
+    gets pages cached by its previous crawl.
+    """
+    shortest = min(hours for tiers in REFRESH_TIERS.values() for _, hours in tiers)
+    return shortest * 3600 / 2
+
+
+def is_due(crawl_state, status_type, change_rate, now=None):
+    """
+    A zip is due once its tier's interval has passed since its last successful
+    crawl. Zips that have never been crawled are always due.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not crawl_state or not crawl_state["last_success_at"]:
+        return True
+    return now - crawl_state["last_success_at"] >= refresh_interval(
+        status_type, change_rate
+    )
+
+
+def tier_counts(jobs, change_rates):
+    """
+    Number of jobs per (status_type, refresh hours), for logging.
+    """
+    counts = {}
+    for zip_code, status_type in jobs:
+        hours = int(
+            refresh_interval(
+                status_type, change_rates.get((zip_code, status_type))
+            ).total_seconds()
+            // 3600
+        )
+        key = f"{status_type}/{hours}h"
+        counts[key] = counts.get(key, 0) + 1
+    return counts
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import USE_ASYNC_DB, SessionLocal, get_async_sessionmaker
+from app.models import Property, SearchPlan
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+LISTING_STATUSES = {
+    "ForSale": "FOR_SALE",
+    "RecentlySold": "RECENTLY_SOLD",
+}
+
+
+def build_search_plan_query(zip_code, status_type, sold_in_last):
+    return select(SearchPlan).where(
+        SearchPlan.zip_code == zip_code,
+        SearchPlan.status_type == status_type,
+        SearchPlan.sold_in_last == (sold_in_last or ""),
+    )
+
+
+def search_plan_to_dict(plan):
+    if plan is None:
+        return None
+    return {
+        "total_results": plan.total_results,
+        "params": plan.params,
+        "updated_at": plan.updated_at,
+    }
+
+
+def build_save_search_plan_statement(
+    zip_code, status_type, sold_in_last, total_results, params
+):
+    values = {
+        "zip_code": zip_code,
+        "status_type": status_type,
+        "sold_in_last": sold_in_last or "",
+        "total_results": total_results,
+        "params": params,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    stmt = insert(SearchPlan).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            SearchPlan.zip_code,
+            SearchPlan.status_type,
+            SearchPlan.sold_in_last,
+        ],
+        set_={
+            "total_results": stmt.excluded.total_results,
+            "params": stmt.excluded.params,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    return stmt
+
+
+def build_historical_prices_query(zip_code, status_type):
+    return select(Property.price).where(
+        Property.zip_code == zip_code,
+        Property.listing_status == LISTING_STATUSES.get(status_type),
+        Property.price.isnot(None),
+    )
+
+
+def get_search_plan(zip_code, status_type, sold_in_last=""):
+    db: Session = SessionLocal()
+    try:
+        plan = db.scalars(
+            build_search_plan_query(zip_code, status_type, sold_in_last)
+        ).first()
+        return search_plan_to_dict(plan)
+    finally:
+        db.close()
+
+
+def save_search_plan(zip_code, status_type, sold_in_last, total_results, params):
+    stmt = build_save_search_plan_statement(
+        zip_code, status_type, sold_in_last, total_results, params
+    )
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            db.execute(stmt)
+    finally:
+        db.close()
+
+
+def get_historical_prices(zip_code, status_type):
+    """
+    Prices we have already stored for a zip and status, used to pick split points.
+    """
+    db: Session = SessionLocal()
+    try:
+        return list(
+            db.scalars(build_historical_prices_query(zip_code, status_type)).all()
+        )
+    finally:
+        db.close()
+
+
+async def get_search_plan_async(zip_code, status_type, sold_in_last=""):
+    if not USE_ASYNC_DB:
+        return await asyncio.to_thread(
+            get_search_plan, zip_code, status_type, sold_in_last
+        )
+    async with get_async_sessionmaker()() as db:
+        plan = (
+            await db.scalars(
+                build_search_plan_query(zip_code, status_type, sold_in_last)
+            )
+        ).first()
+        return search_plan_to_dict(plan)
+
+
+async def save_search_plan_async(
+    zip_code, status_type, sold_in_last, total_results, params
+):
+    if not USE_ASYNC_DB:
+        return await asyncio.to_thread(
+            save_search_plan,
+            zip_code,
+            status_type,
+            sold_in_last,
+            total_results,
+            params,
+        )
+    stmt = build_save_search_plan_statement(
+        zip_code, status_type, sold_in_last, total_results, params
+    )
+    async with get_async_sessionmaker()() as db:
+        async with db.begin():
+            await db.execute(stmt)
+
+
+async def get_historical_prices_async(zip_code, status_type):
+    if not USE_ASYNC_DB:
+        return await asyncio.to_thread(get_historical_prices, zip_code, status_type)
+    async with get_async_sessionmaker()() as db:
+        return list(
+            (
+                await db.scalars(build_historical_prices_query(zip_code, status_type))
+            ).all()
+        )
+
+
+def get_crawl_history():
+    """
+    Last crawl time and result count per (zip_code, status_type), taken from the
+    most recently saved search plan.
+    """
+    db: Session = SessionLocal()
+    try:
+        history = {}
+        for plan in db.scalars(select(SearchPlan).order_by(SearchPlan.updated_at)):
+            history[(plan.zip_code, plan.status_type)] = {
+                "updated_at": plan.updated_at,
+                "total_results": plan.total_results,
+            }
+        return history
+    finally:
+        db.close()
+
+
+def get_search_plans():
+    """
+    Every stored search plan keyed by (zip_code, status_type, sold_in_last).
+    """
+    db: Session = SessionLocal()
+    try:
+        return {
+            (plan.zip_code, plan.status_type, plan.sold_in_last): search_plan_to_dict(
+                plan
+            )
+            for plan in db.scalars(select(SearchPlan))
+        }
+    finally:
+        db.close()
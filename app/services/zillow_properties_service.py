@@ -1,5 +1,8 @@
+import asyncio
 import logging
-from app.services.rapidapi_client import RAPIDAPI_HEADERS, fetch_with_status_check
+from app.services.crawl_journal_service import range_key
+from app.services.rapidapi_client import fetch_search_results, is_retryable
+from app.services.metrics_service import timed
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -8,12 +11,81 @@ logging.basicConfig(
     handlers=[logging.FileHandler("app.log")],
 )
 
+# Extra passes over pages that still failed after the client's own retries.
+PAGE_REQUEUE_ATTEMPTS = 2
+PAGE_REQUEUE_DELAY = 10.0
+
+
+class PageFetchError(Exception):
+    def __init__(self, failed_pages):
+        super().__init__(
+            f"Failed to fetch pages {sorted(failed_pages)}: {list(failed_pages.values())}"
+        )
+        self.failed_pages = failed_pages
+
+
+async def fetch_pages_with_requeue(fetch_page, pages):
+    """
+    Fetch pages concurrently, requeueing just the pages that failed with a
+    retryable error. Returns {page: exception} for pages that never succeeded.
+    """
+    pending = list(pages)
+    failed = {}
+    for attempt in range(PAGE_REQUEUE_ATTEMPTS + 1):
+        results = await asyncio.gather(
+            *[fetch_page(page) for page in pending], return_exceptions=True
+        )
+        failed.update(
+            {
+                page: result
+                for page, result in zip(pending, results)
+                if isinstance(result, Exception)
+            }
+        )
+        for page, result in zip(pending, results):
+            if not isinstance(result, Exception):
+                failed.pop(page, None)
+        pending = [page for page, error in failed.items() if is_retryable(error)]
+        if not pending or attempt == PAGE_REQUEUE_ATTEMPTS:
+            break
+        logger.warning(f"Requeueing pages {pending} after failures")
+        await asyncio.sleep(PAGE_REQUEUE_DELAY * (attempt + 1))
+    return failed
+
+
+@timed("rapidapi_request_seconds", request_type="page")
+async def fetch_zillow_page(querystring, page, session=None, rate_limiter=None):
+    page_querystring = {**querystring, "page": page}
+    response_data = await fetch_search_results(
+        page_querystring,
+        session=session,
+        rate_limiter=rate_limiter,
+        request_type="page",
+    )
+    logger.info(
+        f"{querystring['status_type']} | Page {page} of {response_data.get('totalPages', 0)} | MinPrice: {querystring.get('minPrice', 'N/A')} | MaxPrice: {querystring.get('maxPrice', 'N/A')} | SoldInLast: {querystring.get('soldInLast', 'N/A')}"
+    )
+    return response_data
+
 
 async def fetch_zillow_properties(
-    location, status_type, session=None, rate_limiter=None, **kwargs
+    location,
+    status_type,
+    session=None,
+    rate_limiter=None,
+    page_handler=None,
+    resume_pages=None,
+    **kwargs,
 ):
-    url = "https://zillow69.p.rapidapi.com/search"
+    """
+    Fetch every page for one set of search params. Page 1 tells us totalPages, the
+    remaining pages are then requested concurrently under the rate limiter.
 
+    When a page_handler is given, each page's properties are passed to it as soon
+    as the page arrives, together with the page number, totalPages and the range
+    key, instead of being collected and returned. resume_pages maps range keys to
+    the pages already written by an earlier run, which are skipped.
+    """
     querystring = {
         "location": location,
         "status_type": status_type,
@@ -28,39 +100,81 @@ async def fetch_zillow_properties(
         if key not in querystring:
             querystring[key] = value
 
-    properties = []
-    current_page = 1
-    total_pages = 1
+    params_key = range_key({"location": location, "status_type": status_type, **kwargs})
+    resume = (resume_pages or {}).get(params_key) or {
+        "total_pages": None,
+        "pages": set(),
+    }
+    pages = {}
 
-    while current_page <= total_pages:
-        querystring["page"] = current_page
-        try:
-            response = await rate_limiter.add_task(
-                fetch_with_status_check(session, url, RAPIDAPI_HEADERS, querystring)
+    async def handle_page(page, total_pages, response_data):
+        if page_handler is not None:
+            await page_handler(
+                response_data.get("props", []), page, total_pages, params_key
             )
-            response_data = await response.json()
-            properties.extend(response_data.get("props", []))
-            total_pages = response_data.get("totalPages", 0)
-        except Exception as e:
-            logger.error(f"Error processing response: {e}")
-            break
+        else:
+            pages[page] = response_data.get("props", [])
 
-        logger.info(
-            f"{status_type} | Page {current_page} of {total_pages} | MinPrice: {querystring.get('minPrice', 'N/A')} | MaxPrice: {querystring.get('maxPrice', 'N/A')} | SoldInLast: {querystring.get('soldInLast', 'N/A')}"
+    async def fetch_page(page):
+        response_data = await fetch_zillow_page(
+            querystring, page, session=session, rate_limiter=rate_limiter
         )
+        total_pages = response_data.get("totalPages", 0) or 0
+        if page == 1:
+            first_page["total_pages"] = total_pages
+        await handle_page(page, first_page["total_pages"], response_data)
+
+    first_page = {"total_pages": resume["total_pages"]}
+    if 1 not in resume["pages"] or resume["total_pages"] is None:
+        failed_pages = await fetch_pages_with_requeue(fetch_page, [1])
+        if failed_pages:
+            raise PageFetchError(failed_pages)
+    total_pages = first_page["total_pages"]
 
-        current_page += 1
+    remaining_pages = [
+        page for page in range(2, total_pages + 1) if page not in resume["pages"]
+    ]
+    failed_pages = await fetch_pages_with_requeue(fetch_page, remaining_pages)
+    if failed_pages:
+        raise PageFetchError(failed_pages)
 
-    return properties
+    return [property for page in sorted(pages) for property in pages[page]]
+
+
+def dedupe_properties(properties):
+    # Neighbouring price ranges overlap at min_price - 1, so the same property can
+    # come back twice. Keep the first occurrence to preserve fetch order.
+    unique_properties = {}
+    for property in properties:
+        unique_properties.setdefault(property.get("zpid"), property)
+    return list(unique_properties.values())
 
 
 async def fetch_properties_for_params_list(
-    params_list, session=None, rate_limiter=None
+    params_list, session=None, rate_limiter=None, page_handler=None, resume_pages=None
 ):
+    results = await asyncio.gather(
+        *[
+            fetch_zillow_properties(
+                session=session,
+                rate_limiter=rate_limiter,
+                page_handler=page_handler,
+                resume_pages=resume_pages,
+                **params,
+            )
+            for params in params_list
+        ],
+        return_exceptions=True,
+    )
+    # Let every range finish before surfacing a failure, so the pages that did
+    # arrive are still handed on.
+    errors = [result for result in results if isinstance(result, Exception)]
+    for params, result in zip(params_list, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching properties for {params}: {result}")
+    if errors:
+        raise errors[0]
     all_properties = []
-    for params in params_list:
-        properties = await fetch_zillow_properties(
-            session=session, rate_limiter=rate_limiter, **params
-        )
+    for properties in results:
         all_properties.extend(properties)
-    return all_properties
+    return dedupe_properties(all_properties)
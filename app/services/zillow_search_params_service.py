@@ -1,6 +1,15 @@
+import math
+import hashlib
+import asyncio
 import logging
 import numpy as np
-from app.services.rapidapi_client import RAPIDAPI_HEADERS, fetch_with_status_check
+from app.services.rapidapi_client import fetch_search_results
+from app.services.metrics_service import timed
+from app.services.search_plan_service import (
+    get_historical_prices_async,
+    get_search_plan_async,
+    save_search_plan_async,
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -9,24 +18,63 @@ logging.basicConfig(
     handlers=[logging.FileHandler("app.log")],
 )
 
+# The search endpoint stops returning results after 820 matches.
+RESULTS_CAP = 820
+TARGET_RESULTS_PER_RANGE = 800
+# Replan from price history when the total count moves more than this.
+PLAN_DRIFT_TOLERANCE = 0.1
+MIN_HISTORY_SIZE = 50
+# Sort that puts the newest listings (or sales) on page 1, used for change detection.
+NEWEST_SORT = "days"
+# Zillow's lot size filter values in sqft, used when a price range can't be narrowed.
+LOT_SIZE_SPLITS = [
+    1000,
+    2000,
+    3000,
+    4000,
+    5000,
+    7500,
+    10890,
+    21780,
+    43560,
+    87120,
+    217800,
+    435600,
+    871200,
+    2178000,
+    4356000,
+]
+
+
+def filter_value(value):
+    """
+    Querystring value for an optional filter. Only missing values become "";
+    0 is kept so a probe and the page fetch for the same range share a cache key.
+    """
+    return "" if value is None else value
+
 
+@timed("rapidapi_request_seconds", request_type="count")
 async def get_zillow_total_results(
     location, status_type, session=None, rate_limiter=None, **kwargs
 ):
     logger.debug(f"Received kwargs: {kwargs}")
-    url = "https://zillow69.p.rapidapi.com/search"
     querystring = {
         "location": location,
         "status_type": status_type,
         "home_type": "LotsLand",
-        "soldInLast": kwargs.get("soldInLast", "") or "",
-        "minPrice": kwargs.get("minPrice", "") or "",
-        "maxPrice": kwargs.get("maxPrice", "") or "",
+        "soldInLast": filter_value(kwargs.get("soldInLast")),
+        "minPrice": filter_value(kwargs.get("minPrice")),
+        "maxPrice": filter_value(kwargs.get("maxPrice")),
+        "lotSizeMin": filter_value(kwargs.get("lotSizeMin")),
+        "lotSizeMax": filter_value(kwargs.get("lotSizeMax")),
     }
-    response = await rate_limiter.add_task(
-        fetch_with_status_check(session, url, RAPIDAPI_HEADERS, querystring)
+    response_data = await fetch_search_results(
+        querystring,
+        session=session,
+        rate_limiter=rate_limiter,
+        request_type="count",
     )
-    response_data = await response.json()
     if response_data.get("totalResultCount") is None:
         logger.error(
             f"Total result count is missing in the response data for location: {location}, status_type: {status_type}, kwargs: {kwargs}. Response data: {response_data}"
@@ -37,153 +85,364 @@ async def get_zillow_total_results(
     return response_data.get("totalResultCount")
 
 
+@timed("rapidapi_request_seconds", request_type="min_max")
 async def get_min_price(
     location, status_type, session=None, rate_limiter=None, **kwargs
 ):
-    url = "https://zillow69.p.rapidapi.com/search"
     querystring = {
         "location": location,
         "status_type": status_type,
         "home_type": "LotsLand",
-        "soldInLast": kwargs.get("soldInLast", "") or "",
+        "soldInLast": filter_value(kwargs.get("soldInLast")),
         "sort": "price_low_high",
-        "minPrice": kwargs.get("minPrice", "") or "",
-        "maxPrice": kwargs.get("maxPrice", "") or "",
+        "minPrice": filter_value(kwargs.get("minPrice")),
+        "maxPrice": filter_value(kwargs.get("maxPrice")),
     }
-    response = await rate_limiter.add_task(
-        fetch_with_status_check(session, url, RAPIDAPI_HEADERS, querystring)
+    response_data = await fetch_search_results(
+        querystring,
+        session=session,
+        rate_limiter=rate_limiter,
+        request_type="min_max",
     )
-    response_data = await response.json()
     return response_data.get("props")[0].get("price")
 
 
+@timed("rapidapi_request_seconds", request_type="min_max")
 async def get_max_price(
     location, status_type, session=None, rate_limiter=None, **kwargs
 ):
-    url = "https://zillow69.p.rapidapi.com/search"
     querystring = {
         "location": location,
         "status_type": status_type,
         "home_type": "LotsLand",
-        "soldInLast": kwargs.get("soldInLast", "") or "",
+        "soldInLast": filter_value(kwargs.get("soldInLast")),
         "sort": "price_high_low",
-        "minPrice": kwargs.get("minPrice", "") or "",
-        "maxPrice": kwargs.get("maxPrice", "") or "",
+        "minPrice": filter_value(kwargs.get("minPrice")),
+        "maxPrice": filter_value(kwargs.get("maxPrice")),
     }
-    response = await rate_limiter.add_task(
-        fetch_with_status_check(session, url, RAPIDAPI_HEADERS, querystring)
+    response_data = await fetch_search_results(
+        querystring,
+        session=session,
+        rate_limiter=rate_limiter,
+        request_type="min_max",
     )
-    response_data = await response.json()
     return response_data.get("props")[0].get("price")
 
 
-async def split_price_query(
-    location,
-    status_type,
-    min_price,
-    max_price,
-    fetch_params,
-    session=None,
-    rate_limiter=None,
-    **kwargs,
+def fingerprint_page(total_results, properties):
+    """
+    Hash of the total count and the zpids and prices on the newest-first page 1.
+    A new listing, sale, delisting or price cut changes it.
+    """
+    items = sorted(
+        f"{property.get('zpid')}:{property.get('price')}" for property in properties
+    )
+    payload = f"{total_results}|" + ",".join(items)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+@timed("rapidapi_request_seconds", request_type="fingerprint")
+async def get_zillow_fingerprint(
+    location, status_type, session=None, rate_limiter=None, **kwargs
 ):
-    number_of_splits = 3
-    price_splits = np.linspace(min_price, max_price, number_of_splits)
-    price_splits = np.round(price_splits).astype(int)
-    for i in range(number_of_splits - 1):
-        min_price = max(int(price_splits[i]) - 1, 0)  # Ensure min_price is not negative
-        max_price = int(price_splits[i + 1])
-        total_results_for_price_range = await get_zillow_total_results(
-            location,
-            status_type,
-            minPrice=min_price,
-            maxPrice=max_price,
-            soldInLast=kwargs.get("soldInLast", "") or "",
-            session=session,
-            rate_limiter=rate_limiter,
+    """
+    One-call change probe for a zip: returns the total result count and a
+    fingerprint of page 1 sorted by newest.
+    """
+    querystring = {
+        "location": location,
+        "status_type": status_type,
+        "home_type": "LotsLand",
+        "soldInLast": filter_value(kwargs.get("soldInLast")),
+        "sort": NEWEST_SORT,
+    }
+    response_data = await fetch_search_results(
+        querystring,
+        session=session,
+        rate_limiter=rate_limiter,
+        request_type="fingerprint",
+        # A cached page 1 would hide exactly the changes this probe looks for.
+        max_age=0,
+    )
+    total_results = response_data.get("totalResultCount")
+    if total_results is None:
+        raise ValueError(
+            f"Total result count is missing in the response data for location: {location}, status_type: {status_type}, kwargs: {kwargs}. Response data: {response_data}"
         )
+    return total_results, fingerprint_page(
+        total_results, response_data.get("props", [])
+    )
+
+
+def build_search_params(location, status_type, sold_in_last, **filters):
+    params = {
+        "location": location,
+        "status_type": status_type,
+        "soldInLast": sold_in_last,
+    }
+    params.update({key: value for key, value in filters.items() if value != ""})
+    return params
+
+
+def price_cut_points_from_history(prices, total_results):
+    """
+    Quantile cut points over previously stored prices, sized so each range holds
+    roughly TARGET_RESULTS_PER_RANGE results. The last range is left open-ended.
+    """
+    number_of_ranges = math.ceil(total_results / TARGET_RESULTS_PER_RANGE)
+    quantiles = np.quantile(prices, np.linspace(0, 1, number_of_ranges + 1)[1:-1])
+    cut_points = sorted(set(int(round(price)) for price in quantiles))
+    return [0] + cut_points + [""]
+
+
+def price_ranges_from_cut_points(cut_points):
+    ranges = []
+    for i in range(len(cut_points) - 1):
+        # Overlap by one dollar so no listing falls between two ranges.
+        min_price = max(int(cut_points[i]) - 1, 0)
+        ranges.append({"minPrice": min_price, "maxPrice": cut_points[i + 1]})
+    return ranges
+
+
+async def split_lot_size_query(
+    location, status_type, sold_in_last, price_range, session=None, rate_limiter=None
+):
+    """
+    Second split dimension for price ranges that can't be narrowed any further
+    (e.g. hundreds of lots listed at the same price).
+
+    Returns (search params, count) pairs, empty ranges included.
+    """
+    bounds = [""] + LOT_SIZE_SPLITS + [""]
+    lot_ranges = [
+        {**price_range, "lotSizeMin": bounds[i], "lotSizeMax": bounds[i + 1]}
+        for i in range(len(bounds) - 1)
+    ]
+    counts = await asyncio.gather(
+        *[
+            get_zillow_total_results(
+                location,
+                status_type,
+                soldInLast=sold_in_last,
+                session=session,
+                rate_limiter=rate_limiter,
+                **lot_range,
+            )
+            for lot_range in lot_ranges
+        ]
+    )
+    planned_ranges = []
+    for lot_range, count in zip(lot_ranges, counts):
+        if count > RESULTS_CAP:
+            logger.warning(
+                f"Location: {location} | Status Type: {status_type} | Range: {lot_range} | Total Results: {count} exceeds {RESULTS_CAP} after splitting by price and lot size, results will be truncated."
+            )
+        planned_ranges.append(
+            (
+                build_search_params(location, status_type, sold_in_last, **lot_range),
+                count,
+            )
+        )
+    return planned_ranges
+
+
+async def refine_price_ranges(
+    location, status_type, sold_in_last, price_ranges, session=None, rate_limiter=None
+):
+    """
+    Count every candidate range concurrently, keep the ones under the cap and split
+    the rest into as many sub-ranges as their count calls for.
+
+    Returns (search params, count) pairs. Empty ranges are kept so a stored plan
+    still covers them once they gain listings; callers skip them when fetching.
+    """
+    counts = await asyncio.gather(
+        *[
+            get_zillow_total_results(
+                location,
+                status_type,
+                soldInLast=sold_in_last,
+                session=session,
+                rate_limiter=rate_limiter,
+                **price_range,
+            )
+            for price_range in price_ranges
+        ]
+    )
+    planned_ranges = []
+    for price_range, count in zip(price_ranges, counts):
         logger.info(
-            f"Location: {location} | Status Type: {status_type} | Price Range: {min_price}-{max_price} | Total Results: {total_results_for_price_range}"
+            f"Location: {location} | Status Type: {status_type} | Range: {price_range} | Total Results: {count}"
         )
-        if total_results_for_price_range == 0:
-            logger.warning(
-                f"No results found for {location} with status_type {status_type} and soldInLast {kwargs.get('soldInLast', '')} and price range {min_price}-{max_price}"
+        if count <= RESULTS_CAP:
+            planned_ranges.append(
+                (
+                    build_search_params(
+                        location, status_type, sold_in_last, **price_range
+                    ),
+                    count,
+                )
             )
             continue
-        elif total_results_for_price_range <= 820:
-            fetch_params.append(
-                {
-                    "location": location,
-                    "status_type": status_type,
-                    "minPrice": min_price,
-                    "maxPrice": max_price,
-                    "soldInLast": kwargs.get("soldInLast", "") or "",
-                }
+
+        min_price = price_range.get("minPrice", "") or 0
+        max_price = price_range.get("maxPrice", "")
+        if max_price == "":
+            max_price = await get_max_price(
+                location,
+                status_type,
+                soldInLast=sold_in_last,
+                minPrice=min_price,
+                session=session,
+                rate_limiter=rate_limiter,
             )
-        else:
-            logger.info(
-                f"Total results for price range {min_price} to {max_price} is greater than 820, so we need to split the query again."
+        number_of_ranges = math.ceil(count / TARGET_RESULTS_PER_RANGE)
+        cut_points = np.linspace(min_price + 1, max_price, number_of_ranges + 1)
+        cut_points = sorted(set(np.round(cut_points).astype(int).tolist()))
+        if max_price - min_price <= 2 or len(cut_points) < 3:
+            planned_ranges.extend(
+                await split_lot_size_query(
+                    location,
+                    status_type,
+                    sold_in_last,
+                    price_range,
+                    session=session,
+                    rate_limiter=rate_limiter,
+                )
             )
-            # TODO: address what happens if we've split the query down to where our max and min price are the same, and we still have more than 820 results.
-            await split_price_query(
+            continue
+
+        logger.info(
+            f"Total results for price range {min_price} to {max_price} is greater than {RESULTS_CAP}, splitting it into {len(cut_points) - 1} ranges."
+        )
+        planned_ranges.extend(
+            await refine_price_ranges(
                 location,
                 status_type,
-                min_price,
-                max_price,
-                fetch_params,
-                soldInLast=kwargs.get("soldInLast", "") or "",
+                sold_in_last,
+                price_ranges_from_cut_points(cut_points),
                 session=session,
                 rate_limiter=rate_limiter,
             )
+        )
+    return planned_ranges
+
+
+def plan_has_drifted(plan, total_results):
+    if not plan or not plan["params"] or not plan["total_results"]:
+        return True
+    drift = abs(total_results - plan["total_results"]) / plan["total_results"]
+    return drift > PLAN_DRIFT_TOLERANCE
+
+
+async def get_candidate_price_ranges(
+    location, status_type, sold_in_last, total_results, session=None, rate_limiter=None
+):
+    """
+    Pick starting price ranges for a zip over the cap: reuse the stored plan while
+    counts haven't drifted, otherwise cut at quantiles of the prices we already have,
+    and only fall back to min/max price probes when there is no history.
+    """
+    plan = await get_search_plan_async(location, status_type, sold_in_last)
+    if not plan_has_drifted(plan, total_results):
+        logger.info(
+            f"Location: {location} | Status Type: {status_type} | Reusing search plan with {len(plan['params'])} ranges"
+        )
+        return [
+            {
+                key: value
+                for key, value in params.items()
+                if key not in ("location", "status_type", "soldInLast")
+            }
+            for params in plan["params"]
+        ]
+
+    prices = await get_historical_prices_async(location, status_type)
+    if len(prices) >= MIN_HISTORY_SIZE:
+        return price_ranges_from_cut_points(
+            price_cut_points_from_history(prices, total_results)
+        )
+
+    min_price = await get_min_price(
+        location,
+        status_type,
+        soldInLast=sold_in_last,
+        session=session,
+        rate_limiter=rate_limiter,
+    )
+    max_price = await get_max_price(
+        location,
+        status_type,
+        soldInLast=sold_in_last,
+        session=session,
+        rate_limiter=rate_limiter,
+    )
+    number_of_ranges = math.ceil(total_results / TARGET_RESULTS_PER_RANGE)
+    cut_points = np.linspace(min_price, max_price, number_of_ranges + 1)
+    return price_ranges_from_cut_points(
+        sorted(set(np.round(cut_points).astype(int).tolist()))
+    )
 
 
 async def get_zillow_search_params(
-    zip_code, status_type, session=None, rate_limiter=None, **kwargs
+    zip_code,
+    status_type,
+    session=None,
+    rate_limiter=None,
+    total_results=None,
+    **kwargs,
 ):
     """
     Get the fetch parameters for Zillow API. There is a limit of 820 results per query, so if need be, this will split the query into multiple queries.
+
+    Pass total_results when the count is already known (e.g. from the fingerprint probe) to skip the count call.
     """
     location = zip_code
-    total_results = await get_zillow_total_results(
-        location, status_type, **kwargs, session=session, rate_limiter=rate_limiter
-    )
+    sold_in_last = kwargs.get("soldInLast", "") or ""
+    if total_results is None:
+        total_results = await get_zillow_total_results(
+            location,
+            status_type,
+            **kwargs,
+            session=session,
+            rate_limiter=rate_limiter,
+        )
     if total_results is None:
         logger.warning(
-            f"No results found for {location} with status_type {status_type} and sold_in_last {kwargs.get('soldInLast', '')}"
+            f"No results found for {location} with status_type {status_type} and sold_in_last {sold_in_last}"
         )
         return None
     elif total_results == 0:
         logger.warning(
-            f"No results found for {location} with status_type {status_type} and sold_in_last {kwargs.get('soldInLast', '')}"
+            f"No results found for {location} with status_type {status_type} and sold_in_last {sold_in_last}"
         )
         return None
     logger.info(
-        f"Location: {location} | Status Type: {status_type} | Sold In Last: {kwargs.get('soldInLast', '')} | Total Results: {total_results}"
+        f"Location: {location} | Status Type: {status_type} | Sold In Last: {sold_in_last} | Total Results: {total_results}"
     )
-    fetch_params = []
-    if total_results > 820:
-        min_price = await get_min_price(
-            location, status_type, **kwargs, session=session, rate_limiter=rate_limiter
-        )
-        max_price = await get_max_price(
-            location, status_type, **kwargs, session=session, rate_limiter=rate_limiter
+    if total_results > RESULTS_CAP:
+        price_ranges = await get_candidate_price_ranges(
+            location,
+            status_type,
+            sold_in_last,
+            total_results,
+            session=session,
+            rate_limiter=rate_limiter,
         )
-        await split_price_query(
+        planned_ranges = await refine_price_ranges(
             location,
             status_type,
-            min_price,
-            max_price,
-            fetch_params,
-            **kwargs,
+            sold_in_last,
+            price_ranges,
             session=session,
             rate_limiter=rate_limiter,
         )
+        plan_params = [params for params, _ in planned_ranges]
+        fetch_params = [params for params, count in planned_ranges if count]
     else:
-        fetch_params.append(
-            {
-                "location": location,
-                "status_type": status_type,
-                "soldInLast": kwargs.get("soldInLast", "") or "",
-            }
-        )
+        plan_params = [build_search_params(location, status_type, sold_in_last)]
+        fetch_params = plan_params
+    await save_search_plan_async(
+        location, status_type, sold_in_last, total_results, plan_params
+    )
     return fetch_params
@@ -0,0 +1,149 @@
+import os
+import math
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.models import ZipCrawlState
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# soldInLast values accepted by the search endpoint, in days.
+SOLD_IN_LAST_WINDOWS = [1, 7, 14, 30, 90]
+FULL_SOLD_IN_LAST = "90"
+# Windows overlap the previous crawl by this much so listings marked sold while
+# it was running aren't missed. Kept in hours so a daily run still fits in "1".
+SOLD_WINDOW_MARGIN_HOURS = int(os.getenv("SOLD_WINDOW_MARGIN_HOURS", "1"))
+# Re-crawl the full window this often to pick up sales that were posted late.
+FULL_SOLD_REFRESH_DAYS = 30
+# Fetch a zip in full at least this often even when its fingerprint is unchanged.
+FINGERPRINT_REFRESH_DAYS = int(os.getenv("FINGERPRINT_REFRESH_DAYS", "7"))
+
+
+def as_utc(value):
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def get_zip_crawl_states():
+    db: Session = SessionLocal()
+    try:
+        return {
+            (state.zip_code, state.status_type): {
+                "sold_in_last": state.sold_in_last,
+                "last_success_at": as_utc(state.last_success_at),
+                "last_full_success_at": as_utc(state.last_full_success_at),
+                "fingerprint": state.fingerprint,
+                "fingerprint_sold_in_last": state.fingerprint_sold_in_last,
+                "last_deep_crawl_at": as_utc(state.last_deep_crawl_at),
+            }
+            for state in db.scalars(select(ZipCrawlState))
+        }
+    finally:
+        db.close()
+
+
+def choose_sold_in_last(state, now=None):
+    """
+    Smallest soldInLast window that covers the time since the zip's last
+    successful sold crawl. New zips, long outages and zips due for their periodic
+    full refresh get the full 90 days.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not state or not state["last_success_at"] or not state["last_full_success_at"]:
+        return FULL_SOLD_IN_LAST
+    if (now - state["last_full_success_at"]).days >= FULL_SOLD_REFRESH_DAYS:
+        return FULL_SOLD_IN_LAST
+    gap_hours = (now - state["last_success_at"]).total_seconds() / 3600
+    gap_hours = math.ceil(gap_hours + SOLD_WINDOW_MARGIN_HOURS)
+    for window in SOLD_IN_LAST_WINDOWS:
+        if window * 24 >= gap_hours:
+            return str(window)
+    return FULL_SOLD_IN_LAST
+
+
+def fingerprint_is_current(state, sold_in_last, fingerprint, now=None):
+    """
+    True when a fresh probe matches the fingerprint from the last crawl taken with
+    the same soldInLast, and the zip was fetched in full recently enough that its
+    deep fetch can be skipped.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not state or not state["fingerprint"] or not state["last_deep_crawl_at"]:
+        return False
+    if state["fingerprint_sold_in_last"] != (sold_in_last or ""):
+        return False
+    if (now - state["last_deep_crawl_at"]).days >= FINGERPRINT_REFRESH_DAYS:
+        return False
+    return state["fingerprint"] == fingerprint
+
+
+def record_zip_crawls(crawls, crawled_at):
+    """
+    Record successful crawls, given as dicts with zip_code, status_type,
+    sold_in_last, fingerprint (None when no probe was made) and deep_crawl (False
+    when the fetch was skipped because the fingerprint matched). crawled_at should
+    be when the run started, so the next window also covers anything that sold
+    while this run was in progress.
+    """
+    if not crawls:
+        return
+    rows = []
+    for crawl in crawls:
+        sold_in_last = crawl["sold_in_last"] or ""
+        full_window = (
+            crawl["status_type"] != "RecentlySold" or sold_in_last == FULL_SOLD_IN_LAST
+        )
+        rows.append(
+            {
+                "zip_code": crawl["zip_code"],
+                "status_type": crawl["status_type"],
+                "sold_in_last": sold_in_last,
+                "last_success_at": crawled_at,
+                "last_full_success_at": (
+                    crawled_at if full_window and crawl["deep_crawl"] else None
+                ),
+                "fingerprint": crawl["fingerprint"],
+                "fingerprint_sold_in_last": (
+                    sold_in_last if crawl["fingerprint"] else None
+                ),
+                "last_deep_crawl_at": crawled_at if crawl["deep_crawl"] else None,
+            }
+        )
+    stmt = insert(ZipCrawlState).values(rows)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ZipCrawlState.zip_code, ZipCrawlState.status_type],
+        set_={
+            "sold_in_last": excluded.sold_in_last,
+            "last_success_at": excluded.last_success_at,
+            "last_full_success_at": func.coalesce(
+                excluded.last_full_success_at, ZipCrawlState.last_full_success_at
+            ),
+            "fingerprint": func.coalesce(
+                excluded.fingerprint, ZipCrawlState.fingerprint
+            ),
+            "fingerprint_sold_in_last": func.coalesce(
+                excluded.fingerprint_sold_in_last,
+                ZipCrawlState.fingerprint_sold_in_last,
+            ),
+            "last_deep_crawl_at": func.coalesce(
+                excluded.last_deep_crawl_at, ZipCrawlState.last_deep_crawl_at
+            ),
+        },
+    )
+    db: Session = SessionLocal()
+    try:
+        with db.begin():
+            db.execute(stmt)
+    finally:
+        db.close()
+    logger.info(f"Recorded {len(rows)} successful zip crawls")
@@ -1,20 +1,34 @@
-import collections
+class ZipRecord:
+    """
+    One zip code from the locations sheet.
+    """
 
+    __slots__ = ("zip_code", "state_id", "city", "county", "county_fips")
 
-def create_zip_code_dicts(locations):
-    zip_dict = collections.defaultdict(lambda: {"zip_code": "", "state_id": ""})
+    def __init__(self, zip_code, state_id, city, county, county_fips):
+        self.zip_code = zip_code
+        self.state_id = state_id
+        self.city = city
+        self.county = county
+        self.county_fips = county_fips
 
-    for location in locations:
-        zip_code = location["zip"]
-        state_id = location["state_id"]
-        city = location["city"]
-        county = location["county_name"]
-        county_fips = location["county_fips"]
+    def __repr__(self):
+        return f"ZipRecord({self.zip_code}, {self.state_id})"
 
-        zip_dict[zip_code]["zip_code"] = zip_code
-        zip_dict[zip_code]["state_id"] = state_id
-        zip_dict[zip_code]["city"] = city
-        zip_dict[zip_code]["county"] = county
-        zip_dict[zip_code]["county_fips"] = county_fips
 
-    return zip_dict
+def create_zip_records(locations):
+    """
+    ZipRecords keyed by zip code. When a zip appears on several rows the last
+    row wins.
+    """
+    zip_records = {}
+    for location in locations:
+        zip_code = location["zip"]
+        zip_records[zip_code] = ZipRecord(
+            zip_code,
+            location["state_id"],
+            location["city"],
+            location["county_name"],
+            location["county_fips"],
+        )
+    return zip_records
@@ -0,0 +1,213 @@
+"""
+Crawl worker for distributed runs. Queue a run once, then start as many workers
+as the API keys allow, on one machine or several, against the same database:
+
+    python -m app.main --enqueue
+    python -m app.worker
+    python -m app.worker --worker-id node-2
+
+Each worker claims jobs from crawl_jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+rate limits every key in RAPIDAPI_ZILLOW_API_KEYS on its own and renews its
+leases while it works. Jobs of a crashed worker are claimed again once their
+lease expires. The worker that sees the queue drained records the run.
+"""
+
+from app.db import dispose_async_engine
+from app.main import finish_crawl_run, process_zip, write_run_metrics
+from app.services.api_budget_service import api_budget
+from app.services.metrics_service import metrics
+from app.services.property_writer_service import PropertyWriter
+from app.services.crawl_scheduler_service import CrawlScheduler
+from app.services.crawl_journal_service import CrawlJournal
+from app.services.crawl_queue_service import (
+    CRAWL_JOB_LEASE_SECONDS,
+    claim_jobs,
+    claim_run_finish,
+    complete_job,
+    fail_job,
+    get_open_run_id,
+    get_queue_counts,
+    get_run_jobs,
+    job_from_row,
+    release_job,
+    renew_leases,
+)
+from app.services.zip_crawl_state_service import get_zip_crawl_states
+from app.services.rapidapi_client import (
+    RAPIDAPI_RATE_LIMIT,
+    RAPIDAPI_ZILLOW_API_KEYS,
+    ApiKeyPool,
+    request_coalescer,
+)
+import os
+import socket
+import logging
+import asyncio
+import argparse
+from aiohttp import ClientSession
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+# Jobs claimed per round trip; claimed jobs wait locally until there's capacity.
+CLAIM_BATCH_SIZE = int(os.getenv("CRAWL_CLAIM_BATCH_SIZE", "5"))
+
+
+async def finish_queued_run(run_id):
+    """
+    Record the results of a drained run. Only the worker that marks the run
+    finished does this, so zip state and zip_stats are written once.
+    """
+    counts = await asyncio.to_thread(get_queue_counts, run_id)
+    if counts.get("pending") or counts.get("running"):
+        return
+    if counts.get("failed"):
+        logger.warning(
+            f"Crawl run {run_id} has {counts['failed']} failed jobs, requeue them with python -m app.main --enqueue --resume"
+        )
+        return
+    if not await asyncio.to_thread(claim_run_finish, run_id):
+        return
+    rows = await asyncio.to_thread(get_run_jobs, run_id)
+    journal = await asyncio.to_thread(CrawlJournal.load, run_id)
+    jobs = [job_from_row(row) for row in rows]
+    crawl_results = {
+        (row["zip_code"], row["status_type"]): row["result"] for row in rows
+    }
+    incomplete_jobs = await finish_crawl_run(journal, jobs, crawl_results, finish=False)
+    logger.info(
+        f"Finished crawl run {run_id}: {len(jobs) - len(incomplete_jobs)} jobs recorded"
+    )
+
+
+async def run_worker(run_id=None, worker_id=None, claim_batch_size=CLAIM_BATCH_SIZE):
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    metrics.reset()
+    request_coalescer.reset()
+    rate_limiter = ApiKeyPool(RAPIDAPI_ZILLOW_API_KEYS, rate=RAPIDAPI_RATE_LIMIT)
+    await asyncio.to_thread(api_budget.start)
+    if run_id is None:
+        run_id = await asyncio.to_thread(get_open_run_id)
+        if run_id is None:
+            logger.warning("No queued crawl run to work on")
+            return None
+    journal = await asyncio.to_thread(CrawlJournal.load, run_id)
+    zip_crawl_states = await asyncio.to_thread(get_zip_crawl_states)
+    scheduler = CrawlScheduler(
+        rate_limiter, budget=api_budget if api_budget.limited else None
+    )
+    job_ids = {}
+    logger.info(f"Worker {worker_id} joining crawl run {run_id} with {rate_limiter}")
+
+    async def release_deferred():
+        while scheduler.deferred:
+            job = scheduler.deferred.pop()
+            await asyncio.to_thread(
+                release_job, job_ids.pop((job.zip_code, job.status_type)), worker_id
+            )
+
+    async def claim():
+        await release_deferred()
+        if api_budget.remaining() == 0:
+            logger.warning(f"Worker {worker_id} stopping, API budget exhausted")
+            return None
+        rows = await asyncio.to_thread(claim_jobs, run_id, worker_id, claim_batch_size)
+        if not rows:
+            counts = await asyncio.to_thread(get_queue_counts, run_id)
+            # Keep polling while other workers hold leases that may still expire.
+            return [] if counts.get("pending") or counts.get("running") else None
+        jobs = []
+        for row in rows:
+            job = job_from_row(row)
+            job_ids[(job.zip_code, job.status_type)] = row["id"]
+            # A reclaimed job resumes from the pages its last worker wrote.
+            await asyncio.to_thread(journal.reload, job.zip_code, job.status_type)
+            jobs.append(job)
+        return jobs
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(CRAWL_JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(renew_leases, worker_id)
+                await asyncio.to_thread(api_budget.sync)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} heartbeat failed: {e}")
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        async with ClientSession() as session, PropertyWriter(
+            on_pages_written=journal.record_pages
+        ) as writer:
+
+            async def run_job(job):
+                key = (job.zip_code, job.status_type)
+                result = None
+                try:
+                    with metrics.timer(
+                        "zip_crawl_seconds", status_type=job.status_type
+                    ):
+                        result = await process_zip(
+                            job.zip_code,
+                            job.zip_data,
+                            job.status_type,
+                            job.sold_in_last,
+                            session,
+                            rate_limiter,
+                            writer,
+                            journal,
+                            zip_crawl_states.get(key),
+                        )
+                    # The job only counts as done once its pages are written.
+                    await writer.wait_written()
+                finally:
+                    job_id = job_ids.pop(key)
+                    if journal.is_complete(*key):
+                        await asyncio.to_thread(
+                            complete_job,
+                            job_id,
+                            worker_id,
+                            result or journal.result(*key),
+                        )
+                    else:
+                        await asyncio.to_thread(
+                            fail_job, job_id, worker_id, "Crawl incomplete"
+                        )
+
+            await scheduler.run(run_job, refill=claim)
+            await release_deferred()
+    finally:
+        heartbeat_task.cancel()
+        await asyncio.to_thread(api_budget.flush)
+
+    await finish_queued_run(run_id)
+    await dispose_async_engine()
+    logger.info(f"Worker {worker_id} finished: {rate_limiter} | {api_budget}")
+    write_run_metrics()
+    return run_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work on a queued crawl run.")
+    parser.add_argument(
+        "--run-id",
+        type=int,
+        help="Crawl run to work on (default: the latest unfinished queued run).",
+    )
+    parser.add_argument(
+        "--worker-id", help="Name of this worker (default: hostname:pid)."
+    )
+    parser.add_argument("--claim-batch-size", type=int, default=CLAIM_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(
+        run_worker(
+            run_id=args.run_id,
+            worker_id=args.worker_id,
+            claim_batch_size=args.claim_batch_size,
+        )
+    )
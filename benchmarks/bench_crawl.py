@@ -0,0 +1,212 @@
+"""
+End-to-end crawl benchmark against the local mock RapidAPI server.
+
+    DATABASE_URL=postgresql://work@localhost/isidore_bench \
+        python -m benchmarks.bench_crawl --zips 200 --rate 50 --rate-429 0.02
+
+Starts benchmarks.mock_rapidapi in a subprocess, migrates DATABASE_URL and runs
+the real run_property_services pipeline against the mock. Reports zips/min, API
+calls per zip, rows written per second and peak RSS for each run. Later runs
+show the incremental path (fingerprints, sold windows) on an unchanged market.
+
+With --workers N the run is queued with --enqueue and crawled by N app.worker
+processes instead, each with its own rate limit (set --rate per worker).
+
+The writers use Postgres upserts and partitions, so DATABASE_URL has to be a
+Postgres database; use a scratch one, the benchmark writes into it.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from benchmarks.mock_rapidapi import (
+    MockSettings,
+    add_settings_arguments,
+    settings_from_args,
+    write_locations_csv,
+)
+
+SERVER_START_TIMEOUT = 15
+
+
+def start_mock_server(port, args):
+    command = [sys.executable, "-m", "benchmarks.mock_rapidapi", "--port", str(port)]
+    for name in vars(MockSettings()):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    server = subprocess.Popen(command)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            mock_stats(port)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Mock RapidAPI server did not start on port {port}")
+
+
+def mock_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return json.load(response)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def configure_environment(port, rate, work_dir):
+    # Has to happen before the app modules are imported: they read it once.
+    os.environ["RAPIDAPI_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("RAPIDAPI_ZILLOW_API_KEY", "bench")
+    os.environ["RAPIDAPI_RATE_LIMIT"] = str(rate)
+    os.environ["RAPIDAPI_CACHE_PATH"] = ""
+    os.environ["LOCATIONS_CACHE_PATH"] = os.path.join(work_dir, "locations_cache.csv")
+    os.environ["METRICS_TEXTFILE_PATH"] = os.path.join(work_dir, "isidore.prom")
+    os.environ["METRICS_SUMMARY_PATH"] = os.path.join(work_dir, "crawl_summary.json")
+
+
+def run_crawl(locations_path, zip_count):
+    from app.main import run_property_services
+    from app.services.metrics_service import metrics
+
+    started = time.perf_counter()
+    asyncio.run(run_property_services(locations=locations_path))
+    elapsed = time.perf_counter() - started
+    calls = metrics.counter_total("rapidapi_calls_total")
+    rows = metrics.counter_total("db_rows_total")
+    return {
+        "seconds": round(elapsed, 1),
+        "zips_per_minute": round(zip_count / elapsed * 60, 1),
+        "api_calls": calls,
+        "api_calls_per_zip": round(calls / zip_count, 2),
+        "rows_written": rows,
+        "rows_per_second": round(rows / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def summary_counter_total(summary, name):
+    # Summary counters are keyed by name plus labels, e.g. db_rows_total{result="inserted"}.
+    return sum(
+        value
+        for key, value in summary["counters"].items()
+        if key == name or key.startswith(f"{name}{{")
+    )
+
+
+def run_distributed_crawl(locations_path, zip_count, workers):
+    from app.main import run_property_services
+
+    summary_dir = os.path.dirname(os.environ["METRICS_SUMMARY_PATH"])
+    summary_paths = [
+        os.path.join(summary_dir, f"worker_summary_{index}.json")
+        for index in range(workers)
+    ]
+    started = time.perf_counter()
+    asyncio.run(run_property_services(locations=locations_path, enqueue=True))
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "app.worker", "--worker-id", f"bench-{index}"],
+            env={
+                **os.environ,
+                "METRICS_TEXTFILE_PATH": "",
+                "METRICS_SUMMARY_PATH": summary_path,
+            },
+        )
+        for index, summary_path in enumerate(summary_paths)
+    ]
+    failed = sum(process.wait() != 0 for process in processes)
+    elapsed = time.perf_counter() - started
+    calls = rows = 0
+    for summary_path in summary_paths:
+        if not os.path.exists(summary_path):
+            continue
+        with open(summary_path) as summary_file:
+            summary = json.load(summary_file)
+        os.remove(summary_path)
+        calls += summary_counter_total(summary, "rapidapi_calls_total")
+        rows += summary_counter_total(summary, "db_rows_total")
+    # ru_maxrss of children is the largest single worker, not the sum.
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "workers": workers,
+        "failed_workers": failed,
+        "seconds": round(elapsed, 1),
+        "zips_per_minute": round(zip_count / elapsed * 60, 1),
+        "api_calls": calls,
+        "api_calls_per_zip": round(calls / zip_count, 2),
+        "rows_written": rows,
+        "rows_per_second": round(rows / elapsed, 1),
+        "peak_worker_rss_mb": round(
+            peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument(
+        "--rate", type=int, default=50, help="Crawler requests per second"
+    )
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Crawl with this many app.worker processes instead of in-process",
+    )
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+    settings = settings_from_args(args)
+
+    work_dir = tempfile.mkdtemp(prefix="isidore_bench_")
+    configure_environment(args.port, args.rate, work_dir)
+    locations_path = os.path.join(work_dir, "locations.csv")
+    write_locations_csv(settings, locations_path)
+
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config("alembic.ini"), "head")
+
+    server = start_mock_server(args.port, args)
+    report = {"settings": vars(settings), "runs": []}
+    try:
+        for run in range(args.runs):
+            requests_before = mock_stats(args.port)["requests"]
+            if args.workers:
+                result = run_distributed_crawl(
+                    locations_path, settings.zips, args.workers
+                )
+            else:
+                result = run_crawl(locations_path, settings.zips)
+            result["mock_requests"] = (
+                mock_stats(args.port)["requests"] - requests_before
+            )
+            result["mock_requests_per_zip"] = round(
+                result["mock_requests"] / settings.zips, 2
+            )
+            report["runs"].append(result)
+            print(f"Run {run + 1}: {json.dumps(result)}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
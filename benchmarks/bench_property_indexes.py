@@ -0,0 +1,162 @@
+"""
+Query times on the properties table before and after the indexes added in
+migration 0002, measured on a synthetic copy of the table.
+
+    python -m benchmarks.bench_property_indexes --rows 5000000
+
+The copy lives in its own schema of the DATABASE_URL database and is dropped
+afterwards unless --keep is given.
+"""
+
+import time
+import random
+import argparse
+import statistics
+from sqlalchemy import MetaData, text
+from sqlalchemy.schema import CreateSchema, CreateTable, DropSchema
+from app.db import engine
+from app.models import Property
+
+BENCH_SCHEMA = "bench_property_indexes"
+INSERT_CHUNK = 500_000
+
+# Access paths used by the crawler, the planner and analysis.ipynb.
+QUERIES = {
+    "zip_status_count": """
+        SELECT count(*) FROM {table}
+        WHERE zip_code = :zip_code AND listing_status = 'FOR_SALE'
+    """,
+    "historical_prices": """
+        SELECT price FROM {table}
+        WHERE zip_code = :zip_code AND listing_status = 'RECENTLY_SOLD'
+        AND price IS NOT NULL
+    """,
+    "sold_last_30_days": """
+        SELECT count(*) FROM {table}
+        WHERE zip_code = :zip_code AND listing_status = 'RECENTLY_SOLD'
+        AND date_sold >= current_date - 30
+    """,
+    "zip_status_date_grouping": """
+        SELECT listing_status, date_trunc('month', date_sold), count(*), avg(price)
+        FROM {table} WHERE zip_code = :zip_code
+        GROUP BY 1, 2
+    """,
+    "changed_last_hour": """
+        SELECT count(*) FROM {table} WHERE updated_at >= now() - interval '1 hour'
+    """,
+}
+
+INSERT_ROWS = """
+    INSERT INTO {table} (
+        zpid, address, price, zestimate, bedrooms, bathrooms, living_area,
+        listing_status, date_sold, state_id, zip_code, created_at, updated_at
+    )
+    SELECT
+        g,
+        g || ' Synthetic St',
+        50000 + (g * 104729) % 950000,
+        50000 + (g * 15485863) % 950000,
+        1 + g % 6,
+        1 + g % 4,
+        600 + (g * 31) % 4000,
+        CASE WHEN g % 5 < 2 THEN 'FOR_SALE' ELSE 'RECENTLY_SOLD' END,
+        CASE WHEN g % 5 >= 2 THEN current_date - (g % 365) END,
+        'TX',
+        (10000 + (g * 7919) % :zip_count)::text,
+        now() - make_interval(days => g % 365),
+        now() - make_interval(mins => g % 43200)
+    FROM generate_series(:start, :stop) AS g
+"""
+
+
+def build_bench_table():
+    return Property.__table__.to_metadata(MetaData(), schema=BENCH_SCHEMA)
+
+
+def load_rows(table, rows, zip_count):
+    name = f"{BENCH_SCHEMA}.{table.name}"
+    with engine.begin() as connection:
+        connection.execute(DropSchema(BENCH_SCHEMA, cascade=True, if_exists=True))
+        connection.execute(CreateSchema(BENCH_SCHEMA))
+        connection.execute(CreateTable(table))
+    for start in range(1, rows + 1, INSERT_CHUNK):
+        stop = min(start + INSERT_CHUNK - 1, rows)
+        with engine.begin() as connection:
+            connection.execute(
+                text(INSERT_ROWS.format(table=name)),
+                {"start": start, "stop": stop, "zip_count": zip_count},
+            )
+        print(f"Loaded {stop:,} of {rows:,} rows")
+    analyze(name)
+
+
+def analyze(name):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"VACUUM ANALYZE {name}"))
+
+
+def time_queries(name, zip_count, repeats):
+    """
+    Median and p95 wall time in milliseconds of each query over random zips.
+    """
+    results = {}
+    with engine.connect() as connection:
+        for query_name, sql in QUERIES.items():
+            statement = text(sql.format(table=name))
+            timings = []
+            for _ in range(repeats):
+                zip_code = str(10000 + random.randrange(zip_count))
+                started = time.perf_counter()
+                connection.execute(statement, {"zip_code": zip_code}).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[query_name] = (
+                statistics.median(timings),
+                timings[int(len(timings) * 0.95) - 1],
+            )
+    return results
+
+
+def print_results(before, after):
+    print(
+        f"{'query':<26} {'before p50':>11} {'before p95':>11} {'after p50':>10} {'after p95':>10} {'speedup':>8}"
+    )
+    for query_name in QUERIES:
+        before_p50, before_p95 = before[query_name]
+        after_p50, after_p95 = after[query_name]
+        print(
+            f"{query_name:<26} {before_p50:>9.2f}ms {before_p95:>9.2f}ms {after_p50:>8.2f}ms {after_p95:>8.2f}ms {before_p50 / after_p50:>7.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--zips", type=int, default=5_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench schema")
+    args = parser.parse_args()
+
+    table = build_bench_table()
+    name = f"{BENCH_SCHEMA}.{table.name}"
+    try:
+        load_rows(table, args.rows, args.zips)
+        before = time_queries(name, args.zips, args.repeats)
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for index in table.indexes:
+                index.create(connection)
+        print(
+            f"Built {len(table.indexes)} indexes in {time.perf_counter() - started:.1f}s"
+        )
+        analyze(name)
+        after = time_queries(name, args.zips, args.repeats)
+        print_results(before, after)
+    finally:
+        if not args.keep:
+            with engine.begin() as connection:
+                connection.execute(DropSchema(BENCH_SCHEMA, cascade=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the RapidAPI Zillow /search endpoint.
+
+    python -m benchmarks.mock_rapidapi --port 8900 --zips 200
+
+Point the crawler at it with RAPIDAPI_BASE_URL=http://127.0.0.1:8900. Every zip
+gets a synthetic population of for-sale and sold lots, generated from the zip
+code so it is the same on every run. Like the real API, totalResultCount is the
+full match count but only the first RESULTS_CAP results can be paged through.
+"""
+
+import math
+import time
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+RESULTS_CAP = 820
+FIRST_ZIP = 10001
+STATES = ["TX", "FL", "GA", "NC", "TN", "AZ"]
+SQFT_PER_ACRE = 43560
+
+
+class MockSettings:
+    """
+    Shape of the synthetic market and how badly the fake API behaves.
+    """
+
+    def __init__(
+        self,
+        zips=200,
+        mean_results=400,
+        sold_ratio=1.5,
+        median_price=60000,
+        price_sigma=0.9,
+        page_size=41,
+        latency=0.15,
+        latency_jitter=0.1,
+        rate_429=0.0,
+        rate_5xx=0.0,
+        seed=0,
+    ):
+        self.zips = zips
+        self.mean_results = mean_results
+        self.sold_ratio = sold_ratio
+        self.median_price = median_price
+        self.price_sigma = price_sigma
+        self.page_size = page_size
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.seed = seed
+
+
+def zip_codes(settings):
+    return [str(FIRST_ZIP + index) for index in range(settings.zips)]
+
+
+def zip_state(zip_code):
+    return STATES[int(zip_code) % len(STATES)]
+
+
+def generate_listings(settings, zip_code, status_type):
+    """
+    Deterministic listings for one zip and status. Counts are log-normal around
+    mean_results, so a few zips go far past the 820 cap and need splitting.
+    """
+    rng = random.Random(f"{settings.seed}:{zip_code}:{status_type}")
+    mean = settings.mean_results * (
+        settings.sold_ratio if status_type == "RecentlySold" else 1
+    )
+    count = int(rng.lognormvariate(math.log(mean), 0.8))
+    now_ms = int(time.time() * 1000)
+    state_id = zip_state(zip_code)
+    zpid_base = (int(zip_code) * 10 + (status_type == "RecentlySold")) * 100_000
+    listings = []
+    for index in range(count):
+        lot_sqft = rng.lognormvariate(math.log(2 * SQFT_PER_ACRE), 1.2)
+        in_acres = lot_sqft >= SQFT_PER_ACRE
+        price = int(
+            round(
+                rng.lognormvariate(
+                    math.log(settings.median_price), settings.price_sigma
+                ),
+                -2,
+            )
+        )
+        days_ago = rng.randint(0, 180)
+        listing = {
+            "zpid": str(zpid_base + index),
+            "address": f"{index + 1} Synthetic Rd, Testville, {state_id} {zip_code}",
+            "unit": None,
+            "latitude": 30 + rng.random(),
+            "longitude": -97 - rng.random(),
+            "price": price,
+            "priceChange": None,
+            "zestimate": int(price * rng.uniform(0.9, 1.1)),
+            "imgSrc": f"https://photos.example.com/{zip_code}/{index}.jpg",
+            "detailUrl": f"/homedetails/{zpid_base + index}_zpid/",
+            "bedrooms": None,
+            "bathrooms": None,
+            "livingArea": None,
+            "lotAreaValue": (
+                round(lot_sqft / SQFT_PER_ACRE, 2) if in_acres else round(lot_sqft)
+            ),
+            "lotAreaUnit": "acres" if in_acres else "sqft",
+            "listingStatus": (
+                "RECENTLY_SOLD" if status_type == "RecentlySold" else "FOR_SALE"
+            ),
+            "propertyType": "LOT",
+            "contingentListingType": None,
+            "rentZestimate": None,
+            "daysOnZillow": days_ago if status_type == "ForSale" else -1,
+            "dateSold": (
+                now_ms - days_ago * 86_400_000
+                if status_type == "RecentlySold"
+                else None
+            ),
+            "country": "USA",
+            "currency": "USD",
+            "hasImage": True,
+            "_lot_sqft": lot_sqft,
+            "_days_ago": days_ago,
+        }
+        listings.append(listing)
+    return listings
+
+
+def parse_number(value):
+    return float(value) if value not in (None, "") else None
+
+
+def search(listings, params):
+    min_price = parse_number(params.get("minPrice"))
+    max_price = parse_number(params.get("maxPrice"))
+    lot_min = parse_number(params.get("lotSizeMin"))
+    lot_max = parse_number(params.get("lotSizeMax"))
+    sold_in_last = parse_number(params.get("soldInLast"))
+    matches = [
+        listing
+        for listing in listings
+        if (min_price is None or listing["price"] >= min_price)
+        and (max_price is None or listing["price"] <= max_price)
+        and (lot_min is None or listing["_lot_sqft"] >= lot_min)
+        and (lot_max is None or listing["_lot_sqft"] <= lot_max)
+        and (
+            sold_in_last is None
+            or listing["dateSold"] is None
+            or listing["_days_ago"] <= sold_in_last
+        )
+    ]
+    sort = params.get("sort")
+    if sort == "price_low_high":
+        matches.sort(key=lambda listing: listing["price"])
+    elif sort == "price_high_low":
+        matches.sort(key=lambda listing: -listing["price"])
+    else:
+        matches.sort(key=lambda listing: listing["_days_ago"])
+    return matches
+
+
+class MockRapidAPI:
+    def __init__(self, settings):
+        self.settings = settings
+        self.listings = {}
+        self.requests = 0
+        self.errors = 0
+        self.rng = random.Random(settings.seed)
+
+    def get_listings(self, zip_code, status_type):
+        key = (zip_code, status_type)
+        if key not in self.listings:
+            self.listings[key] = generate_listings(self.settings, zip_code, status_type)
+        return self.listings[key]
+
+    async def handle_search(self, request):
+        self.requests += 1
+        settings = self.settings
+        await asyncio.sleep(
+            max(
+                0.0,
+                settings.latency + self.rng.uniform(-1, 1) * settings.latency_jitter,
+            )
+        )
+        roll = self.rng.random()
+        if roll < settings.rate_429:
+            self.errors += 1
+            return web.json_response(
+                {"message": "Too many requests"},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < settings.rate_429 + settings.rate_5xx:
+            self.errors += 1
+            return web.json_response({"message": "Upstream error"}, status=503)
+
+        params = request.query
+        location = params.get("location", "")
+        status_type = params.get("status_type", "ForSale")
+        if not location.isdigit():
+            return web.json_response({"message": "Unknown location"}, status=404)
+        matches = search(self.get_listings(location, status_type), params)
+        page = int(params.get("page") or 1)
+        visible = matches[:RESULTS_CAP]
+        start = (page - 1) * settings.page_size
+        props = [
+            {key: value for key, value in listing.items() if not key.startswith("_")}
+            for listing in visible[start : start + settings.page_size]
+        ]
+        return web.json_response(
+            {
+                "props": props,
+                "resultsPerPage": settings.page_size,
+                "totalPages": math.ceil(len(visible) / settings.page_size),
+                "totalResultCount": len(matches),
+            }
+        )
+
+    async def handle_stats(self, request):
+        return web.json_response({"requests": self.requests, "errors": self.errors})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/search", self.handle_search)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+def write_locations_csv(settings, path):
+    """
+    Locations sheet for the synthetic zips, for python -m app.main --locations.
+    """
+    with open(path, "w") as csv_file:
+        csv_file.write("zip,state_id,city,county_name,county_fips\n")
+        for zip_code in zip_codes(settings):
+            csv_file.write(f"{zip_code},{zip_state(zip_code)},Testville,Test,00000\n")
+
+
+def add_settings_arguments(parser):
+    defaults = MockSettings()
+    for name, value in vars(defaults).items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=type(value), default=value
+        )
+
+
+def settings_from_args(args):
+    return MockSettings(**{name: getattr(args, name) for name in vars(MockSettings())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock RapidAPI Zillow server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(
+        MockRapidAPI(settings_from_args(args)).app(), host=args.host, port=args.port
+    )
@@ -1,35 +1,272 @@
+"""
+Export the properties table to CSV or Parquet without loading it into memory.
+
+    python db_export.py --format csv --output properties.csv
+    python db_export.py --format parquet --output exports/properties \
+        --columns zpid,price,listing_status --filter state_id=TX
+    python db_export.py --format parquet --output exports/properties \
+        --watermark-file exports/properties.watermark
+
+CSV is streamed with COPY ... TO STDOUT, Parquet is read through a server-side
+cursor in batches, ordered by partition, and written as one dataset partitioned
+by state_id/zip_code. With --since or --watermark-file only rows updated after
+the watermark are exported. The stored watermark trails the newest updated_at
+by up to UPDATED_AT_VISIBILITY_LAG so rows of slow concurrent writes are not
+missed, which means recent rows can be exported twice; Parquet increments are
+added next to earlier files, so readers keep the row with the latest updated_at
+per zpid.
+"""
+
+import os
+import sys
+import argparse
+from datetime import date, datetime
 import psycopg2
-import csv
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, String
+from app.db import DATABASE_URL
+from app.models import Property
+from app.services.property_db_service import incremental_watermark
+
+BATCH_SIZE = 50_000
+PARTITION_COLUMNS = ["state_id", "zip_code"]
+# Most zips hold a few hundred rows: one file and row group per zip partition,
+# split only for very large ones.
+MAX_ROWS_PER_FILE = 1_000_000
+MIN_ROWS_PER_GROUP = 50_000
+COLUMNS = [column.name for column in Property.__table__.columns]
+
+
+def coerce_value(column, value):
+    python_type = Property.__table__.columns[column].type.python_type
+    if python_type is bool:
+        return value.lower() in ("1", "true", "yes")
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def parse_filters(filters):
+    """
+    Turn repeated column=value arguments into {column: [values]}, with values cast
+    to the column's type. Values given for the same column are ORed, different
+    columns are ANDed.
+    """
+    parsed = {}
+    for item in filters or []:
+        column, _, value = item.partition("=")
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown filter column: {column}")
+        parsed.setdefault(column, []).append(coerce_value(column, value))
+    return parsed
+
+
+def build_where(filters, since):
+    conditions = [
+        sql.SQL("{} = ANY(%s)").format(sql.Identifier(column)) for column in filters
+    ]
+    params = list(filters.values())
+    if since is not None:
+        conditions.append(sql.SQL("updated_at > %s"))
+        params.append(since)
+    if not conditions:
+        return sql.SQL(""), params
+    return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions), params
+
+
+def build_export_query(columns, filters, since, order_by=("zpid",)):
+    where, params = build_where(filters, since)
+    query = (
+        sql.SQL("SELECT {} FROM properties").format(
+            sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+        )
+        + where
+        + sql.SQL(" ORDER BY {}").format(
+            sql.SQL(", ").join(sql.Identifier(column) for column in order_by)
+        )
+    )
+    return query, params
+
+
+def get_watermark(cursor, filters, since):
+    """
+    Watermark for the next incremental export, read in the export's snapshot.
+    """
+    where, params = build_where(filters, since)
+    cursor.execute(
+        sql.SQL("SELECT max(updated_at), localtimestamp FROM properties") + where,
+        params,
+    )
+    newest, now = cursor.fetchone()
+    return incremental_watermark(newest, now, since)
+
+
+def export_csv(connection, output, columns, filters, since):
+    query, params = build_export_query(columns, filters, since)
+    with connection.cursor() as cursor:
+        # COPY does not take bind parameters, so inline them safely first.
+        copy = sql.SQL("COPY ({}) TO STDOUT WITH CSV HEADER").format(
+            sql.SQL(cursor.mogrify(query, params).decode())
+        )
+        if output == "-":
+            cursor.copy_expert(copy, sys.stdout)
+            return cursor.rowcount
+        with open(output, "w", newline="") as csv_file:
+            cursor.copy_expert(copy, csv_file)
+        return cursor.rowcount
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        BigInteger: pa.int64(),
+        Integer: pa.int64(),
+        Float: pa.float64(),
+        String: pa.string(),
+        Boolean: pa.bool_(),
+        Date: pa.date32(),
+        DateTime: pa.timestamp("us"),
+    }
+    return pa.schema(
+        [
+            (column, types[type(Property.__table__.columns[column].type)])
+            for column in columns
+        ]
+    )
+
+
+def export_parquet(connection, output, columns, filters, since, compression):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    columns = columns + [
+        column for column in PARTITION_COLUMNS if column not in columns
+    ]
+    schema = arrow_schema(columns)
+    partitioning = ds.partitioning(
+        pa.schema([schema.field(column) for column in PARTITION_COLUMNS]),
+        flavor="hive",
+    )
+    file_options = ds.ParquetFileFormat().make_write_options(compression=compression)
+    export_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    # Rows of one partition arrive together, so each partition's file is
+    # written and closed once instead of once per batch it appears in.
+    query, params = build_export_query(
+        columns, filters, since, order_by=PARTITION_COLUMNS + ["zpid"]
+    )
+    exported = 0
+
+    def record_batches(cursor):
+        nonlocal exported
+        while rows := cursor.fetchmany(BATCH_SIZE):
+            exported += len(rows)
+            yield pa.RecordBatch.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(zip(*rows), schema)
+                ],
+                schema=schema,
+            )
+
+    # A named cursor is server side: rows arrive BATCH_SIZE at a time.
+    with connection.cursor(name="db_export") as cursor:
+        cursor.itersize = BATCH_SIZE
+        cursor.execute(query, params)
+        ds.write_dataset(
+            record_batches(cursor),
+            output,
+            schema=schema,
+            format="parquet",
+            partitioning=partitioning,
+            file_options=file_options,
+            basename_template=f"{export_id}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_file=MAX_ROWS_PER_FILE,
+            min_rows_per_group=MIN_ROWS_PER_GROUP,
+            max_rows_per_group=MIN_ROWS_PER_GROUP * 2,
+        )
+    return exported
+
+
+def read_watermark(path):
+    if path and os.path.exists(path):
+        with open(path) as watermark_file:
+            value = watermark_file.read().strip()
+            return datetime.fromisoformat(value) if value else None
+    return None
 
-# Path to the output CSV file
-csv_path = "/Users/work/Desktop/properties.csv"
 
-# Connect to the PostgreSQL database
-conn = psycopg2.connect(dbname="properties", user="work", password="", host="localhost")
-cursor = conn.cursor()
+def write_watermark(path, watermark):
+    with open(path, "w") as watermark_file:
+        watermark_file.write(watermark.isoformat())
 
-# Query to select all data from the properties table
-query = "SELECT * FROM properties"
 
-# Execute the query
-cursor.execute(query)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="CSV file ('-' for stdout) or Parquet dataset directory",
+    )
+    parser.add_argument(
+        "--columns", help="Comma separated columns to export (default: all)"
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        metavar="COLUMN=VALUE",
+        help="Only export rows where COLUMN equals VALUE; may be repeated",
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only export rows updated after this ISO timestamp",
+    )
+    parser.add_argument(
+        "--watermark-file",
+        help="Read --since from this file and store the new watermark after exporting",
+    )
+    parser.add_argument(
+        "--compression", default="zstd", help="Parquet compression codec"
+    )
+    args = parser.parse_args()
 
-# Fetch all rows from the executed query
-rows = cursor.fetchall()
+    columns = args.columns.split(",") if args.columns else COLUMNS
+    unknown = [column for column in columns if column not in COLUMNS]
+    if unknown:
+        parser.error(f"Unknown columns: {', '.join(unknown)}")
+    try:
+        filters = parse_filters(args.filter)
+    except ValueError as e:
+        parser.error(str(e))
+    since = args.since or read_watermark(args.watermark_file)
 
-# Get the column names from the cursor description
-column_names = [desc[0] for desc in cursor.description]
+    connection = psycopg2.connect(DATABASE_URL)
+    # One snapshot for the watermark and the export itself.
+    connection.set_isolation_level(ISOLATION_LEVEL_REPEATABLE_READ)
+    try:
+        with connection.cursor() as cursor:
+            watermark = get_watermark(cursor, filters, since)
+        if args.format == "csv":
+            exported = export_csv(connection, args.output, columns, filters, since)
+        else:
+            exported = export_parquet(
+                connection, args.output, columns, filters, since, args.compression
+            )
+        connection.commit()
+    finally:
+        connection.close()
 
-# Write the data to a CSV file
-with open(csv_path, "w", newline="") as csv_file:
-    writer = csv.writer(csv_file)
-    # Write the column names as the first row
-    writer.writerow(column_names)
-    # Write the data rows
-    writer.writerows(rows)
+    if args.watermark_file and watermark is not None:
+        write_watermark(args.watermark_file, watermark)
+    print(
+        f"Exported {exported} rows from 'properties' to {args.output}",
+        file=sys.stderr,
+    )
 
-# Close the cursor and connection
-cursor.close()
-conn.close()
 
-print(f"Data from 'properties' table has been exported to {csv_path}")
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,58 @@
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from sqlalchemy_utils import database_exists, create_database
+import sqlalchemy as sa
+from alembic import command, op
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
 from app.db import engine, DATABASE_URL
-from app.models import Base
+
+
+class LegacyBaseline:
+    """
+    Stands in for alembic's op while the baseline revision runs against a
+    database made by the old create_all setup. That setup only created the
+    tables the models had at the time, so existing tables just get their missing
+    columns and existing indexes are skipped.
+    """
+
+    def __init__(self, operations, inspector):
+        self.operations = operations
+        self.inspector = inspector
+
+    def create_table(self, table_name, *items, **kwargs):
+        if not self.inspector.has_table(table_name):
+            self.operations.create_table(table_name, *items, **kwargs)
+            return
+        columns = {column["name"] for column in self.inspector.get_columns(table_name)}
+        for item in items:
+            if isinstance(item, sa.Column) and item.name not in columns:
+                self.operations.add_column(table_name, item)
+
+    def create_index(self, index_name, table_name, columns, **kwargs):
+        indexes = {index["name"] for index in self.inspector.get_indexes(table_name)}
+        if index_name not in indexes:
+            self.operations.create_index(index_name, table_name, columns, **kwargs)
+
+
+def upgrade_legacy_to_baseline(alembic_config):
+    """
+    Bring a database made by the old create_all setup up to revision 0001 and
+    stamp it there, so the later revisions can run on top of it.
+    """
+    baseline = ScriptDirectory.from_config(alembic_config).get_revision("0001")
+    with engine.begin() as connection:
+        operations = Operations(MigrationContext.configure(connection))
+        baseline.module.op = LegacyBaseline(operations, inspect(connection))
+        try:
+            baseline.module.upgrade()
+        finally:
+            baseline.module.op = op
+    command.stamp(alembic_config, "0001")
+
 
 # Create the database if it doesn't exist
 if not database_exists(engine.url):
@@ -25,9 +75,13 @@ if not database_exists(engine.url):
         print(f"Error creating database: {e}")
         exit(1)
 
-# Now proceed with table creation
+# Now bring the schema up to date
 try:
-    Base.metadata.create_all(engine)
-    print("Tables created successfully.")
+    alembic_config = Config("alembic.ini")
+    tables = inspect(engine).get_table_names()
+    if "properties" in tables and "alembic_version" not in tables:
+        upgrade_legacy_to_baseline(alembic_config)
+    command.upgrade(alembic_config, "head")
+    print("Database migrated successfully.")
 except Exception as e:
-    print(f"Error creating tables: {e}")
+    print(f"Error migrating database: {e}")
@@ -0,0 +1,142 @@
+"""Baseline schema
+
+Tables as created by Base.metadata.create_all before migrations were added.
+Databases set up that way are stamped at this revision by initial_setup.py.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "properties",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("zpid", sa.Integer(), nullable=False),
+        sa.Column("address", sa.String()),
+        sa.Column("unit", sa.String()),
+        sa.Column("latitude", sa.Float()),
+        sa.Column("longitude", sa.Float()),
+        sa.Column("price", sa.Integer()),
+        sa.Column("price_change", sa.Integer()),
+        sa.Column("zestimate", sa.Integer()),
+        sa.Column("img_src", sa.String()),
+        sa.Column("detail_url", sa.String()),
+        sa.Column("bedrooms", sa.Integer()),
+        sa.Column("bathrooms", sa.Float()),
+        sa.Column("living_area", sa.Float()),
+        sa.Column("lot_area_value", sa.Float()),
+        sa.Column("lot_area_unit", sa.String()),
+        sa.Column("listing_status", sa.String()),
+        sa.Column("property_type", sa.String()),
+        sa.Column("contingent_listing_type", sa.String()),
+        sa.Column("rent_zestimate", sa.Integer()),
+        sa.Column("days_on_zillow", sa.Integer()),
+        sa.Column("date_sold", sa.Date()),
+        sa.Column("country", sa.String()),
+        sa.Column("currency", sa.String()),
+        sa.Column("has_image", sa.Boolean()),
+        sa.Column("county_name", sa.String()),
+        sa.Column("state_id", sa.String()),
+        sa.Column("county_fips", sa.String()),
+        sa.Column("zip_code", sa.String()),
+        sa.Column("content_hash", sa.String()),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("zpid"),
+    )
+    op.create_table(
+        "property_snapshots",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("observed_at", sa.DateTime(), nullable=False),
+        sa.Column("zpid", sa.Integer(), nullable=False),
+        sa.Column("zip_code", sa.String()),
+        sa.Column("price", sa.Integer()),
+        sa.Column("listing_status", sa.String()),
+        sa.Column("price_change", sa.Integer()),
+        sa.Column("zestimate", sa.Integer()),
+        sa.Column("rent_zestimate", sa.Integer()),
+        sa.Column("days_on_zillow", sa.Integer()),
+        sa.Column("contingent_listing_type", sa.String()),
+        sa.Column("date_sold", sa.Date()),
+        sa.Column("content_hash", sa.String()),
+        sa.PrimaryKeyConstraint("id", "observed_at"),
+        postgresql_partition_by="RANGE (observed_at)",
+    )
+    op.create_index(
+        "ix_property_snapshots_zpid_observed_at",
+        "property_snapshots",
+        ["zpid", "observed_at"],
+    )
+    op.create_index(
+        "ix_property_snapshots_zip_code_observed_at",
+        "property_snapshots",
+        ["zip_code", "observed_at"],
+    )
+    op.create_table(
+        "search_plans",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("zip_code", sa.String(), nullable=False),
+        sa.Column("status_type", sa.String(), nullable=False),
+        sa.Column("sold_in_last", sa.String(), nullable=False),
+        sa.Column("total_results", sa.Integer()),
+        sa.Column("params", sa.JSON()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("zip_code", "status_type", "sold_in_last"),
+    )
+    op.create_table(
+        "crawl_runs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "crawl_journal",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("zip_code", sa.String(), nullable=False),
+        sa.Column("status_type", sa.String(), nullable=False),
+        sa.Column("sold_in_last", sa.String(), nullable=False),
+        sa.Column("range_key", sa.String(), nullable=False),
+        sa.Column("page", sa.Integer(), nullable=False),
+        sa.Column("total_pages", sa.Integer()),
+        sa.Column("params", sa.JSON()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["run_id"], ["crawl_runs.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("run_id", "zip_code", "status_type", "range_key", "page"),
+    )
+    op.create_table(
+        "zip_crawl_state",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("zip_code", sa.String(), nullable=False),
+        sa.Column("status_type", sa.String(), nullable=False),
+        sa.Column("sold_in_last", sa.String(), nullable=False),
+        sa.Column("last_success_at", sa.DateTime()),
+        sa.Column("last_full_success_at", sa.DateTime()),
+        sa.Column("fingerprint", sa.String()),
+        sa.Column("fingerprint_sold_in_last", sa.String()),
+        sa.Column("last_deep_crawl_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("zip_code", "status_type"),
+    )
+
+
+def downgrade():
+    op.drop_table("zip_crawl_state")
+    op.drop_table("crawl_journal")
+    op.drop_table("crawl_runs")
+    op.drop_table("search_plans")
+    op.drop_table("property_snapshots")
+    op.drop_table("properties")
@@ -0,0 +1,73 @@
+"""Property access-path indexes and created_at/updated_at
+
+Indexes are built CONCURRENTLY so a populated properties table stays writable
+while the migration runs.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "properties",
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.add_column(
+        "properties",
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_properties_zip_code_listing_status_date_sold",
+            "properties",
+            ["zip_code", "listing_status", "date_sold"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_properties_sold_zip_code_date_sold",
+            "properties",
+            ["zip_code", "date_sold"],
+            postgresql_where=sa.text("listing_status = 'RECENTLY_SOLD'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_properties_updated_at",
+            "properties",
+            ["updated_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_properties_updated_at",
+            table_name="properties",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_properties_sold_zip_code_date_sold",
+            table_name="properties",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_properties_zip_code_listing_status_date_sold",
+            table_name="properties",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("properties", "updated_at")
+    op.drop_column("properties", "created_at")
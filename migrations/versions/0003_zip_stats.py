@@ -0,0 +1,37 @@
+"""Materialized per-zip market statistics
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "zip_stats",
+        sa.Column("zip_code", sa.String(), nullable=False),
+        sa.Column("properties_for_sale", sa.Integer()),
+        sa.Column("properties_sold_30_days", sa.Integer()),
+        sa.Column("properties_sold_90_days", sa.Integer()),
+        sa.Column("average_price", sa.Float()),
+        sa.Column("median_price", sa.Float()),
+        sa.Column("price_std", sa.Float()),
+        sa.Column("average_acreage", sa.Float()),
+        sa.Column("median_acreage", sa.Float()),
+        sa.Column("absorption", sa.Float()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("zip_code"),
+    )
+
+
+def downgrade():
+    op.drop_table("zip_stats")
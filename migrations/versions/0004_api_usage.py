@@ -0,0 +1,29 @@
+"""RapidAPI calls per day for budget enforcement
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "api_usage",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("calls", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("day"),
+    )
+
+
+def downgrade():
+    op.drop_table("api_usage")
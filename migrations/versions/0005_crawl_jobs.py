@@ -0,0 +1,49 @@
+"""Crawl job queue for distributed workers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "crawl_jobs",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("zip_code", sa.String(), nullable=False),
+        sa.Column("status_type", sa.String(), nullable=False),
+        sa.Column("sold_in_last", sa.String(), nullable=False),
+        sa.Column("zip_data", sa.JSON()),
+        sa.Column("priority", sa.Float(), nullable=False),
+        sa.Column("estimated_calls", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("worker_id", sa.String()),
+        sa.Column("lease_expires_at", sa.DateTime()),
+        sa.Column("result", sa.JSON()),
+        sa.Column("error", sa.String()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["run_id"], ["crawl_runs.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("run_id", "zip_code", "status_type"),
+    )
+    op.create_index(
+        "ix_crawl_jobs_run_id_status_priority",
+        "crawl_jobs",
+        ["run_id", "status", "priority"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_crawl_jobs_run_id_status_priority", table_name="crawl_jobs")
+    op.drop_table("crawl_jobs")
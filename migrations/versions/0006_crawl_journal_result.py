@@ -0,0 +1,23 @@
+"""Crawl result on journal plan rows
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("crawl_journal", sa.Column("result", sa.JSON()))
+
+
+def downgrade():
+    op.drop_column("crawl_journal", "result")
@@ -0,0 +1,121 @@
+"""
+Long-running crawl daemon.
+
+    python schedule_tasks.py
+    python schedule_tasks.py --tick-minutes 10 --locations locations.csv
+
+Every tick crawls the (zip, status) pairs whose refresh cadence has come round
+(see app/services/refresh_cadence_service.py): ForSale zips with many observed
+changes are refreshed every few hours and quiet ones every few days, and
+RecentlySold runs on its own tiers. One ClientSession, rate limiter, DB pool and
+response cache are kept across ticks instead of being rebuilt for every crawl.
+"""
+
+import os
+import signal
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+from aiohttp import ClientSession
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from app.db import dispose_async_engine
+from app.main import run_property_services
+from app.services.crawl_scheduler_service import parse_phase_weights
+from app.services.rapidapi_client import (
+    RAPIDAPI_RATE_LIMIT,
+    RAPIDAPI_ZILLOW_API_KEYS,
+    ApiKeyPool,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("app.log")],
+)
+
+DAEMON_TICK_MINUTES = int(os.getenv("DAEMON_TICK_MINUTES", "15"))
+
+
+class CrawlDaemon:
+    def __init__(
+        self, locations=None, tick_minutes=DAEMON_TICK_MINUTES, phase_weights=None
+    ):
+        self.locations = locations
+        self.tick_minutes = tick_minutes
+        self.phase_weights = phase_weights
+        self.session = None
+        self.current_crawl = None
+        self.rate_limiter = ApiKeyPool(
+            RAPIDAPI_ZILLOW_API_KEYS, rate=RAPIDAPI_RATE_LIMIT
+        )
+        self.scheduler = AsyncIOScheduler(timezone=timezone.utc)
+
+    async def crawl_due(self):
+        started = datetime.now(timezone.utc)
+        self.current_crawl = asyncio.current_task()
+        try:
+            await run_property_services(
+                locations=self.locations,
+                due_only=True,
+                session=self.session,
+                rate_limiter=self.rate_limiter,
+                phase_weights=self.phase_weights,
+            )
+        except Exception as e:
+            logger.error(f"Scheduled crawl failed: {e}")
+        logger.info(
+            f"Scheduled crawl took {(datetime.now(timezone.utc) - started).total_seconds():.0f}s"
+        )
+
+    async def run(self):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+
+        async with ClientSession() as session:
+            self.session = session
+            # A tick that overruns the next one is skipped rather than stacked.
+            self.scheduler.add_job(
+                self.crawl_due,
+                "interval",
+                minutes=self.tick_minutes,
+                next_run_time=datetime.now(timezone.utc),
+                max_instances=1,
+                coalesce=True,
+                id="crawl_due",
+            )
+            self.scheduler.start()
+            logger.info(f"Crawl daemon started, checking every {self.tick_minutes}m")
+            await stop.wait()
+            self.scheduler.shutdown(wait=False)
+            if self.current_crawl is not None and not self.current_crawl.done():
+                # Pages written so far are kept; the zip is simply due again.
+                self.current_crawl.cancel()
+                await asyncio.gather(self.current_crawl, return_exceptions=True)
+        await dispose_async_engine()
+        logger.info("Crawl daemon stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tick-minutes", type=int, default=DAEMON_TICK_MINUTES)
+    parser.add_argument(
+        "--locations",
+        help="Read zip codes from this CSV file instead of the Google Sheet.",
+    )
+    parser.add_argument(
+        "--phase-weights",
+        type=parse_phase_weights,
+        help='Share of API quota per phase, e.g. "ForSale=2,RecentlySold=1". Defaults to CRAWL_PHASE_WEIGHTS.',
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        CrawlDaemon(
+            locations=args.locations,
+            tick_minutes=args.tick_minutes,
+            phase_weights=args.phase_weights,
+        ).run()
+    )
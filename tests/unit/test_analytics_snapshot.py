@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+import pyarrow as pa
+from app.analytics import snapshot
+from app.analytics.snapshot import read_snapshot, snapshot_schema, snapshot_watermark
+from app.services.property_db_service import UPDATED_AT_VISIBILITY_LAG
+
+NOW = datetime(2026, 10, 18, 12)
+
+
+def properties(*rows):
+    return pa.Table.from_pylist(
+        [
+            {
+                "id": zpid,
+                "zpid": zpid,
+                "price": price,
+                "zip_code": "78701",
+                "updated_at": updated_at,
+            }
+            for zpid, price, updated_at in rows
+        ],
+        schema=snapshot_schema(),
+    )
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.changes = []
+        self.reads = []
+
+    def fetch_changed_rows(self, since):
+        self.reads.append(since)
+        changed = self.changes.pop(0) if self.changes else properties()
+        return changed, NOW
+
+
+def test_sync_pulls_only_changed_rows_and_replaces_them(tmp_path, monkeypatch):
+    path = str(tmp_path / "properties.arrow")
+    database = FakeDatabase()
+    monkeypatch.setattr(snapshot, "fetch_changed_rows", database.fetch_changed_rows)
+    first_write = NOW - timedelta(hours=1)
+    database.changes = [
+        properties((1, 100, first_write), (2, 200, first_write)),
+        properties((2, 150, NOW), (3, 300, NOW)),
+    ]
+
+    assert snapshot.sync_snapshot(path) == 2
+    assert snapshot_watermark(read_snapshot(path)) == first_write
+    assert snapshot.sync_snapshot(path) == 2
+    assert snapshot.sync_snapshot(path) == 0
+
+    table = read_snapshot(path)
+    prices = dict(zip(table["zpid"].to_pylist(), table["price"].to_pylist()))
+    assert prices == {1: 100, 2: 150, 3: 300}
+    # Rows written just before the read may still be joined by older ones.
+    assert snapshot_watermark(table) == NOW - UPDATED_AT_VISIBILITY_LAG
+    assert database.reads == [None, first_write, NOW - UPDATED_AT_VISIBILITY_LAG]
+
+
+def test_snapshot_keeps_categorical_columns_dictionary_encoded(tmp_path, monkeypatch):
+    path = str(tmp_path / "properties.arrow")
+    database = FakeDatabase()
+    database.changes = [properties((1, 100, NOW))]
+    monkeypatch.setattr(snapshot, "fetch_changed_rows", database.fetch_changed_rows)
+    df = snapshot.load_snapshot(path)
+    assert df["zip_code"].dtype == "category"
+    assert df["zpid"].tolist() == [1]
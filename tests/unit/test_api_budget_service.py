@@ -0,0 +1,22 @@
+from app.services.api_budget_service import estimate_job_calls
+
+
+def test_small_zips_cost_the_probe_and_their_pages():
+    assert estimate_job_calls(0) == 1
+    assert estimate_job_calls(41) == 2
+    assert estimate_job_calls(42) == 3
+    assert estimate_job_calls(820) == 1 + 20
+
+
+def test_unknown_zips_use_the_default_size():
+    assert estimate_job_calls(None) == estimate_job_calls(100)
+
+
+def test_split_zips_pay_for_min_max_probes_without_a_plan():
+    # 2000 results: 3 ranges of ~667 results, 17 pages each.
+    assert estimate_job_calls(2000) == 1 + 2 + 3 * 17
+
+
+def test_stored_plan_sets_the_ranges_and_count():
+    plan = {"total_results": 2000, "params": [{}, {}, {}, {}]}
+    assert estimate_job_calls(None, plan) == 1 + 4 * 13
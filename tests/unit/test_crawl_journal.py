@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timezone
+from app.main import process_zip
+from app.services.crawl_journal_service import CrawlJournal, range_key
+
+PARAMS = [
+    {"location": "78701", "status_type": "ForSale", "minPrice": 0, "maxPrice": 50000},
+    {"location": "78701", "status_type": "ForSale", "minPrice": 49999},
+]
+
+
+def make_journal(result=None, pages=None):
+    ranges = {
+        range_key(params): {"total_pages": 2, "pages": set(pages or {1, 2})}
+        for params in PARAMS
+    }
+    return CrawlJournal(
+        1,
+        datetime.now(timezone.utc),
+        {
+            ("78701", "ForSale"): {
+                "sold_in_last": "",
+                "params": PARAMS,
+                "result": result,
+                "ranges": ranges,
+            }
+        },
+    )
+
+
+def test_resumed_complete_job_reports_the_recorded_result():
+    journal = make_journal({"fingerprint": "abc", "deep_crawl": False})
+    result = asyncio.run(process_zip("78701", None, "ForSale", journal=journal))
+    assert result == {"fingerprint": "abc", "deep_crawl": False}
+
+
+def test_result_falls_back_to_a_deep_crawl_without_a_fingerprint():
+    assert make_journal().result("78701", "ForSale") == {
+        "fingerprint": None,
+        "deep_crawl": True,
+    }
+    assert make_journal().result("10001", "ForSale")["deep_crawl"]
+
+
+def test_range_key_ignores_the_page_and_key_order():
+    assert range_key({**PARAMS[0], "page": 3}) == range_key(
+        dict(reversed(list(PARAMS[0].items())))
+    )
+    assert range_key(PARAMS[0]) != range_key(PARAMS[1])
+
+
+def test_is_complete_needs_every_page_of_every_planned_range():
+    assert make_journal().is_complete("78701", "ForSale")
+    assert not make_journal(pages={1}).is_complete("78701", "ForSale")
+    assert not make_journal().is_complete("10001", "ForSale")
+
+    journal = make_journal()
+    del journal.get("78701", "ForSale")["ranges"][range_key(PARAMS[1])]
+    assert not journal.is_complete("78701", "ForSale")
+
+    journal.get("78701", "ForSale")["params"] = None
+    assert not journal.is_complete("78701", "ForSale")
+
+
+def test_empty_plans_and_empty_ranges_are_complete():
+    journal = make_journal()
+    journal.get("78701", "ForSale")["params"] = []
+    assert journal.is_complete("78701", "ForSale")
+
+    # A range with no results reports zero pages; page 1 still marks it done.
+    journal = make_journal(pages={1})
+    for range_state in journal.get("78701", "ForSale")["ranges"].values():
+        range_state["total_pages"] = 0
+    assert journal.is_complete("78701", "ForSale")
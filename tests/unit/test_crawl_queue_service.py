@@ -0,0 +1,120 @@
+import asyncio
+from sqlalchemy.dialects import postgresql
+from app import worker
+from app.services.crawl_queue_service import (
+    CRAWL_JOB_MAX_ATTEMPTS,
+    build_claim_statement,
+    build_fail_expired_statement,
+    job_from_row,
+    job_to_row,
+)
+from app.services.crawl_scheduler_service import CrawlJob
+from app.services.zipcode_service import ZipRecord
+
+
+def compile_postgres(statement):
+    return statement.compile(dialect=postgresql.dialect())
+
+
+def test_claim_skips_rows_other_workers_have_locked():
+    compiled = compile_postgres(build_claim_statement(7, "worker-1", 5))
+    sql = str(compiled)
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY crawl_jobs.priority DESC, crawl_jobs.id" in sql
+    assert compiled.params["run_id_1"] == 7
+    assert compiled.params["param_1"] == 5
+    assert compiled.params["worker_id"] == "worker-1"
+
+
+def test_expired_leases_are_reclaimed_until_the_attempts_run_out():
+    claim = compile_postgres(build_claim_statement(7, "worker-1", 5))
+    assert (
+        "crawl_jobs.status = %(status_2)s AND crawl_jobs.lease_expires_at < "
+        "timezone(%(timezone_4)s, now()) AND crawl_jobs.attempts < %(attempts_2)s"
+    ) in str(claim)
+    assert claim.params["status_2"] == "running"
+    assert claim.params["attempts_2"] == CRAWL_JOB_MAX_ATTEMPTS
+
+    fail = compile_postgres(build_fail_expired_statement(7))
+    assert "crawl_jobs.attempts >= %(attempts_1)s" in str(fail)
+    assert fail.params["attempts_1"] == CRAWL_JOB_MAX_ATTEMPTS
+    assert fail.params["status"] == "failed"
+
+
+def test_queued_jobs_round_trip():
+    job = CrawlJob(
+        "78701",
+        ZipRecord("78701", "TX", "Austin", "Travis", "48453"),
+        "RecentlySold",
+        "7",
+        12.5,
+        40,
+    )
+    row = {"id": 1, **job_to_row(3, job)}
+    restored = job_from_row(row)
+    assert (restored.zip_code, restored.status_type, restored.sold_in_last) == (
+        "78701",
+        "RecentlySold",
+        "7",
+    )
+    for field in ZipRecord.__slots__:
+        assert getattr(restored.zip_data, field) == getattr(job.zip_data, field)
+    assert (restored.priority, restored.estimated_calls) == (12.5, 40)
+
+
+class FakeQueue:
+    def __init__(self, counts, finish_claimed=True):
+        self.counts = counts
+        self.finish_claimed = finish_claimed
+        self.finish_claims = 0
+        self.recorded = []
+
+    def claim_run_finish(self, run_id):
+        self.finish_claims += 1
+        return self.finish_claimed
+
+    def get_run_jobs(self, run_id):
+        return [
+            {
+                "zip_code": "78701",
+                "status_type": "ForSale",
+                "sold_in_last": "",
+                "zip_data": {},
+                "priority": 1.0,
+                "estimated_calls": 3,
+                "result": {"total_results": 12},
+            }
+        ]
+
+    async def finish_crawl_run(self, journal, jobs, crawl_results, finish=True):
+        self.recorded.append(crawl_results)
+        return []
+
+
+def finish(monkeypatch, queue):
+    monkeypatch.setattr(worker, "get_queue_counts", lambda run_id: queue.counts)
+    monkeypatch.setattr(worker, "claim_run_finish", queue.claim_run_finish)
+    monkeypatch.setattr(worker, "get_run_jobs", queue.get_run_jobs)
+    monkeypatch.setattr(worker.CrawlJournal, "load", classmethod(lambda cls, _: None))
+    monkeypatch.setattr(worker, "finish_crawl_run", queue.finish_crawl_run)
+    asyncio.run(worker.finish_queued_run(7))
+
+
+def test_run_is_not_finished_while_jobs_are_open_or_failed(monkeypatch):
+    for counts in ({"done": 3, "running": 1}, {"done": 3, "pending": 1}):
+        queue = FakeQueue(counts)
+        finish(monkeypatch, queue)
+        assert queue.finish_claims == 0
+    queue = FakeQueue({"done": 3, "failed": 1})
+    finish(monkeypatch, queue)
+    assert queue.finish_claims == 0 and queue.recorded == []
+
+
+def test_only_the_worker_that_claims_the_finish_records_the_run(monkeypatch):
+    queue = FakeQueue({"done": 1}, finish_claimed=False)
+    finish(monkeypatch, queue)
+    assert queue.finish_claims == 1 and queue.recorded == []
+
+    queue = FakeQueue({"done": 1})
+    finish(monkeypatch, queue)
+    assert queue.recorded == [{("78701", "ForSale"): {"total_results": 12}}]
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.services.api_budget_service import ApiBudget
+from app.services.crawl_scheduler_service import (
+    DEFAULT_PHASE_WEIGHTS,
+    CrawlJob,
+    CrawlScheduler,
+    job_priority,
+    parse_phase_weights,
+)
+
+
+class IdleRateLimiter:
+    waiting = 0
+    rate = 10
+
+
+def hours_ago(hours):
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+
+def test_stale_and_large_zips_come_first():
+    weights = DEFAULT_PHASE_WEIGHTS
+    assert job_priority("ForSale", hours_ago(48), 100, weights) > job_priority(
+        "ForSale", hours_ago(2), 100, weights
+    )
+    assert job_priority("ForSale", hours_ago(2), 800, weights) > job_priority(
+        "ForSale", hours_ago(2), 10, weights
+    )
+    # Never crawled counts as the maximum staleness, not more.
+    assert job_priority("ForSale", None, 100, weights) == pytest.approx(
+        job_priority("ForSale", hours_ago(24 * 365), 100, weights)
+    )
+
+
+def test_phase_weights_scale_priority():
+    weights = parse_phase_weights("ForSale=2")
+    assert weights == {"ForSale": 2.0, "RecentlySold": 1.0}
+    assert job_priority("ForSale", hours_ago(5), 100, weights) == pytest.approx(
+        2 * job_priority("RecentlySold", hours_ago(5), 100, weights)
+    )
+
+
+def test_parse_phase_weights_rejects_unknown_phases():
+    assert parse_phase_weights("") == DEFAULT_PHASE_WEIGHTS
+    with pytest.raises(ValueError):
+        parse_phase_weights("Pending=2")
+    with pytest.raises(ValueError):
+        parse_phase_weights("ForSale=-1")
+
+
+def test_scheduler_runs_jobs_in_priority_order():
+    crawl_history = {
+        ("10001", "ForSale"): {"updated_at": hours_ago(1), "total_results": 50},
+        ("10002", "ForSale"): {"updated_at": hours_ago(100), "total_results": 50},
+    }
+    scheduler = CrawlScheduler(
+        IdleRateLimiter(),
+        crawl_history=crawl_history,
+        phase_weights=parse_phase_weights("RecentlySold=1000"),
+        min_concurrency=1,
+        max_concurrency=1,
+    )
+    for zip_code in ("10001", "10002"):
+        scheduler.add_job(zip_code, {}, "ForSale")
+    scheduler.add_job("10003", {}, "RecentlySold")
+    started = []
+
+    async def handler(job):
+        started.append((job.zip_code, job.status_type))
+
+    asyncio.run(scheduler.run(handler))
+    assert started == [
+        ("10003", "RecentlySold"),
+        ("10002", "ForSale"),
+        ("10001", "ForSale"),
+    ]
+
+
+def test_jobs_that_do_not_fit_the_budget_are_deferred():
+    budget = ApiBudget(daily_limit=100)
+    scheduler = CrawlScheduler(IdleRateLimiter(), budget=budget)
+    for zip_code, priority, calls in [
+        ("10001", 3, 60),
+        ("10002", 2, 60),
+        ("10003", 1, 30),
+    ]:
+        scheduler.push(CrawlJob(zip_code, {}, "ForSale", None, priority, calls))
+    started = []
+
+    async def handler(job):
+        started.append(job.zip_code)
+        budget.calls += job.estimated_calls
+
+    asyncio.run(scheduler.run(handler))
+    # 10002 waits for 10001's real spend, then no longer fits; 10003 still does.
+    assert started == ["10001", "10003"]
+    assert [job.zip_code for job in scheduler.deferred] == ["10002"]
+    assert budget.reserved == 0
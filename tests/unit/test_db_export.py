@@ -0,0 +1,82 @@
+from datetime import datetime
+import pyarrow.dataset as ds
+import db_export
+from app.services.property_db_service import (
+    UPDATED_AT_VISIBILITY_LAG,
+    incremental_watermark,
+)
+
+NOW = datetime(2026, 10, 18, 12)
+
+
+def test_watermark_trails_rows_that_may_still_commit():
+    old = NOW - UPDATED_AT_VISIBILITY_LAG * 2
+    recent = NOW - UPDATED_AT_VISIBILITY_LAG / 2
+    assert incremental_watermark(old, NOW) == old
+    assert incremental_watermark(recent, NOW) == NOW - UPDATED_AT_VISIBILITY_LAG
+
+
+def test_watermark_never_moves_backwards():
+    since = NOW - UPDATED_AT_VISIBILITY_LAG / 4
+    assert incremental_watermark(None, NOW, since) == since
+    assert incremental_watermark(NOW, NOW, since) == since
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.query = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        self.query = query
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(list(self.rows))
+
+
+def test_parquet_export_writes_one_file_per_partition(tmp_path, monkeypatch):
+    # Partitions span several fetch batches, as they do with real batch sizes.
+    monkeypatch.setattr(db_export, "BATCH_SIZE", 3)
+    rows = [
+        (zpid, 1000 * zpid, state_id, zip_code)
+        for zpid, (state_id, zip_code) in enumerate(
+            [("TX", "78701")] * 5 + [("TX", "78702")] * 4 + [("WA", "98101")] * 2,
+            start=1,
+        )
+    ]
+    exported = db_export.export_parquet(
+        FakeConnection(rows),
+        str(tmp_path),
+        ["zpid", "price"],
+        {},
+        None,
+        "zstd",
+    )
+
+    assert exported == len(rows)
+    files = sorted(
+        path.relative_to(tmp_path).parent.as_posix()
+        for path in tmp_path.rglob("*.parquet")
+    )
+    assert files == [
+        "state_id=TX/zip_code=78701",
+        "state_id=TX/zip_code=78702",
+        "state_id=WA/zip_code=98101",
+    ]
+    table = ds.dataset(str(tmp_path), partitioning="hive").to_table()
+    assert sorted(table.column("zpid").to_pylist()) == list(range(1, 12))
@@ -0,0 +1,47 @@
+import asyncio
+import json
+from app.services import locations_from_gsheet_service as locations
+
+SHEET_URL = "https://docs.example.com/sheet.csv"
+HEADER = "zip,state_id,city,county_name,county_fips\n"
+
+
+class TimingOutSession:
+    def get(self, url, headers=None):
+        raise asyncio.TimeoutError()
+
+
+def use_cache_dir(tmp_path, monkeypatch, zip_codes):
+    cache_path = tmp_path / "locations_cache.csv"
+    cache_path.write_text(
+        HEADER
+        + "".join(f"{zip_code},TX,Austin,Travis,48453\n" for zip_code in zip_codes)
+    )
+    monkeypatch.setattr(locations, "LOCATIONS_CACHE_PATH", str(cache_path))
+    monkeypatch.setattr(
+        locations, "LOCATIONS_CACHE_META_PATH", str(tmp_path / "meta.json")
+    )
+    locations.write_cache_meta({"url": SHEET_URL, "zip_codes": ["78701", "78702"]})
+
+
+def test_timeout_falls_back_to_the_cached_sheet(tmp_path, monkeypatch):
+    use_cache_dir(tmp_path, monkeypatch, ["78701", "78703"])
+    zip_records, added, removed = asyncio.run(
+        locations.fetch_locations_from_google_sheet(SHEET_URL, TimingOutSession())
+    )
+    assert sorted(zip_records) == ["78701", "78703"]
+    assert (added, removed) == ({"78703"}, {"78702"})
+
+
+def test_local_file_leaves_the_sheet_metadata_alone(tmp_path, monkeypatch):
+    use_cache_dir(tmp_path, monkeypatch, ["78701", "78702"])
+    local_path = tmp_path / "local.csv"
+    local_path.write_text(HEADER + "10001,NY,New York,New York,36061\n")
+
+    zip_records, added, removed = asyncio.run(
+        locations.fetch_locations_from_google_sheet(str(local_path))
+    )
+    assert list(zip_records) == ["10001"]
+    assert (added, removed) == (set(), set())
+    with open(tmp_path / "meta.json") as meta_file:
+        assert json.load(meta_file)["zip_codes"] == ["78701", "78702"]
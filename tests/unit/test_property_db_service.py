@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from datetime import date, datetime
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.services import property_db_service
+from app.services.property_db_service import (
+    build_upsert_statement,
+    count_upsert_results,
+    dedupe_rows,
+    snapshot_partition,
+    upsert_properties_async,
+    write_batch,
+    write_batch_async,
+)
+
+
+def compile_postgres(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_dedupe_rows_keeps_the_last_row_per_zpid_in_zpid_order():
+    rows = [
+        {"zpid": 3, "price": 100},
+        {"zpid": 1, "price": 200},
+        {"zpid": 3, "price": 150},
+    ]
+    assert dedupe_rows(rows) == [{"zpid": 1, "price": 200}, {"zpid": 3, "price": 150}]
+
+
+def test_upsert_only_rewrites_rows_whose_hash_changed():
+    sql = compile_postgres(
+        build_upsert_statement([{"zpid": 1, "price": 100, "content_hash": "a"}])
+    )
+    assert "ON CONFLICT (zpid) DO UPDATE SET" in sql
+    assert "updated_at = now()" in sql
+    assert "WHERE properties.content_hash IS DISTINCT FROM excluded.content_hash" in sql
+    assert "RETURNING properties.zpid, (xmax = 0) AS inserted" in sql
+
+
+def test_rows_missing_from_returning_count_as_unchanged():
+    results = [
+        SimpleNamespace(zpid=1, inserted=True),
+        SimpleNamespace(zpid=2, inserted=False),
+    ]
+    assert count_upsert_results(results, 5) == {
+        "inserted": 1,
+        "updated": 1,
+        "unchanged": 3,
+    }
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """
+    Stands in for a Session with the statement builders patched to return
+    (kind, rows) tuples, so write_batch can be checked without Postgres.
+    """
+
+    def __init__(self, stored_hashes, skip_on_upsert=()):
+        self.stored_hashes = stored_hashes
+        self.skip_on_upsert = set(skip_on_upsert)
+        self.upserted = []
+        self.snapshots = []
+
+    def execute(self, statement):
+        kind, payload = statement
+        if kind == "hashes":
+            return FakeResult(
+                [
+                    (zpid, self.stored_hashes[zpid])
+                    for zpid in payload
+                    if zpid in self.stored_hashes
+                ]
+            )
+        if kind == "upsert":
+            self.upserted.extend(row["zpid"] for row in payload)
+            return FakeResult(
+                [
+                    SimpleNamespace(zpid=row["zpid"], inserted=False)
+                    for row in payload
+                    if row["zpid"] not in self.skip_on_upsert
+                ]
+            )
+        self.snapshots.extend(row["zpid"] for row in payload)
+
+
+class FakeAsyncSession(FakeSession):
+    async def execute(self, statement):
+        return FakeSession.execute(self, statement)
+
+
+def patch_statements(monkeypatch):
+    monkeypatch.setattr(
+        property_db_service, "build_known_hashes_query", lambda zpids: ("hashes", zpids)
+    )
+    monkeypatch.setattr(
+        property_db_service, "build_upsert_statement", lambda rows: ("upsert", rows)
+    )
+    monkeypatch.setattr(
+        property_db_service,
+        "build_snapshot_insert",
+        lambda rows, observed_at: ("snapshot", rows),
+    )
+
+
+BATCH = [
+    {"zpid": 1, "content_hash": "a"},
+    {"zpid": 2, "content_hash": "c"},
+    {"zpid": 3, "content_hash": "d"},
+]
+
+
+def test_write_batch_only_upserts_new_and_changed_rows(monkeypatch):
+    patch_statements(monkeypatch)
+    db = FakeSession({1: "a", 2: "b"})
+    results = write_batch(db, BATCH, datetime(2026, 10, 18))
+    assert db.upserted == [2, 3]
+    assert db.snapshots == [2, 3]
+    assert len(results) == 2
+
+
+def test_write_batch_skips_the_upsert_when_nothing_changed(monkeypatch):
+    patch_statements(monkeypatch)
+    db = FakeSession({1: "a", 2: "c", 3: "d"})
+    assert write_batch(db, BATCH, datetime(2026, 10, 18)) == []
+    assert db.upserted == [] and db.snapshots == []
+
+
+def test_snapshots_follow_the_rows_the_upsert_wrote(monkeypatch):
+    # Another writer stored zpid 2's new hash first, so the upsert leaves it alone.
+    patch_statements(monkeypatch)
+    db = FakeSession({1: "a", 2: "b"}, skip_on_upsert={2})
+    write_batch(db, BATCH, datetime(2026, 10, 18))
+    assert db.snapshots == [3]
+
+
+def test_async_write_batch_matches_the_sync_one(monkeypatch):
+    patch_statements(monkeypatch)
+    db = FakeAsyncSession({1: "a", 2: "b"}, skip_on_upsert={2})
+    results = asyncio.run(write_batch_async(db, BATCH, datetime(2026, 10, 18)))
+    assert db.upserted == [2, 3]
+    assert db.snapshots == [3]
+    assert [result.zpid for result in results] == [3]
+
+
+def test_upsert_runs_off_the_event_loop_without_the_async_engine(monkeypatch):
+    calls = []
+
+    def upsert_properties(properties_data, batch_size):
+        calls.append((threading.current_thread(), batch_size))
+        return {"inserted": len(properties_data), "updated": 0, "unchanged": 0}
+
+    monkeypatch.setattr(property_db_service, "USE_ASYNC_DB", False)
+    monkeypatch.setattr(property_db_service, "upsert_properties", upsert_properties)
+    counts = asyncio.run(upsert_properties_async([{}, {}], batch_size=10))
+    assert counts["inserted"] == 2
+    assert calls[0][0] is not threading.main_thread()
+    assert calls[0][1] == 10
+
+
+def test_snapshot_partitions_are_monthly():
+    assert snapshot_partition(datetime(2026, 12, 31, 23, 59)) == (
+        "property_snapshots_2026_12",
+        date(2026, 12, 1),
+        date(2027, 1, 1),
+    )
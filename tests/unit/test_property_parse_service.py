@@ -0,0 +1,132 @@
+import re
+from datetime import datetime, timezone
+from app.services.property_parse_service import (
+    PropertyRecord,
+    content_hash,
+    extract_zip_codes,
+    parse_properties,
+)
+
+ADDRESSES = [
+    "100 Congress Ave, Austin, TX 78701",
+    "100 Congress Ave, Austin, TX 78701\n",
+    "100 Congress Ave, Austin, TX 78701-1234",
+    "100 Congress Ave, Austin, TX 787011",
+    "100 Congress Ave, Austin, TX_78701",
+    "Lot 7, Austin, TX ７８７０１",
+    "78701",
+    "7870",
+    "",
+]
+
+
+def baseline_row(property_data):
+    """
+    Columns of a new property as the original per-row parser built them.
+    """
+    zip_code = re.search(r"\b\d{5}\b$", property_data.get("address", ""))
+    return {
+        "zpid": int(property_data["zpid"]),
+        "address": property_data.get("address"),
+        "unit": property_data.get("unit"),
+        "latitude": property_data.get("latitude"),
+        "longitude": property_data.get("longitude"),
+        "price": property_data.get("price"),
+        "price_change": property_data.get("priceChange"),
+        "zestimate": property_data.get("zestimate"),
+        "img_src": property_data.get("imgSrc"),
+        "detail_url": f"https://www.zillow.com{property_data.get('detailUrl')}",
+        "bedrooms": property_data.get("bedrooms"),
+        "bathrooms": property_data.get("bathrooms"),
+        "living_area": property_data.get("livingArea"),
+        "lot_area_value": property_data.get("lotAreaValue"),
+        "lot_area_unit": property_data.get("lotAreaUnit"),
+        "listing_status": property_data.get("listingStatus"),
+        "property_type": property_data.get("propertyType"),
+        "contingent_listing_type": property_data.get("contingentListingType"),
+        "rent_zestimate": property_data.get("rentZestimate"),
+        "days_on_zillow": property_data.get("daysOnZillow"),
+        "date_sold": (
+            datetime.fromtimestamp(
+                property_data.get("dateSold") / 1000, timezone.utc
+            ).date()
+            if property_data.get("dateSold")
+            else None
+        ),
+        "country": property_data.get("country"),
+        "currency": property_data.get("currency"),
+        "has_image": property_data.get("hasImage"),
+        "county_name": property_data.get("county_name"),
+        "state_id": property_data.get("state_id"),
+        "county_fips": property_data.get("county_fips"),
+        "zip_code": zip_code.group(0) if zip_code else None,
+    }
+
+
+def make_props():
+    return [
+        {
+            "zpid": str(1000 + i),
+            "address": address,
+            "price": 50000 + i,
+            "priceChange": -1000 if i % 2 else None,
+            "imgSrc": "https://photos.example.com/1.jpg",
+            "detailUrl": f"/homedetails/{1000 + i}_zpid/",
+            "lotAreaValue": 0.25,
+            "lotAreaUnit": "acres",
+            "listingStatus": "RECENTLY_SOLD",
+            "propertyType": "LOT",
+            "dateSold": 1700000000000 + i * 86400000 if i % 3 else None,
+            "daysOnZillow": i,
+            "country": "USA",
+            "currency": "USD",
+            "hasImage": True,
+            "state_id": "TX",
+        }
+        for i, address in enumerate(ADDRESSES)
+    ]
+
+
+def test_extract_zip_codes_matches_the_baseline_regex():
+    assert extract_zip_codes(ADDRESSES) == [
+        (match.group(0) if match else None)
+        for match in (re.search(r"\b\d{5}\b$", address) for address in ADDRESSES)
+    ]
+    assert extract_zip_codes(["Austin, TX 78701\n"]) == ["78701"]
+
+
+def test_parse_properties_matches_the_baseline_mapping():
+    props = make_props()
+    records = parse_properties(props)
+    assert len(records) == len(props)
+    for record, prop in zip(records, props):
+        row = record.as_row()
+        assert row.pop("content_hash") == content_hash(list(record.snapshot().values()))
+        assert row == baseline_row(prop)
+
+
+def test_state_id_overrides_the_result_value():
+    records = parse_properties(make_props(), state_id="NM")
+    assert {record.state_id for record in records} == {"NM"}
+
+
+def test_content_hash_changes_with_snapshot_fields_only():
+    first, second = parse_properties(make_props()[:1]), parse_properties(
+        make_props()[:1]
+    )
+    assert first[0].content_hash == second[0].content_hash
+
+    changed = make_props()[:1]
+    changed[0]["price"] -= 500
+    assert parse_properties(changed)[0].content_hash != first[0].content_hash
+
+    changed = make_props()[:1]
+    changed[0]["imgSrc"] = "https://photos.example.com/2.jpg"
+    assert parse_properties(changed)[0].content_hash == first[0].content_hash
+
+
+def test_property_record_only_holds_table_columns():
+    record = parse_properties(make_props()[:1])[0]
+    assert not hasattr(record, "__dict__")
+    assert set(record.as_row()) == set(PropertyRecord.__slots__)
+    assert repr(record) == f"PropertyRecord(zpid=1000, address={ADDRESSES[0]!r})"
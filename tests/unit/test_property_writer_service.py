@@ -0,0 +1,78 @@
+import asyncio
+from app.services import property_writer_service
+from app.services.property_writer_service import PropertyWriter
+
+
+class FakeDatabase:
+    def __init__(self, fail_on=()):
+        self.batches = []
+        self.fail_on = set(fail_on)
+
+    async def upsert(self, batch, batch_size=None):
+        if any(row["zpid"] in self.fail_on for row in batch):
+            raise RuntimeError("connection reset")
+        self.batches.append([row["zpid"] for row in batch])
+        return {"inserted": len(batch), "updated": 0, "unchanged": 0}
+
+
+def page(*zpids):
+    return [{"zpid": zpid} for zpid in zpids]
+
+
+def run_writer(database, monkeypatch, pages, batch_size=2):
+    monkeypatch.setattr(
+        property_writer_service, "upsert_properties_async", database.upsert
+    )
+    acked = []
+
+    async def record_pages(entries):
+        acked.extend(entries)
+
+    async def main():
+        async with PropertyWriter(
+            batch_size=batch_size, on_pages_written=record_pages
+        ) as writer:
+            for index, properties in enumerate(pages):
+                await writer.put(properties, page_entry=f"page-{index}")
+        return writer
+
+    return asyncio.run(main()), acked
+
+
+def test_pages_are_acked_once_their_batch_is_written(monkeypatch):
+    database = FakeDatabase()
+    writer, acked = run_writer(
+        database, monkeypatch, [page(1, 2), page(3), page(4), page(5)]
+    )
+    assert sorted(zpid for batch in database.batches for zpid in batch) == list(
+        range(1, 6)
+    )
+    assert sorted(acked) == ["page-0", "page-1", "page-2", "page-3"]
+    assert writer.totals["inserted"] == 5
+    assert writer.failed_batches == 0
+
+
+def test_pages_of_a_failed_batch_are_not_acked(monkeypatch):
+    database = FakeDatabase(fail_on={3})
+    writer, acked = run_writer(database, monkeypatch, [page(1, 2), page(3, 4), page(5)])
+    # The failed pages stay unjournaled so a resumed run fetches them again.
+    assert "page-1" not in acked
+    assert sorted(acked) == ["page-0", "page-2"]
+    assert writer.failed_batches == 1
+    assert writer.totals["inserted"] == 3
+
+
+def test_wait_written_flushes_a_partial_batch(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(
+        property_writer_service, "upsert_properties_async", database.upsert
+    )
+    monkeypatch.setattr(property_writer_service, "FLUSH_INTERVAL", 60)
+
+    async def main():
+        async with PropertyWriter(batch_size=100) as writer:
+            await writer.put(page(1))
+            await asyncio.wait_for(writer.wait_written(), timeout=5)
+            return list(database.batches)
+
+    assert asyncio.run(main()) == [[1]]
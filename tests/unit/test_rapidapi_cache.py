@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from app.services import rapidapi_cache
+from app.services.rapidapi_cache import (
+    ResponseCache,
+    normalize_querystring,
+    response_ttl,
+)
+
+URL = "https://example.com/search"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(tmp_path, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(rapidapi_cache.time, "time", clock)
+    return ResponseCache(path=str(tmp_path / "cache.sqlite"), **kwargs), clock
+
+
+def test_normalize_querystring_drops_empty_values_and_page_one():
+    assert normalize_querystring(
+        {"status_type": "ForSale", "location": "78701", "minPrice": "", "page": 1}
+    ) == normalize_querystring({"location": "78701", "status_type": "ForSale"})
+    assert normalize_querystring({"page": 2}) == "page=2"
+    # 0 is a real filter value, not an empty one.
+    assert normalize_querystring({"minPrice": 0}) == "minPrice=0"
+
+
+def test_response_ttl_follows_status_type_and_sold_window():
+    assert response_ttl({"status_type": "ForSale"}) == 12 * 3600
+    assert response_ttl({"status_type": "RecentlySold", "soldInLast": "90"}) == 86400
+    assert response_ttl({"status_type": "RecentlySold", "soldInLast": "1"}) == 43200
+    assert response_ttl({"status_type": "RecentlySold", "soldInLast": ""}) == 86400
+    assert response_ttl({}) == rapidapi_cache.DEFAULT_TTL
+
+
+def test_entries_expire_after_their_ttl(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch)
+    params = {"location": "78701", "status_type": "RecentlySold", "soldInLast": "7"}
+    cache.set(URL, params, {"totalResultCount": 3})
+
+    clock.now += 86400 - 1
+    assert cache.get(URL, params) == {"totalResultCount": 3}
+    clock.now += 2
+    assert cache.get(URL, params) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_page_one_shares_the_count_probe_entry(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    cache.set(URL, {"location": "78701", "minPrice": 0}, {"props": []})
+    assert cache.get(URL, {"location": "78701", "minPrice": 0, "page": 1}) == {
+        "props": []
+    }
+
+
+def test_evicts_least_recently_used_entries(tmp_path, monkeypatch):
+    body = {"props": ["x" * 100]}
+    cache, clock = make_cache(tmp_path, monkeypatch, max_bytes=400)
+    for location in ("1", "2", "3"):
+        cache.set(URL, {"location": location}, body)
+        clock.now += 1
+    # Touch the oldest entry so the second one is now least recently used.
+    assert cache.get(URL, {"location": "1"}) == body
+    clock.now += 1
+    cache.set(URL, {"location": "4"}, body)
+
+    assert cache.get(URL, {"location": "2"}) is None
+    assert cache.get(URL, {"location": "1"}) == body
+    assert cache.get(URL, {"location": "4"}) == body
+    assert cache.total_bytes <= 400 * 0.9
+
+
+def test_max_age_limits_how_old_a_served_entry_may_be(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch)
+    params = {"location": "78701", "status_type": "ForSale"}
+    cache.set(URL, params, {"totalResultCount": 3})
+    clock.now += 600
+
+    assert cache.get(URL, params, max_age=0) is None
+    assert cache.get(URL, params, max_age=300) is None
+    assert cache.get(URL, params, max_age=900) == {"totalResultCount": 3}
+    assert cache.get(URL, params) == {"totalResultCount": 3}
+
+
+def test_cache_wide_max_age_applies_to_every_read(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_age=300)
+    params = {"location": "78701", "status_type": "ForSale"}
+    cache.set(URL, params, {"totalResultCount": 3})
+    clock.now += 200
+    assert cache.get(URL, params) == {"totalResultCount": 3}
+    assert cache.get(URL, params, max_age=0) is None
+    clock.now += 200
+    assert cache.get(URL, params) is None
+    assert cache.get(URL, params, max_age=900) is None
+
+
+def test_async_access_runs_off_the_event_loop_thread(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    threads = set()
+    connect = cache._connect
+
+    def recording_connect():
+        threads.add(threading.get_ident())
+        return connect()
+
+    monkeypatch.setattr(cache, "_connect", recording_connect)
+
+    async def exercise():
+        await asyncio.gather(
+            *[
+                cache.set_async(URL, {"location": str(zip_code)}, {"n": zip_code})
+                for zip_code in range(20)
+            ]
+        )
+        return await asyncio.gather(
+            *[
+                cache.get_async(URL, {"location": str(zip_code)})
+                for zip_code in range(20)
+            ]
+        )
+
+    assert asyncio.run(exercise()) == [{"n": zip_code} for zip_code in range(20)]
+    assert threads and threading.get_ident() not in threads
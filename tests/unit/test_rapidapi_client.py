@@ -0,0 +1,99 @@
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from app.services.rapidapi_client import (
+    ApiKeyPool,
+    CircuitBreaker,
+    RapidAPIError,
+    RateLimiter,
+    parse_retry_after,
+)
+
+
+def test_rate_limiter_holds_the_start_rate():
+    limiter = RateLimiter(20)
+
+    async def acquire_all():
+        started = time.monotonic()
+        await asyncio.gather(*[limiter.acquire() for _ in range(6)])
+        return time.monotonic() - started
+
+    # One token is available up front, the other five arrive at 20 per second.
+    assert asyncio.run(acquire_all()) >= 5 / 20 * 0.9
+
+
+def test_rate_limiter_backs_off_on_429_and_recovers():
+    limiter = RateLimiter(10)
+    limiter.observe(429, {"Retry-After": "2"})
+    assert limiter.rate == 5
+    assert limiter.paused_until >= time.monotonic() + 1.5
+    assert limiter.tokens < 1
+
+    for _ in range(100):
+        limiter.observe(200, {})
+    assert limiter.rate == 10
+
+
+def test_rate_limiter_pauses_until_the_quota_resets():
+    limiter = RateLimiter(10)
+    limiter.observe(
+        200,
+        {"x-ratelimit-requests-remaining": "0", "x-ratelimit-requests-reset": "60"},
+    )
+    assert limiter.paused_until >= time.monotonic() + 59
+    assert limiter.rate == 10
+
+
+def test_api_key_pool_sends_requests_to_the_free_key():
+    pool = ApiKeyPool(["key-1", "key-2"], rate=5)
+    first, second = pool.limiters
+    assert first.headers["x-rapidapi-key"] == "key-1"
+    assert pool.rate == 10
+
+    first.pause(30)
+    assert pool.select() is second
+    second.waiting = 200
+    assert pool.select() is first
+
+
+def test_circuit_breaker_trips_after_consecutive_failures():
+    limiter = RateLimiter(10)
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, max_cooldown=25)
+
+    for _ in range(2):
+        breaker.record_failure(limiter)
+    assert breaker.trips == 0 and limiter.paused_until < time.monotonic() + 1
+
+    breaker.record_failure(limiter)
+    assert breaker.trips == 1
+    assert limiter.paused_until >= time.monotonic() + 9
+    assert breaker.cooldown == 20
+
+    for _ in range(3):
+        breaker.record_failure(limiter)
+    assert breaker.cooldown == 25
+
+    breaker.record_success()
+    assert (breaker.consecutive_failures, breaker.cooldown) == (0, 10)
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_429_with_an_http_date_still_backs_off():
+    limiter = RateLimiter(10)
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    limiter.observe(429, {"Retry-After": format_datetime(retry_at, usegmt=True)})
+    assert limiter.rate == 5
+    assert limiter.paused_until >= time.monotonic() + 25
+
+    error = RapidAPIError("Too many requests", 429, {"Retry-After": "not a date"})
+    assert error.retryable and error.retry_after is None
+    RateLimiter(10).observe(429, error.headers)
@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import MetaData, create_engine, insert
+from app.models import PropertySnapshot
+from app.services.rapidapi_cache import STATUS_TYPE_TTLS
+from app.services.refresh_cadence_service import (
+    REFRESH_TIERS,
+    build_change_rate_query,
+    cache_max_age,
+    is_due,
+    refresh_interval,
+    tier_counts,
+)
+
+NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def test_busier_zips_get_shorter_refresh_intervals():
+    assert refresh_interval("ForSale", 3.0) == timedelta(hours=6)
+    assert refresh_interval("ForSale", 0.5) == timedelta(hours=24)
+    assert refresh_interval("ForSale", 0.0) == timedelta(hours=72)
+    assert refresh_interval("ForSale", None) == timedelta(hours=72)
+    assert refresh_interval("RecentlySold", 0.5) == timedelta(hours=24)
+    assert refresh_interval("RecentlySold", 0.2) == timedelta(hours=72)
+
+
+def test_zips_are_due_once_their_interval_has_passed():
+    state = {"last_success_at": NOW - timedelta(hours=7)}
+    assert is_due(None, "ForSale", 0.0, NOW)
+    assert is_due({"last_success_at": None}, "ForSale", 0.0, NOW)
+    assert is_due(state, "ForSale", 3.0, NOW)
+    assert not is_due(state, "ForSale", 0.5, NOW)
+
+
+def test_tier_counts_group_jobs_by_interval():
+    jobs = [("78701", "ForSale"), ("78702", "ForSale"), ("78701", "RecentlySold")]
+    rates = {("78701", "ForSale"): 2.0, ("78701", "RecentlySold"): 1.0}
+    assert tier_counts(jobs, rates) == {
+        "ForSale/6h": 1,
+        "ForSale/72h": 1,
+        "RecentlySold/24h": 1,
+    }
+
+
+def test_due_crawls_never_reuse_the_previous_crawls_responses():
+    shortest = min(hours for tiers in REFRESH_TIERS.values() for _, hours in tiers)
+    assert cache_max_age() < shortest * 3600
+    assert cache_max_age() < min(STATUS_TYPE_TTLS.values())
+
+
+def snapshot(zpid, zip_code, days_ago, price=100000, days_on_zillow=0, **fields):
+    return {
+        "id": zpid * 1000 + days_ago,
+        "observed_at": NOW.replace(tzinfo=None) - timedelta(days=days_ago),
+        "zpid": zpid,
+        "zip_code": zip_code,
+        "price": price,
+        "listing_status": "FOR_SALE",
+        "days_on_zillow": days_on_zillow,
+        **fields,
+    }
+
+
+def test_change_rate_counts_new_listings_and_real_changes_only():
+    engine = create_engine("sqlite://")
+    # SQLite can't autoincrement part of a composite key; ids are given below.
+    table = PropertySnapshot.__table__.to_metadata(MetaData())
+    table.c.id.autoincrement = False
+    table.create(engine)
+    rows = []
+    # Long-standing listings whose only daily change is days_on_zillow.
+    for zpid in range(1, 11):
+        rows += [
+            snapshot(zpid, "10001", days_ago, days_on_zillow=30 - days_ago)
+            for days_ago in range(30)
+        ]
+    # One new listing, one price cut and one sale.
+    rows.append(snapshot(11, "10002", 3))
+    rows += [snapshot(12, "10002", 20), snapshot(12, "10002", 2, price=90000)]
+    rows += [
+        snapshot(13, "10002", 20),
+        snapshot(
+            13, "10002", 1, listing_status="RECENTLY_SOLD", date_sold=date(2026, 10, 16)
+        ),
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(PropertySnapshot), rows)
+        since = NOW.replace(tzinfo=None) - timedelta(days=14)
+        counts = {
+            (zip_code, listing_status): count
+            for zip_code, listing_status, count in connection.execute(
+                build_change_rate_query(since)
+            )
+        }
+
+    assert ("10001", "FOR_SALE") not in counts
+    assert counts == {("10002", "FOR_SALE"): 2, ("10002", "RECENTLY_SOLD"): 1}
@@ -0,0 +1,212 @@
+import math
+import asyncio
+from datetime import datetime, timezone
+import orjson
+from app.services import rapidapi_client
+from app.services import zillow_search_params_service as search_params
+from app.services.rapidapi_cache import ResponseCache, normalize_querystring
+from app.services.zip_crawl_state_service import fingerprint_is_current
+from app.services.zillow_search_params_service import (
+    RESULTS_CAP,
+    TARGET_RESULTS_PER_RANGE,
+    filter_value,
+    get_zillow_fingerprint,
+    price_cut_points_from_history,
+    price_ranges_from_cut_points,
+)
+
+
+def test_probe_and_page_fetch_share_a_cache_key_for_zero_min_price():
+    probe = {
+        "location": "78701",
+        "status_type": "ForSale",
+        "home_type": "LotsLand",
+        "soldInLast": filter_value(None),
+        "minPrice": filter_value(0),
+        "maxPrice": filter_value(50000),
+        "lotSizeMin": filter_value(None),
+        "lotSizeMax": filter_value(None),
+    }
+    page = {
+        "location": "78701",
+        "status_type": "ForSale",
+        "home_type": "LotsLand",
+        "minPrice": 0,
+        "maxPrice": 50000,
+        "soldInLast": "",
+        "page": 1,
+    }
+    assert normalize_querystring(probe) == normalize_querystring(page)
+    assert "minPrice=0" in normalize_querystring(probe)
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    async def read(self):
+        return orjson.dumps(self.body)
+
+
+class FakeLimiter:
+    headers = {}
+
+    def select(self):
+        return self
+
+    async def add_task(self, coroutine):
+        return await coroutine
+
+
+def test_fingerprint_probe_sees_a_changed_first_page(tmp_path, monkeypatch):
+    pages = [
+        {"totalResultCount": 2, "props": [{"zpid": 1, "price": 100}]},
+        {"totalResultCount": 2, "props": [{"zpid": 1, "price": 90}]},
+    ]
+
+    async def fetch_with_status_check(session, url, headers, params):
+        return FakeResponse(pages.pop(0))
+
+    monkeypatch.setattr(
+        rapidapi_client, "fetch_with_status_check", fetch_with_status_check
+    )
+    monkeypatch.setattr(
+        rapidapi_client,
+        "response_cache",
+        ResponseCache(path=str(tmp_path / "cache.sqlite")),
+    )
+
+    def probe():
+        rapidapi_client.request_coalescer.reset()
+        return asyncio.run(
+            get_zillow_fingerprint("78701", "ForSale", rate_limiter=FakeLimiter())
+        )
+
+    _, fingerprint = probe()
+    crawl_state = {
+        "fingerprint": fingerprint,
+        "fingerprint_sold_in_last": "",
+        "last_deep_crawl_at": datetime.now(timezone.utc),
+    }
+    assert fingerprint_is_current(crawl_state, None, fingerprint)
+
+    # A price cut on page 1 must reach the probe even though page 1 is cached.
+    _, new_fingerprint = probe()
+    assert new_fingerprint != fingerprint
+    assert not fingerprint_is_current(crawl_state, None, new_fingerprint)
+    assert pages == []
+
+
+def test_price_cut_points_from_history_size_ranges_to_the_target():
+    prices = list(range(1000, 301000, 100))
+    cut_points = price_cut_points_from_history(prices, 4000)
+    assert cut_points[0] == 0 and cut_points[-1] == ""
+    assert len(cut_points) - 1 == math.ceil(4000 / TARGET_RESULTS_PER_RANGE)
+    assert cut_points[1:-1] == sorted(cut_points[1:-1])
+
+
+def test_price_ranges_overlap_by_one_dollar():
+    assert price_ranges_from_cut_points([0, 1000, 5000, ""]) == [
+        {"minPrice": 0, "maxPrice": 1000},
+        {"minPrice": 999, "maxPrice": 5000},
+        {"minPrice": 4999, "maxPrice": ""},
+    ]
+
+
+class FakeMarket:
+    """
+    Counts listings the way the search endpoint filters them: inclusive price and
+    lot size bounds, "" meaning unbounded.
+    """
+
+    def __init__(self, listings):
+        self.listings = listings
+        self.count_calls = 0
+
+    def matching(self, minPrice="", maxPrice="", lotSizeMin="", lotSizeMax="", **_):
+        def within(value, low, high):
+            return (low == "" or value >= low) and (high == "" or value <= high)
+
+        return [
+            listing
+            for listing in self.listings
+            if within(listing[0], minPrice, maxPrice)
+            and within(listing[1], lotSizeMin, lotSizeMax)
+        ]
+
+    async def count(
+        self, location, status_type, session=None, rate_limiter=None, **kwargs
+    ):
+        self.count_calls += 1
+        return len(self.matching(**kwargs))
+
+    async def max_price(
+        self, location, status_type, session=None, rate_limiter=None, **kwargs
+    ):
+        return max(listing[0] for listing in self.matching(**kwargs))
+
+
+def test_refine_price_ranges_keeps_every_range_under_the_cap(monkeypatch):
+    # Spread out listings plus a cluster at one price that only lot size can split.
+    listings = [(price, 2000 + price % 50000) for price in range(100, 400100, 100)]
+    listings += [(25000, 1500 + index * 10) for index in range(1200)]
+    market = FakeMarket(listings)
+    monkeypatch.setattr(search_params, "get_zillow_total_results", market.count)
+    monkeypatch.setattr(search_params, "get_max_price", market.max_price)
+
+    planned_ranges = asyncio.run(
+        search_params.refine_price_ranges(
+            "78701", "ForSale", "", [{"minPrice": 0, "maxPrice": ""}]
+        )
+    )
+    params = [range_params for range_params, _ in planned_ranges]
+
+    covered = set()
+    for range_params in params:
+        matching = market.matching(**range_params)
+        assert len(matching) <= RESULTS_CAP
+        covered.update(matching)
+    assert covered == set(listings)
+    assert any("lotSizeMax" in range_params for range_params in params)
+
+
+def test_reused_plan_still_covers_a_band_that_was_empty_when_planned(monkeypatch):
+    # Dense cheap listings and a few expensive ones, nothing in between.
+    listings = [(price, 5000) for price in range(100, 300100, 100)]
+    listings += [(price, 5000) for price in range(600000, 1000000, 400)]
+    market = FakeMarket(listings)
+    stored = {}
+
+    async def get_search_plan(location, status_type, sold_in_last):
+        return stored.get("plan")
+
+    async def save_search_plan(
+        location, status_type, sold_in_last, total_results, params
+    ):
+        stored["plan"] = {"total_results": total_results, "params": params}
+
+    async def no_history(location, status_type):
+        return []
+
+    async def min_price(location, status_type, session=None, rate_limiter=None, **_):
+        return min(listing[0] for listing in market.listings)
+
+    monkeypatch.setattr(search_params, "get_zillow_total_results", market.count)
+    monkeypatch.setattr(search_params, "get_max_price", market.max_price)
+    monkeypatch.setattr(search_params, "get_min_price", min_price)
+    monkeypatch.setattr(search_params, "get_search_plan_async", get_search_plan)
+    monkeypatch.setattr(search_params, "save_search_plan_async", save_search_plan)
+    monkeypatch.setattr(search_params, "get_historical_prices_async", no_history)
+
+    first = asyncio.run(search_params.get_zillow_search_params("78701", "ForSale"))
+    assert len(stored["plan"]["params"]) > len(first)
+
+    # A handful of listings appear in the gap, not enough to count as drift.
+    new_listings = [(price, 5000) for price in range(400000, 410000, 1000)]
+    market.listings = listings + new_listings
+    second = asyncio.run(search_params.get_zillow_search_params("78701", "ForSale"))
+
+    covered = set()
+    for range_params in second:
+        covered.update(market.matching(**range_params))
+    assert covered == set(market.listings)
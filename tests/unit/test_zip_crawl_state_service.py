@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from app.services.zip_crawl_state_service import (
+    FULL_SOLD_IN_LAST,
+    choose_sold_in_last,
+)
+
+NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def crawl_state(hours_since_success, days_since_full_success=1):
+    return {
+        "last_success_at": NOW - timedelta(hours=hours_since_success),
+        "last_full_success_at": NOW - timedelta(days=days_since_full_success),
+    }
+
+
+def test_new_zips_get_the_full_sold_window():
+    assert choose_sold_in_last(None, NOW) == FULL_SOLD_IN_LAST
+    assert (
+        choose_sold_in_last({"last_success_at": NOW, "last_full_success_at": None}, NOW)
+        == FULL_SOLD_IN_LAST
+    )
+
+
+def test_sold_window_covers_the_gap_plus_a_margin():
+    assert choose_sold_in_last(crawl_state(6), NOW) == "1"
+    assert choose_sold_in_last(crawl_state(24 * 3), NOW) == "7"
+    assert choose_sold_in_last(crawl_state(24 * 10), NOW) == "14"
+    assert choose_sold_in_last(crawl_state(24 * 20), NOW) == "30"
+    assert choose_sold_in_last(crawl_state(24 * 60), NOW) == "90"
+
+
+def test_daily_runs_use_the_one_day_window():
+    # The previous daily run finished a little after it started, so the gap is
+    # just under a day.
+    assert choose_sold_in_last(crawl_state(22.5), NOW) == "1"
+    assert choose_sold_in_last(crawl_state(23), NOW) == "1"
+    assert choose_sold_in_last(crawl_state(24), NOW) == "7"
+
+
+def test_periodic_full_refresh_uses_the_full_window():
+    assert (
+        choose_sold_in_last(crawl_state(6, days_since_full_success=30), NOW)
+        == FULL_SOLD_IN_LAST
+    )
@@ -0,0 +1,70 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy.dialects import postgresql
+from app.analytics.snapshot import normalize_lot_area
+from app.analytics.zip_stats import build_zip_stats_query, compute_zip_stats
+
+NOW = datetime(2026, 10, 18, 12)
+
+
+def listing(zip_code, status, price, lot=None, unit="acres", sold_days_ago=None):
+    return {
+        "zip_code": zip_code,
+        "listing_status": status,
+        "price": price,
+        "lot_area_value": lot,
+        "lot_area_unit": unit,
+        "date_sold": (
+            (NOW - timedelta(days=sold_days_ago)).date()
+            if sold_days_ago is not None
+            else None
+        ),
+    }
+
+
+def test_zip_stats_follow_the_sql_definitions():
+    df = pd.DataFrame(
+        [
+            listing("10001", "FOR_SALE", 100, 1),
+            listing("10001", "FOR_SALE", 200, 43560, unit="sqft"),
+            listing("10001", "FOR_SALE", 400, 3),
+            listing("10001", "RECENTLY_SOLD", 300, 2, sold_days_ago=10),
+            listing("10001", "RECENTLY_SOLD", 500, sold_days_ago=30),
+            listing("10001", "RECENTLY_SOLD", 600, sold_days_ago=200),
+            listing("10002", "RECENTLY_SOLD", 1000, sold_days_ago=5),
+        ]
+    )
+    stats = compute_zip_stats(normalize_lot_area(df), NOW).set_index("zip_code")
+
+    busy = stats.loc["10001"]
+    assert busy["properties_for_sale"] == 3
+    # date_sold >= current_date - 30 includes the 30th day.
+    assert busy["properties_sold_30_days"] == 2
+    assert busy["properties_sold_90_days"] == 2
+    prices = [100, 200, 400, 300, 500, 600]
+    assert busy["average_price"] == np.mean(prices)
+    # percentile_cont(0.5) interpolates, stddev_samp is the sample deviation.
+    assert busy["median_price"] == 350
+    assert math.isclose(busy["price_std"], np.std(prices, ddof=1))
+    # avg and percentile_cont skip NULL lot areas; sqft counts in acres.
+    assert busy["average_acreage"] == 1.75
+    assert busy["median_acreage"] == 1.5
+    assert math.isclose(busy["absorption"], 2 / 3)
+
+    # No listings for sale: absorption is NULL, as with nullif(for_sale, 0), and
+    # a single price has no sample deviation.
+    quiet = stats.loc["10002"]
+    assert quiet["properties_for_sale"] == 0
+    assert math.isnan(quiet["absorption"])
+    assert math.isnan(quiet["price_std"])
+
+
+def test_sql_query_aggregates_with_the_same_functions():
+    sql = str(build_zip_stats_query(["10001"]).compile(dialect=postgresql.dialect()))
+    assert "percentile_cont(%(percentile_cont_1)s) WITHIN GROUP" in sql
+    assert "stddev_samp(properties.price)" in sql
+    assert "properties.date_sold >= CURRENT_DATE - %(current_date_1)s" in sql
+    assert "nullif(count(*) FILTER (WHERE properties.listing_status = " in sql
+    assert "THEN properties.lot_area_value / CAST(%(lot_area_value_1)s" in sql